@@ -834,8 +834,11 @@ def derive_all_study_variables(datasets: Dict[str, pd.DataFrame],
     base = recode_demographics(base)
     
     # Step 6: Adjust survey weights
+    # Pool over the cycles that actually contributed ferritin, not every
+    # requested cycle (FERTIN is missing from G, H and L)
     print("\nStep 6: Adjusting survey weights...")
-    base = adjust_survey_weights(base, n_cycles=len(cycles))
+    n_weight_cycles = base.loc[base['LBXFER'].notna(), 'cycle'].nunique()
+    base = adjust_survey_weights(base, n_cycles=n_weight_cycles)
     
     # Step 7: Apply inclusion criteria
     print("\nStep 7: Applying inclusion criteria...")
@@ -4,13 +4,20 @@ NHANES Iron Deficiency Without Anemia Study - Data Preparation Script
 ====================================================================
 
 This script:
-1. Loads all NHANES datasets from the specified cycles
+1. Loads the NHANES components (see nhanes_components.py) needed by the
+   requested analyses from the cycles in which they are available
 2. Merges datasets by SEQN
 3. Applies inclusion/exclusion criteria
 4. Creates IDWA status variable
 5. Handles below-detection ferritin values
 6. Adjusts survey weights for pooled cycles
-7. Saves processed dataset
+7. Saves processed dataset and the exclusion cascade (criterion, n_before,
+   n_excluded, n_after) used to draw the study flow diagram
+
+Steps 1-5 run one cycle at a time, and each cycle's prepared rows are
+cached (cache/prepared_cycles, see cycle_cache.py) keyed by that cycle's
+raw files, so adding a release only reads and processes the new files.
+Pooled weights and categories are then built over all cycles.
 
 Author: NHANES Analysis Pipeline
 Date: 2026-01-31
@@ -18,9 +25,18 @@ Date: 2026-01-31
 
 import pandas as pd
 import numpy as np
+import argparse
 import os
 import sys
 
+from cycle_cache import (PREPARED_CYCLES_DIR, input_fingerprint, read_cached_cycle, source_hash,
+                         write_cached_cycle)
+from nhanes_components import NHANES_COMPONENTS, ANALYSIS_REQUIREMENTS, component_columns, components_for
+from profiling import StageProfiler, phase, step
+from schema import AGE_GROUPS, POVERTY_CATEGORIES, UNKNOWN, write_processed_data
+from survey_weights import CYCLES, add_pooled_weights
+from threshold_sweep import FERRITIN_CUTOFF, HEMOGLOBIN_CUTOFF
+
 # Set random seed for reproducibility
 np.random.seed(42)
 
@@ -28,23 +44,23 @@ np.random.seed(42)
 DATA_DIR = "Processed Data/Data"
 OUTPUT_DIR = "studies/iron-deficiency-women-2026-01-31/04-analysis"
 
-# Study parameters
-CYCLES = {
-    'D': '2005-2006',
-    'E': '2007-2008', 
-    'F': '2009-2010',
-    'G': '2011-2012',
-    'H': '2013-2014',
-    'I': '2015-2016',
-    'J': '2017-2018',
-    'L': '2021-2022'
-}
+# Bump when the per-cycle preparation changes in a way the source hash
+# below does not capture, so cached cycles are rebuilt
+PREP_VERSION = 1
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PREP_SOURCES = [os.path.join(SCRIPTS_DIR, name) for name in ('01_data_prep.py', 'nhanes_components.py')]
 
-# Number of cycles for weight adjustment
-N_CYCLES = 8
+# Exclusion cascade labels: criterion -> (excluded participants, remaining population)
+EXCLUSION_CRITERIA = {
+    'age_18_45': ('Age <18 or >45', 'Participants 18-45 years'),
+    'female': ('Male', 'Women 18-45 years'),
+    'pregnant': ('Pregnant', 'Non-pregnant women 18-45 years'),
+    'missing_ferritin': ('Missing ferritin', 'With ferritin measurement'),
+    'missing_hemoglobin': ('Missing hemoglobin', 'With complete iron status data'),
+}
 
-def load_dataset(prefix, cycle):
-    """Load a single NHANES dataset file."""
+def load_dataset(prefix, cycle, columns=None):
+    """Load a single NHANES dataset file (only SEQN and `columns` if given)."""
     filename = f"{prefix}_{cycle}.csv"
     filepath = os.path.join(DATA_DIR, filename)
     
@@ -52,8 +68,14 @@ def load_dataset(prefix, cycle):
         print(f"Warning: {filepath} not found, skipping...")
         return None
     
+    usecols = None
+    if columns is not None:
+        wanted = {'SEQN'} | set(columns)
+        usecols = lambda col: col in wanted
+    
     try:
-        df = pd.read_csv(filepath, dtype=str)
+        with step(f"read {filename}"):
+            df = pd.read_csv(filepath, dtype=str, usecols=usecols)
         # Add cycle identifier
         df['cycle'] = cycle
         df['cycle_year'] = CYCLES[cycle]
@@ -63,242 +85,158 @@ def load_dataset(prefix, cycle):
         print(f"Error loading {filename}: {e}")
         return None
 
-def load_and_combine_datasets(prefix, cycles):
+def load_and_combine_datasets(prefix, cycles, columns=None):
     """Load and combine datasets across multiple cycles."""
-    dfs = []
-    for cycle in cycles:
-        df = load_dataset(prefix, cycle)
-        if df is not None:
-            dfs.append(df)
-    
-    if not dfs:
-        return None
-    
-    combined = pd.concat(dfs, ignore_index=True)
+    with step(f"load {prefix}"):
+        dfs = []
+        for cycle in cycles:
+            df = load_dataset(prefix, cycle, columns)
+            if df is not None:
+                dfs.append(df)
+        
+        if not dfs:
+            return None
+        
+        combined = pd.concat(dfs, ignore_index=True)
     print(f"Combined {prefix}: {len(combined)} total rows from {len(dfs)} cycles")
     return combined
 
-def convert_to_numeric(df, columns):
-    """Convert specified columns to numeric, handling missing values."""
-    for col in columns:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-    return df
-
-def main():
-    print("=" * 70)
-    print("NHANES Iron Deficiency Without Anemia Study - Data Preparation")
-    print("=" * 70)
-    print()
-    
-    # Define which cycles have which datasets
-    # Note: Not all datasets are available in all cycles
-    demo_cycles = ['D', 'E', 'F', 'G', 'H', 'I', 'J', 'L']
-    fertin_cycles = ['D', 'E', 'F', 'I', 'J']  # G, H, L not available
-    cbc_cycles = ['D', 'E', 'F', 'G', 'H', 'I', 'J', 'L']
-    dsqtot_cycles = ['E', 'F', 'G', 'H', 'I', 'J', 'L']  # D not available
-    bmx_cycles = ['D', 'E', 'F', 'G', 'H', 'I', 'J', 'L']
-    fetib_cycles = ['D', 'J']  # Only available in D and J
-    
-    # Load datasets
-    print("Loading DEMO (Demographics)...")
-    demo = load_and_combine_datasets('DEMO', demo_cycles)
-    
-    print("\nLoading FERTIN (Ferritin)...")
-    fertin = load_and_combine_datasets('FERTIN', fertin_cycles)
-    
-    print("\nLoading CBC (Complete Blood Count)...")
-    cbc = load_and_combine_datasets('CBC', cbc_cycles)
-    
-    print("\nLoading DSQTOT (Dietary Supplements)...")
-    dsqtot = load_and_combine_datasets('DSQTOT', dsqtot_cycles)
-    
-    print("\nLoading BMX (Body Measures)...")
-    bmx = load_and_combine_datasets('BMX', bmx_cycles)
-    
-    print("\nLoading FETIB (Iron/TIBC - optional)...")
-    fetib = load_and_combine_datasets('FETIB', fetib_cycles)
-    
-    # Check if critical datasets loaded
-    if demo is None or fertin is None:
-        print("\nError: Critical datasets (DEMO, FERTIN) not available!")
-        sys.exit(1)
-    
-    # Select relevant columns
-    print("\n" + "=" * 70)
-    print("Selecting relevant columns...")
-    print("=" * 70)
-    
-    # DEMO columns
-    demo_cols = ['SEQN', 'cycle', 'cycle_year', 'RIAGENDR', 'RIDAGEYR', 'RIDRETH1', 
-                 'INDFMPIR', 'WTMEC2YR', 'SDMVSTRA', 'SDMVPSU', 'RIDEXPRG']
-    demo = demo[[col for col in demo_cols if col in demo.columns]].copy()
-    
-    # FERTIN columns
-    fertin_cols = ['SEQN', 'LBXFER']
-    fertin = fertin[[col for col in fertin_cols if col in fertin.columns]].copy()
-    
-    # CBC columns
-    cbc_cols = ['SEQN', 'LBXHGB']
-    if cbc is not None:
-        cbc = cbc[[col for col in cbc_cols if col in cbc.columns]].copy()
-    
-    # DSQTOT columns
-    dsqtot_cols = ['SEQN', 'DSQTIRON']
-    if dsqtot is not None:
-        dsqtot = dsqtot[[col for col in dsqtot_cols if col in dsqtot.columns]].copy()
-    
-    # BMX columns
-    bmx_cols = ['SEQN', 'BMXBMI']
-    if bmx is not None:
-        bmx = bmx[[col for col in bmx_cols if col in bmx.columns]].copy()
-    
-    # FETIB columns (optional)
-    fetib_cols = ['SEQN', 'LBXIRN', 'LBXTIB', 'LBDPCT']
-    if fetib is not None:
-        fetib = fetib[[col for col in fetib_cols if col in fetib.columns]].copy()
-    
-    # Convert to numeric
-    print("\nConverting columns to numeric...")
-    
-    demo = convert_to_numeric(demo, ['RIAGENDR', 'RIDAGEYR', 'RIDRETH1', 'INDFMPIR', 
-                                      'WTMEC2YR', 'SDMVSTRA', 'SDMVPSU', 'RIDEXPRG'])
-    fertin = convert_to_numeric(fertin, ['LBXFER'])
-    if cbc is not None:
-        cbc = convert_to_numeric(cbc, ['LBXHGB'])
-    if dsqtot is not None:
-        dsqtot = convert_to_numeric(dsqtot, ['DSQTIRON'])
-    if bmx is not None:
-        bmx = convert_to_numeric(bmx, ['BMXBMI'])
-    if fetib is not None:
-        fetib = convert_to_numeric(fetib, ['LBXIRN', 'LBXTIB', 'LBDPCT'])
-    
-    # Merge datasets
-    print("\n" + "=" * 70)
-    print("Merging datasets...")
-    print("=" * 70)
+def load_component(prefix, cycles=None):
+    """Load a registered component across its cycles (or the given ones) and convert column dtypes."""
+    spec = NHANES_COMPONENTS[prefix]
+    cycles = [cycle for cycle in (cycles or spec['cycles']) if cycle in spec['cycles']]
+    if not cycles:
+        return None
+    data = load_and_combine_datasets(prefix, cycles, list(spec['columns']))
+    if data is None:
+        return None
     
-    # Start with DEMO as base
-    df = demo.copy()
-    print(f"DEMO base: {len(df)} rows")
-    
-    # Merge FERTIN (inner join - must have ferritin)
-    df = df.merge(fertin, on='SEQN', how='inner')
-    print(f"After FERTIN merge: {len(df)} rows")
-    
-    # Merge CBC (inner join - must have hemoglobin)
-    if cbc is not None:
-        df = df.merge(cbc, on='SEQN', how='inner')
-        print(f"After CBC merge: {len(df)} rows")
-    
-    # Merge DSQTOT (left join - supplement data optional)
-    if dsqtot is not None:
-        df = df.merge(dsqtot, on='SEQN', how='left')
-        print(f"After DSQTOT merge: {len(df)} rows")
-    else:
-        df['DSQTIRON'] = np.nan
-    
-    # Merge BMX (left join - BMI optional)
-    if bmx is not None:
-        df = df.merge(bmx, on='SEQN', how='left')
-        print(f"After BMX merge: {len(df)} rows")
-    else:
-        df['BMXBMI'] = np.nan
-    
-    # Merge FETIB (left join - optional)
-    if fetib is not None:
-        df = df.merge(fetib, on='SEQN', how='left')
-        print(f"After FETIB merge: {len(df)} rows")
-    
-    print(f"\nTotal merged dataset: {len(df)} rows")
-    
-    # Apply inclusion/exclusion criteria
-    print("\n" + "=" * 70)
-    print("Applying inclusion/exclusion criteria...")
-    print("=" * 70)
+    for col, dtype in spec['columns'].items():
+        if col in data.columns:
+            data[col] = pd.to_numeric(data[col], errors='coerce').astype(dtype)
+    return data
+
+def merge_components(components):
+    """Merge loaded components on SEQN following each component's join type."""
+    df = None
+    for prefix, data in components.items():
+        spec = NHANES_COMPONENTS[prefix]
+        
+        if spec['join'] == 'base':
+            df = data[['SEQN', 'cycle', 'cycle_year']
+                      + [col for col in spec['columns'] if col in data.columns]].copy()
+            print(f"{prefix} base: {len(df)} rows")
+            continue
+        
+        if data is None:
+            # Optional component not available: keep its columns as missing
+            for col in component_columns(prefix):
+                if col not in df.columns:
+                    df[col] = np.nan
+            continue
+        
+        cols = ['SEQN'] + [col for col in spec['columns'] if col in data.columns]
+        with step(f"merge {prefix}"):
+            df = df.merge(data[cols], on='SEQN', how=spec['join'])
+        print(f"After {prefix} merge: {len(df)} rows")
+        
+        # Declared columns absent from every cycle's file stay missing
+        for col in spec['columns']:
+            if col not in df.columns:
+                df[col] = np.nan
+        
+        # Derived columns; components sharing a derived column fill each other's gaps
+        for col, expr in spec.get('derived', {}).items():
+            values = df.eval(expr)
+            df[col] = values if col not in df.columns else df[col].combine_first(values)
     
-    initial_n = len(df)
-    print(f"Initial sample: {initial_n:,}")
+    return df
+
+def apply_criterion(df, keep, criterion, cascade):
+    """Keep the rows meeting a criterion and record the step in the exclusion cascade."""
+    n_before = len(df)
+    df = df[keep].copy()
+    exclusion, population = EXCLUSION_CRITERIA[criterion]
+    cascade.append({
+        'criterion': criterion,
+        'exclusion': exclusion,
+        'population': population,
+        'n_before': n_before,
+        'n_excluded': n_before - len(df),
+        'n_after': len(df),
+    })
+    return df
+
+def cycle_fingerprint(cycle, prefixes, source):
+    """Fingerprint of a cycle's raw files and of the code and settings preparing them."""
+    files = [os.path.join(DATA_DIR, f"{prefix}_{cycle}.csv") for prefix in prefixes
+             if cycle in NHANES_COMPONENTS[prefix]['cycles']]
+    return input_fingerprint([path for path in files if os.path.exists(path)],
+                             extra=[f"v{PREP_VERSION}", source, ','.join(prefixes), CYCLES[cycle],
+                                    FERRITIN_CUTOFF, HEMOGLOBIN_CUTOFF])
+
+def prepare_cycle(cycle, prefixes):
+    """Load, merge, select and derive the participants of one cycle.
+    
+    Returns (rows, meta). rows is None when a base or inner-join component
+    has no data for the cycle, since its participants would drop out of
+    the merge. meta records the components loaded, the cycle's exclusion
+    cascade and the number of ferritin values set to the detection limit.
+    """
+    components = {prefix: load_component(prefix, [cycle]) for prefix in prefixes}
+    meta = {
+        'components': [prefix for prefix, data in components.items() if data is not None],
+        'cascade': [],
+        'n_below_detection': 0,
+        'n_very_low': 0,
+    }
+    if any(data is None and NHANES_COMPONENTS[prefix]['join'] in ('base', 'inner')
+           for prefix, data in components.items()):
+        return None, meta
     
-    # Track exclusions
-    exclusions = {}
+    df = merge_components(components)
+    df['SEQN'] = pd.to_numeric(df['SEQN'])
+    cascade = meta['cascade']
     
     # Inclusion 1: Age 18-45 years
     df['age_eligible'] = (df['RIDAGEYR'] >= 18) & (df['RIDAGEYR'] <= 45)
-    exclusions['age_18_45'] = initial_n - df['age_eligible'].sum()
-    df = df[df['age_eligible']].copy()
-    print(f"After age 18-45 inclusion: {len(df):,} (excluded {exclusions['age_18_45']:,})")
+    df = apply_criterion(df, df['age_eligible'], 'age_18_45', cascade)
     
     # Inclusion 2: Female
     df['female'] = df['RIAGENDR'] == 2
-    exclusions['female'] = len(df) - df['female'].sum()
-    df = df[df['female']].copy()
-    print(f"After female inclusion: {len(df):,} (excluded {exclusions['female']:,})")
+    df = apply_criterion(df, df['female'], 'female', cascade)
     
     # Exclusion 1: Pregnant women
     # RIDEXPRG: 1 = Yes, pregnant, 2 = No, 3 = Could not be determined
     # Missing values are treated as not pregnant for conservatism, but we'll exclude definite pregnancies
     df['not_pregnant'] = (df['RIDEXPRG'] != 1) | (df['RIDEXPRG'].isna())
-    exclusions['pregnant'] = len(df) - df['not_pregnant'].sum()
-    df = df[df['not_pregnant']].copy()
-    print(f"After excluding pregnant: {len(df):,} (excluded {exclusions['pregnant']:,})")
+    df = apply_criterion(df, df['not_pregnant'], 'pregnant', cascade)
     
     # Exclusion 2: Missing ferritin
     df['has_ferritin'] = df['LBXFER'].notna()
-    exclusions['missing_ferritin'] = len(df) - df['has_ferritin'].sum()
-    df = df[df['has_ferritin']].copy()
-    print(f"After excluding missing ferritin: {len(df):,} (excluded {exclusions['missing_ferritin']:,})")
+    df = apply_criterion(df, df['has_ferritin'], 'missing_ferritin', cascade)
     
     # Exclusion 3: Missing hemoglobin
     if 'LBXHGB' in df.columns:
         df['has_hemoglobin'] = df['LBXHGB'].notna()
-        exclusions['missing_hemoglobin'] = len(df) - df['has_hemoglobin'].sum()
-        df = df[df['has_hemoglobin']].copy()
-        print(f"After excluding missing hemoglobin: {len(df):,} (excluded {exclusions['missing_hemoglobin']:,})")
+        df = apply_criterion(df, df['has_hemoglobin'], 'missing_hemoglobin', cascade)
     
     # Handle below-detection ferritin values
     # According to NHANES documentation, ferritin values below detection limit should be set to 2.0 ng/mL
-    print("\n" + "=" * 70)
-    print("Handling below-detection ferritin values...")
-    print("=" * 70)
-    
-    # Check for very low or zero values (indicating below detection)
     below_detection = (df['LBXFER'] <= 0) | (df['LBXFER'].isna())
-    n_below = below_detection.sum()
-    
-    # Set below-detection values to 2.0 ng/mL
     df.loc[below_detection, 'LBXFER'] = 2.0
-    print(f"Set {n_below:,} below-detection ferritin values to 2.0 ng/mL")
     
     # Also set any ferritin < 2 to 2.0 (conservative approach)
     very_low = df['LBXFER'] < 2.0
-    n_very_low = very_low.sum()
     df.loc[very_low, 'LBXFER'] = 2.0
-    print(f"Set {n_very_low:,} very low ferritin values to 2.0 ng/mL")
-    
-    # Create IDWA status variable
-    print("\n" + "=" * 70)
-    print("Creating IDWA status variable...")
-    print("=" * 70)
+    meta['n_below_detection'] = int(below_detection.sum())
+    meta['n_very_low'] = int(very_low.sum())
     
     # IDWA Definition: Ferritin <15 ng/mL AND Hemoglobin ≥12 g/dL
-    df['iron_deficient'] = df['LBXFER'] < 15.0
-    df['not_anemic'] = df['LBXHGB'] >= 12.0
+    df['iron_deficient'] = df['LBXFER'] < FERRITIN_CUTOFF
+    df['not_anemic'] = df['LBXHGB'] >= HEMOGLOBIN_CUTOFF
     df['IDWA'] = df['iron_deficient'] & df['not_anemic']
     
-    n_idwa = df['IDWA'].sum()
-    n_iron_def = df['iron_deficient'].sum()
-    n_anemic = (~df['not_anemic']).sum()
-    
-    print(f"Iron deficient (ferritin <15): {n_iron_def:,} ({100*n_iron_def/len(df):.1f}%)")
-    print(f"Anemic (hemoglobin <12): {n_anemic:,} ({100*n_anemic/len(df):.1f}%)")
-    print(f"IDWA cases: {n_idwa:,} ({100*n_idwa/len(df):.1f}%)")
-    
-    # Create iron supplement use variable
-    print("\n" + "=" * 70)
-    print("Creating iron supplement use variable...")
-    print("=" * 70)
-    
     # DSQTIRON > 0 indicates iron supplement use
     df['iron_supplement'] = (df['DSQTIRON'] > 0) & (df['DSQTIRON'].notna())
     df['iron_supplement'] = df['iron_supplement'].astype(int)
@@ -309,25 +247,120 @@ def main():
     df.loc[df['DSQTIRON'] >= 18, 'iron_dose'] = 'Moderate'  # ~100% RDA
     df.loc[df['DSQTIRON'] >= 27, 'iron_dose'] = 'High'  # Pregnancy RDA level
     
+    # Create log-transformed ferritin
+    df['log_ferritin'] = np.log(df['LBXFER'])
+    
+    return df, meta
+
+def main():
+    parser = argparse.ArgumentParser(description="NHANES IDWA data preparation")
+    parser.add_argument('--analyses', nargs='+', choices=list(ANALYSIS_REQUIREMENTS),
+                        default=list(ANALYSIS_REQUIREMENTS),
+                        help="Analyses to prepare data for (lazy components load only if needed)")
+    parser.add_argument('--rebuild', action='store_true',
+                        help="Prepare every cycle from its raw files, ignoring the per-cycle cache")
+    args = parser.parse_args()
+    
+    print("=" * 70)
+    print("NHANES Iron Deficiency Without Anemia Study - Data Preparation")
+    print("=" * 70)
+    print()
+    
+    # Components needed by the requested analyses (see nhanes_components.py)
+    prefixes = components_for(args.analyses)
+    skipped = [prefix for prefix in NHANES_COMPONENTS if prefix not in prefixes]
+    if skipped:
+        print(f"Skipping components not referenced by {', '.join(args.analyses)}: {', '.join(skipped)}")
+    
+    phase('prepare cycles')
+    # Load, merge, select and derive each cycle; unchanged cycles come from the cache
+    print("\n" + "=" * 70)
+    print("Preparing cycles...")
+    print("=" * 70)
+    
+    cache_dir = os.path.join(OUTPUT_DIR, PREPARED_CYCLES_DIR)
+    source = source_hash(*PREP_SOURCES)
+    frames = []
+    cascade = []
+    loaded_cycles = {prefix: [] for prefix in prefixes}
+    n_below = n_very_low = 0
+    for cycle in CYCLES:
+        fingerprint = cycle_fingerprint(cycle, prefixes, source)
+        cached = None if args.rebuild else read_cached_cycle(cache_dir, cycle, fingerprint)
+        if cached is not None:
+            data, meta = cached
+            print(f"Cycle {cycle} ({CYCLES[cycle]}): using cached preparation ({meta['n_rows']:,} rows)")
+        else:
+            print(f"\nPreparing cycle {cycle} ({CYCLES[cycle]})...")
+            with step(f"prepare {cycle}"):
+                data, meta = prepare_cycle(cycle, prefixes)
+            meta = write_cached_cycle(cache_dir, cycle, data, fingerprint, meta)
+            print(f"Cycle {cycle}: {meta['n_rows']:,} eligible participants")
+        
+        # Record the cycles each component actually loaded for weight pooling
+        for prefix in meta['components']:
+            loaded_cycles[prefix].append(cycle)
+        cascade.extend(meta['cascade'])
+        n_below += meta['n_below_detection']
+        n_very_low += meta['n_very_low']
+        if data is not None:
+            frames.append(data)
+    
+    # Check if critical datasets loaded
+    missing = [prefix for prefix, cycles in loaded_cycles.items()
+               if not cycles and NHANES_COMPONENTS[prefix].get('required')]
+    if missing or not frames:
+        print(f"\nError: Critical datasets ({', '.join(missing) or 'any cycle'}) not available!")
+        sys.exit(1)
+    
+    df = pd.concat(frames, ignore_index=True)
+    
+    # Exclusion cascade over all cycles (one row per criterion, in order)
+    cascade = (pd.DataFrame(cascade)
+               .groupby(['criterion', 'exclusion', 'population'], sort=False, as_index=False)
+               [['n_before', 'n_excluded', 'n_after']].sum()
+               .to_dict('records'))
+    
+    print("\n" + "=" * 70)
+    print("Inclusion/exclusion criteria")
+    print("=" * 70)
+    print(f"Initial sample: {cascade[0]['n_before']:,}")
+    for criterion in cascade:
+        print(f"{criterion['population']}: {criterion['n_after']:,} (excluded {criterion['n_excluded']:,})")
+    print(f"Set {n_below:,} below-detection ferritin values to 2.0 ng/mL")
+    print(f"Set {n_very_low:,} very low ferritin values to 2.0 ng/mL")
+    
+    # IDWA status and iron supplement use
+    print("\n" + "=" * 70)
+    print("IDWA status and iron supplement use")
+    print("=" * 70)
+    
+    n_idwa = df['IDWA'].sum()
+    n_iron_def = df['iron_deficient'].sum()
+    n_anemic = (~df['not_anemic']).sum()
+    
+    print(f"Iron deficient (ferritin <{FERRITIN_CUTOFF:g}): {n_iron_def:,} ({100*n_iron_def/len(df):.1f}%)")
+    print(f"Anemic (hemoglobin <{HEMOGLOBIN_CUTOFF:g}): {n_anemic:,} ({100*n_anemic/len(df):.1f}%)")
+    print(f"IDWA cases: {n_idwa:,} ({100*n_idwa/len(df):.1f}%)")
+    
     n_supp = df['iron_supplement'].sum()
     print(f"Iron supplement users: {n_supp:,} ({100*n_supp/len(df):.1f}%)")
     print(f"Iron dose distribution:")
     print(df['iron_dose'].value_counts())
     
-    # Create log-transformed ferritin
-    df['log_ferritin'] = np.log(df['LBXFER'])
-    
+    phase('weights')
     # Adjust survey weights for pooled cycles
     print("\n" + "=" * 70)
     print("Adjusting survey weights for pooled cycles...")
     print("=" * 70)
     
-    # Weight adjustment: WTMEC2YR / N_CYCLES (8 cycles)
-    df['weight_adjusted'] = df['WTMEC2YR'] / N_CYCLES
-    print(f"Adjusted weights: WTMEC2YR / {N_CYCLES}")
+    # Weights are pooled over the cycles contributing data for each analysis
+    # (e.g. FERTIN cycles for the primary weight, FETIB cycles for iron/TIBC)
+    df = add_pooled_weights(df, available=loaded_cycles)
     print(f"Weight statistics:")
     print(df['weight_adjusted'].describe())
     
+    phase('categories')
     # Create race/ethnicity categories
     print("\n" + "=" * 70)
     print("Creating race/ethnicity categories...")
@@ -347,7 +380,7 @@ def main():
         5: 'Other Race'
     }
     df['race_category'] = df['RIDRETH1'].map(race_mapping)
-    df['race_category'] = df['race_category'].fillna('Unknown')
+    df['race_category'] = df['race_category'].fillna(UNKNOWN)
     print(df['race_category'].value_counts())
     
     # Create age groups
@@ -357,7 +390,7 @@ def main():
     
     df['age_group'] = pd.cut(df['RIDAGEYR'], 
                               bins=[17, 25, 30, 35, 40, 45],
-                              labels=['18-25', '26-30', '31-35', '36-40', '41-45'],
+                              labels=AGE_GROUPS,
                               include_lowest=True)
     print(df['age_group'].value_counts().sort_index())
     
@@ -367,10 +400,11 @@ def main():
     print("=" * 70)
     
     # INDFMPIR: Family income to poverty ratio
-    df['poverty_category'] = 'Unknown'
-    df.loc[df['INDFMPIR'] < 1.3, 'poverty_category'] = 'Low (<1.3)'
-    df.loc[(df['INDFMPIR'] >= 1.3) & (df['INDFMPIR'] < 3.5), 'poverty_category'] = 'Medium (1.3-3.5)'
-    df.loc[df['INDFMPIR'] >= 3.5, 'poverty_category'] = 'High (≥3.5)'
+    poverty_low, poverty_medium, poverty_high = POVERTY_CATEGORIES
+    df['poverty_category'] = UNKNOWN
+    df.loc[df['INDFMPIR'] < 1.3, 'poverty_category'] = poverty_low
+    df.loc[(df['INDFMPIR'] >= 1.3) & (df['INDFMPIR'] < 3.5), 'poverty_category'] = poverty_medium
+    df.loc[df['INDFMPIR'] >= 3.5, 'poverty_category'] = poverty_high
     print(df['poverty_category'].value_counts())
     
     # Final dataset summary
@@ -386,18 +420,23 @@ def main():
     print("\n" + "=" * 70)
     print("Exclusion Summary")
     print("=" * 70)
-    for reason, count in exclusions.items():
-        print(f"{reason}: {count:,}")
+    for criterion in cascade:
+        print(f"{criterion['criterion']}: {criterion['n_excluded']:,}")
     
-    # Save processed dataset
+    phase('write')
+    # Save processed dataset (checked against the schema in schema.py)
     output_file = os.path.join(OUTPUT_DIR, 'processed_data.csv')
-    df.to_csv(output_file, index=False)
+    write_processed_data(df, output_file)
     print(f"\nSaved processed dataset to: {output_file}")
     print(f"Dataset shape: {df.shape}")
     
-    # Save exclusion summary
-    exclusion_df = pd.DataFrame(list(exclusions.items()), columns=['exclusion_reason', 'count'])
+    # Save exclusion summary and the full cascade (drives the flow diagram)
+    cascade_df = pd.DataFrame(cascade)
+    exclusion_df = cascade_df[['criterion', 'n_excluded']].rename(
+        columns={'criterion': 'exclusion_reason', 'n_excluded': 'count'})
     exclusion_df.to_csv(os.path.join(OUTPUT_DIR, 'exclusions.csv'), index=False)
+    cascade_df.to_csv(os.path.join(OUTPUT_DIR, 'exclusion_cascade.csv'), index=False)
+    print(f"Saved exclusion cascade to: {os.path.join(OUTPUT_DIR, 'exclusion_cascade.csv')}")
     
     print("\n" + "=" * 70)
     print("Data preparation complete!")
@@ -406,4 +445,5 @@ def main():
     return df
 
 if __name__ == "__main__":
-    main()
+    with StageProfiler('01_data_prep', OUTPUT_DIR):
+        main()
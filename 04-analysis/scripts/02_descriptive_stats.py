@@ -9,7 +9,11 @@ This script:
 3. Generates demographic breakdowns
 4. Analyzes iron status distribution
 5. Computes supplement use prevalence
-6. Outputs LaTeX table and CSV
+6. Sweeps IDWA prevalence over ferritin x hemoglobin cutoffs
+7. Tests IDWA prevalence differences across Table 2 groupings
+   (Rao-Scott design-adjusted chi-square)
+8. Renders Tables 1, 2 and S3 as LaTeX, Markdown and CSV (see
+   table_renderer.py) and saves the result CSVs
 
 Author: NHANES Analysis Pipeline
 Date: 2026-01-31
@@ -21,50 +25,54 @@ import os
 import sys
 from scipy import stats
 
+from prevalence_cube import PrevalenceCube
+from profiling import StageProfiler, phase
+from rao_scott import rao_scott_tests
+from results_store import STORE_FILE, current_run_id, write_estimates
+from schema import (AGE_GROUPS, RACE_CATEGORIES, POVERTY_CATEGORIES, IRON_DOSE_CATEGORIES,
+                    read_processed_data)
+from survey_design import (SurveyDesign, weighted_mean, weighted_std, weighted_proportion,
+                           weighted_quantiles)
+from table_renderer import render_table
+from threshold_sweep import (sweep_idwa_prevalence, FERRITIN_CUTOFF, HEMOGLOBIN_CUTOFF,
+                             SENSITIVITY_FERRITIN_CUTOFF)
+
 # Set random seed for reproducibility
 np.random.seed(42)
 
 OUTPUT_DIR = "studies/iron-deficiency-women-2026-01-31/04-analysis"
 TABLES_DIR = os.path.join(OUTPUT_DIR, "outputs", "tables")
+RESULTS_STORE = os.path.join(OUTPUT_DIR, "outputs", STORE_FILE)
 
-def weighted_mean(x, weights):
-    """Calculate weighted mean."""
-    mask = ~np.isnan(x) & ~np.isnan(weights) & (weights > 0)
-    if mask.sum() == 0:
-        return np.nan
-    return np.average(x[mask], weights=weights[mask])
+# Continuous Table 1 variables summarized by weighted median [IQR]
+CONTINUOUS_VARIABLES = {
+    'age': 'RIDAGEYR',
+    'poverty': 'INDFMPIR',
+    'bmi': 'BMXBMI',
+    'ferritin': 'LBXFER',
+    'hemoglobin': 'LBXHGB',
+}
 
-def weighted_std(x, weights):
-    """Calculate weighted standard deviation."""
-    mask = ~np.isnan(x) & ~np.isnan(weights) & (weights > 0)
-    if mask.sum() < 2:
-        return np.nan
-    
-    mean = weighted_mean(x, weights)
-    variance = np.average((x[mask] - mean)**2, weights=weights[mask])
-    n_eff = mask.sum()
-    if n_eff > 1:
-        variance = variance * n_eff / (n_eff - 1)
-    return np.sqrt(variance)
+# Cutoffs reported in the threshold sensitivity table
+SENSITIVITY_FERRITIN_CUTOFFS = [12.0, FERRITIN_CUTOFF, 20.0, SENSITIVITY_FERRITIN_CUTOFF, 30.0]
+SENSITIVITY_HEMOGLOBIN_CUTOFFS = [11.5, HEMOGLOBIN_CUTOFF, 12.5]
 
-def weighted_proportion(x, weights):
-    """Calculate weighted proportion."""
-    mask = ~np.isnan(x) & ~np.isnan(weights) & (weights > 0)
-    if mask.sum() == 0:
-        return np.nan, np.nan
-    
-    x_clean = x[mask].astype(float)
-    w_clean = weights[mask]
-    
-    prop = np.average(x_clean, weights=w_clean)
-    n_eff = mask.sum()
-    
-    if n_eff > 1:
-        se = np.sqrt(prop * (1 - prop) / n_eff)
-    else:
-        se = np.nan
-    
-    return prop, se
+# Table 2 groupings: label -> (cube dimension, reporting levels)
+TABLE2_GROUPS = {
+    'Age Group': ('age_group', AGE_GROUPS),
+    'Race/Ethnicity': ('race_category', RACE_CATEGORIES),
+    'Poverty Status': ('poverty_category', POVERTY_CATEGORIES),
+    'Iron Supplement': ('iron_supplement', [0, 1]),
+}
+
+def race_key(race):
+    """Table 1 result key of a race/ethnicity category."""
+    return f'race_{race.replace(" ", "_").replace("-", "_")}'
+
+def poverty_key(category):
+    """Table 1 result key of a poverty category."""
+    cat_key = category.replace(" ", "_").replace("(", "").replace(")", "").replace("<", "lt_").replace("≥", "ge_")
+    return f'poverty_{cat_key}'
 
 def format_percent(value, se=None):
     """Format percentage with standard error."""
@@ -88,292 +96,254 @@ def format_median_iqr(median, q25, q75):
         return "N/A"
     return f"{median:.1f} [{q25:.1f}, {q75:.1f}]"
 
-def calculate_table1_characteristics(df):
+def calculate_table1_characteristics(df, design):
     """Calculate Table 1: Study population characteristics."""
     
     results = {}
-    weights = df['weight_adjusted'].values
     
     # Overall N
     results['N'] = len(df)
-    results['N_weighted'] = weights.sum()
+    results['N_weighted'] = design.weight_total
+    
+    # Weighted quartiles (with Woodruff 95% CIs) for all continuous
+    # variables in a single call
+    quartiles = weighted_quantiles(df[list(CONTINUOUS_VARIABLES.values())].values,
+                                   design, probs=[0.25, 0.5, 0.75])
+    
+    def add_quartiles(key):
+        j = list(CONTINUOUS_VARIABLES).index(key)
+        results[f'{key}_median'] = quartiles['quantile'][1, j]
+        results[f'{key}_median_ci_low'] = quartiles['ci_low'][1, j]
+        results[f'{key}_median_ci_high'] = quartiles['ci_high'][1, j]
+        results[f'{key}_q25'] = quartiles['quantile'][0, j]
+        results[f'{key}_q75'] = quartiles['quantile'][2, j]
     
     # Age
-    results['age_mean'] = weighted_mean(df['RIDAGEYR'].values, weights)
-    results['age_sd'] = weighted_std(df['RIDAGEYR'].values, weights)
-    results['age_median'] = np.median(df['RIDAGEYR'].dropna())
-    results['age_q25'] = df['RIDAGEYR'].quantile(0.25)
-    results['age_q75'] = df['RIDAGEYR'].quantile(0.75)
+    results['age_mean'] = weighted_mean(df['RIDAGEYR'].values, design)
+    results['age_sd'] = weighted_std(df['RIDAGEYR'].values, design)
+    add_quartiles('age')
     
     # Race/Ethnicity
-    for race in ['Mexican American', 'Other Hispanic', 'Non-Hispanic White', 
-                 'Non-Hispanic Black', 'Other Race']:
+    for race in RACE_CATEGORIES:
         race_indicator = (df['race_category'] == race).astype(int).values
-        prop, se = weighted_proportion(race_indicator, weights)
-        results[f'race_{race.replace(" ", "_").replace("-", "_")}'] = prop
-        results[f'race_{race.replace(" ", "_").replace("-", "_")}_se'] = se
+        prop, se = weighted_proportion(race_indicator, design)
+        results[race_key(race)] = prop
+        results[f'{race_key(race)}_se'] = se
     
     # Poverty ratio
-    poverty_mean = weighted_mean(df['INDFMPIR'].values, weights)
-    poverty_sd = weighted_std(df['INDFMPIR'].values, weights)
+    poverty_mean = weighted_mean(df['INDFMPIR'].values, design)
+    poverty_sd = weighted_std(df['INDFMPIR'].values, design)
     results['poverty_mean'] = poverty_mean
     results['poverty_sd'] = poverty_sd
+    add_quartiles('poverty')
     
-    for pov_cat in ['Low (<1.3)', 'Medium (1.3-3.5)', 'High (>=3.5)']:
+    for pov_cat in POVERTY_CATEGORIES:
         pov_indicator = (df['poverty_category'] == pov_cat).astype(int).values
-        prop, se = weighted_proportion(pov_indicator, weights)
-        cat_key = pov_cat.replace(" ", "_").replace("(", "").replace(")", "").replace("<", "lt_").replace(">=", "ge_")
-        results[f'poverty_{cat_key}'] = prop
-        results[f'poverty_{cat_key}_se'] = se
+        prop, se = weighted_proportion(pov_indicator, design)
+        results[poverty_key(pov_cat)] = prop
+        results[f'{poverty_key(pov_cat)}_se'] = se
     
     # BMI
-    results['bmi_mean'] = weighted_mean(df['BMXBMI'].values, weights)
-    results['bmi_sd'] = weighted_std(df['BMXBMI'].values, weights)
+    results['bmi_mean'] = weighted_mean(df['BMXBMI'].values, design)
+    results['bmi_sd'] = weighted_std(df['BMXBMI'].values, design)
+    add_quartiles('bmi')
     
     # Iron status
-    results['ferritin_mean'] = weighted_mean(df['LBXFER'].values, weights)
-    results['ferritin_sd'] = weighted_std(df['LBXFER'].values, weights)
-    results['ferritin_median'] = df['LBXFER'].median()
-    results['ferritin_q25'] = df['LBXFER'].quantile(0.25)
-    results['ferritin_q75'] = df['LBXFER'].quantile(0.75)
+    results['ferritin_mean'] = weighted_mean(df['LBXFER'].values, design)
+    results['ferritin_sd'] = weighted_std(df['LBXFER'].values, design)
+    add_quartiles('ferritin')
     
-    results['hemoglobin_mean'] = weighted_mean(df['LBXHGB'].values, weights)
-    results['hemoglobin_sd'] = weighted_std(df['LBXHGB'].values, weights)
+    results['hemoglobin_mean'] = weighted_mean(df['LBXHGB'].values, design)
+    results['hemoglobin_sd'] = weighted_std(df['LBXHGB'].values, design)
+    add_quartiles('hemoglobin')
     
     # IDWA prevalence
-    idwa_prop, idwa_se = weighted_proportion(df['IDWA'].astype(int).values, weights)
+    idwa_prop, idwa_se = weighted_proportion(df['IDWA'].astype(int).values, design)
     results['idwa_prevalence'] = idwa_prop
     results['idwa_se'] = idwa_se
     
     # Iron deficiency (any)
-    iron_def_prop, iron_def_se = weighted_proportion(df['iron_deficient'].astype(int).values, weights)
+    iron_def_prop, iron_def_se = weighted_proportion(df['iron_deficient'].astype(int).values, design)
     results['iron_deficiency_prevalence'] = iron_def_prop
     results['iron_deficiency_se'] = iron_def_se
     
     # Anemia
-    anemia_prop, anemia_se = weighted_proportion((~df['not_anemic']).astype(int).values, weights)
+    anemia_prop, anemia_se = weighted_proportion((~df['not_anemic']).astype(int).values, design)
     results['anemia_prevalence'] = anemia_prop
     results['anemia_se'] = anemia_se
     
     # Iron supplement use
-    supp_prop, supp_se = weighted_proportion(df['iron_supplement'].values, weights)
+    supp_prop, supp_se = weighted_proportion(df['iron_supplement'].values, design)
     results['supplement_prevalence'] = supp_prop
     results['supplement_se'] = supp_se
     
     # Iron dose categories
-    for dose in ['None', 'Low', 'Moderate', 'High']:
+    for dose in IRON_DOSE_CATEGORIES:
         dose_indicator = (df['iron_dose'] == dose).astype(int).values
-        prop, se = weighted_proportion(dose_indicator, weights)
+        prop, se = weighted_proportion(dose_indicator, design)
         results[f'dose_{dose.lower()}'] = prop
         results[f'dose_{dose.lower()}_se'] = se
     
     return results
 
-def calculate_idwa_by_demographics(df):
-    """Calculate IDWA prevalence by demographic subgroups."""
-    
-    results = []
+def calculate_idwa_by_demographics(cube, design):
+    """Calculate IDWA prevalence by demographic subgroups from the prevalence cube.
+
+    Each grouping also carries its Rao-Scott test of equal prevalence.
+    """
+    
+    supplement_labels = {0: 'No', 1: 'Yes'}
+    
+    def make_row(group, subgroup, cell):
+        return {
+            'group': group,
+            'subgroup': subgroup,
+            'n_total': int(cell['n_total']),
+            'n_idwa': int(cell['n_cases']),
+            'idwa_prevalence': cell['prevalence'],
+            'idwa_se': cell['se'],
+            'idwa_se_design': cell['se_design'],
+            'idwa_pct': format_percent(cell['prevalence'], cell['se'])
+        }
     
     # Overall
-    weights = df['weight_adjusted'].values
-    idwa_prop, idwa_se = weighted_proportion(df['IDWA'].astype(int).values, weights)
-    results.append({
-        'group': 'Overall',
-        'subgroup': 'All',
-        'n_total': len(df),
-        'n_idwa': df['IDWA'].sum(),
-        'idwa_prevalence': idwa_prop,
-        'idwa_se': idwa_se,
-        'idwa_pct': format_percent(idwa_prop, idwa_se)
-    })
-    
-    # By age group
-    for age_grp in ['18-25', '26-30', '31-35', '36-40', '41-45']:
-        subgroup_df = df[df['age_group'] == age_grp]
-        if len(subgroup_df) > 0:
-            weights = subgroup_df['weight_adjusted'].values
-            idwa_prop, idwa_se = weighted_proportion(subgroup_df['IDWA'].astype(int).values, weights)
-            results.append({
-                'group': 'Age Group',
-                'subgroup': age_grp,
-                'n_total': len(subgroup_df),
-                'n_idwa': subgroup_df['IDWA'].sum(),
-                'idwa_prevalence': idwa_prop,
-                'idwa_se': idwa_se,
-                'idwa_pct': format_percent(idwa_prop, idwa_se)
-            })
-    
-    # By race/ethnicity
-    for race in ['Mexican American', 'Other Hispanic', 'Non-Hispanic White', 
-                 'Non-Hispanic Black', 'Other Race']:
-        subgroup_df = df[df['race_category'] == race]
-        if len(subgroup_df) > 0:
-            weights = subgroup_df['weight_adjusted'].values
-            idwa_prop, idwa_se = weighted_proportion(subgroup_df['IDWA'].astype(int).values, weights)
-            results.append({
-                'group': 'Race/Ethnicity',
-                'subgroup': race,
-                'n_total': len(subgroup_df),
-                'n_idwa': subgroup_df['IDWA'].sum(),
-                'idwa_prevalence': idwa_prop,
-                'idwa_se': idwa_se,
-                'idwa_pct': format_percent(idwa_prop, idwa_se)
-            })
-    
-    # By poverty category
-    for pov in ['Low (<1.3)', 'Medium (1.3-3.5)', 'High (>=3.5)']:
-        subgroup_df = df[df['poverty_category'] == pov]
-        if len(subgroup_df) > 0:
-            weights = subgroup_df['weight_adjusted'].values
-            idwa_prop, idwa_se = weighted_proportion(subgroup_df['IDWA'].astype(int).values, weights)
-            results.append({
-                'group': 'Poverty Status',
-                'subgroup': pov,
-                'n_total': len(subgroup_df),
-                'n_idwa': subgroup_df['IDWA'].sum(),
-                'idwa_prevalence': idwa_prop,
-                'idwa_se': idwa_se,
-                'idwa_pct': format_percent(idwa_prop, idwa_se)
-            })
-    
-    # By supplement use
-    for supp in [0, 1]:
-        subgroup_df = df[df['iron_supplement'] == supp]
-        if len(subgroup_df) > 0:
-            weights = subgroup_df['weight_adjusted'].values
-            idwa_prop, idwa_se = weighted_proportion(subgroup_df['IDWA'].astype(int).values, weights)
-            label = 'No' if supp == 0 else 'Yes'
-            results.append({
-                'group': 'Iron Supplement',
-                'subgroup': label,
-                'n_total': len(subgroup_df),
-                'n_idwa': subgroup_df['IDWA'].sum(),
-                'idwa_prevalence': idwa_prop,
-                'idwa_se': idwa_se,
-                'idwa_pct': format_percent(idwa_prop, idwa_se)
-            })
-    
-    return pd.DataFrame(results)
+    results = [make_row('Overall', 'All', cube.margin().iloc[0])]
+    
+    # One-way margins by subgroup
+    for group, (dim, levels) in TABLE2_GROUPS.items():
+        margin = cube.margin(dim).set_index(dim).reindex(levels)
+        for level, cell in margin.iterrows():
+            if cell['n_total'] > 0:
+                label = supplement_labels[level] if dim == 'iron_supplement' else level
+                results.append(make_row(group, label, cell))
+    
+    # Design-adjusted tests for every grouping in one pass
+    tests = rao_scott_tests(cube, TABLE2_GROUPS, design.degrees_of_freedom)
+    df_idwa = pd.DataFrame(results)
+    if len(tests):
+        df_idwa = df_idwa.merge(tests.rename(columns={'grouping': 'group'}), on='group', how='left')
+    
+    return df_idwa
 
-def generate_table1_latex(results):
-    """Generate Table 1 in LaTeX format."""
-    
-    lines = [
-        r"\begin{table}[htbp]",
-        r"\centering",
-        r"\caption{Characteristics of Study Population}",
-        r"\label{tab:table1}",
-        r"\begin{tabular}{lc}",
-        r"\toprule",
-        r"\textbf{Characteristic} & \textbf{Value} \\",
-        r"\midrule",
-        f"Sample size, n & {results['N']:,} \\\\",
-        r"\midrule",
-        r"\textbf{Age, years} & \\",
-        f"\quad Mean (SD) & {format_mean_sd(results['age_mean'], results['age_sd'])} \\\\",
-        f"\quad Median [IQR] & {format_median_iqr(results['age_median'], results['age_q25'], results['age_q75'])} \\\\",
-        r"\midrule",
-    ]
-    
-    # Race/Ethnicity
-    lines.append(r"\textbf{Race/Ethnicity, \\% (SE)} & \\")
-    for race in ['Mexican American', 'Other Hispanic', 'Non-Hispanic White', 
-                 'Non-Hispanic Black', 'Other Race']:
-        key = f'race_{race.replace(" ", "_").replace("-", "_")}'
-        pct = format_percent(results[key], results.get(f'{key}_se'))
-        lines.append(f"\quad {race} & {pct} \\\\")
-    lines.append(r"\midrule")
-    
-    # Poverty
-    lines.append(r"\textbf{Poverty Status} & \\")
-    lines.append(f"\quad Poverty ratio, mean (SD) & {format_mean_sd(results['poverty_mean'], results['poverty_sd'])} \\\\")
-    lines.append(r"\quad Poverty category, \\% (SE) & \\")
-    for pov_cat in ['Low (<1.3)', 'Medium (1.3-3.5)', 'High (>=3.5)']:
-        cat_key = pov_cat.replace(" ", "_").replace("(", "").replace(")", "").replace("<", "lt_").replace(">=", "ge_")
-        key = f'poverty_{cat_key}'
-        pct = format_percent(results[key], results.get(f'{key}_se'))
-        lines.append(f"\quad \quad {pov_cat} & {pct} \\\\")
-    lines.append(r"\midrule")
-    
-    # BMI
-    lines.append(f"\\textbf{{BMI, kg/m\\textsuperscript{{2}}, mean (SD)}} & {format_mean_sd(results['bmi_mean'], results['bmi_sd'])} \\\\")
-    lines.append(r"\midrule")
-    
-    # Iron Status
-    lines.append(r"\textbf{Iron Status} & \\")
-    lines.append(f"\quad Ferritin, ng/mL, median [IQR] & {format_median_iqr(results['ferritin_median'], results['ferritin_q25'], results['ferritin_q75'])} \\\\")
-    lines.append(f"\quad Hemoglobin, g/dL, mean (SD) & {format_mean_sd(results['hemoglobin_mean'], results['hemoglobin_sd'])} \\\\")
-    lines.append(r"\midrule")
-    
-    # IDWA
-    lines.append(f"\\textbf{{IDWA prevalence, \\% (SE)}} & {format_percent(results['idwa_prevalence'], results['idwa_se'])} \\\\")
-    lines.append(f"Iron deficiency prevalence, \\% (SE) & {format_percent(results['iron_deficiency_prevalence'], results['iron_deficiency_se'])} \\\\")
-    lines.append(f"Anemia prevalence, \\% (SE) & {format_percent(results['anemia_prevalence'], results['anemia_se'])} \\\\")
-    lines.append(r"\midrule")
-    
-    # Supplements
-    lines.append(f"\\textbf{{Iron supplement use, \\% (SE)}} & {format_percent(results['supplement_prevalence'], results['supplement_se'])} \\\\")
-    lines.append(r"\quad Iron dose category, \\% (SE) & \\")
-    for dose in ['None', 'Low', 'Moderate', 'High']:
-        key = f'dose_{dose.lower()}'
-        pct = format_percent(results[key], results.get(f'{key}_se'))
-        lines.append(f"\quad \quad {dose} & {pct} \\\\")
-    
-    lines.extend([
-        r"\bottomrule",
-        r"\end{tabular}",
-        r"\begin{flushleft}",
-        r"\footnotesize{\textit{Note:} IDWA = Iron Deficiency Without Anemia. Values are weighted estimates unless otherwise noted. SE = standard error. IQR = interquartile range.}",
-        r"\end{flushleft}",
-        r"\end{table}",
-    ])
-    
-    return "\n".join(lines)
+def table1_tidy(results):
+    """Table 1 results as tidy rows (term, estimate, se, sd, q25, q75)."""
+    rows = [{'term': 'N', 'estimate': results['N']}]
+    for var in CONTINUOUS_VARIABLES:
+        rows.append({'term': f'{var}_mean', 'estimate': results[f'{var}_mean'],
+                     'sd': results[f'{var}_sd']})
+        rows.append({'term': f'{var}_median', 'estimate': results[f'{var}_median'],
+                     'q25': results[f'{var}_q25'], 'q75': results[f'{var}_q75']})
+    for key, value in results.items():
+        se_key = key.replace('_prevalence', '_se') if key.endswith('_prevalence') else f'{key}_se'
+        if se_key in results and se_key != key:
+            rows.append({'term': key, 'estimate': value, 'se': results[se_key]})
+    return pd.DataFrame(rows)
 
-def generate_table2_latex(df_idwa):
-    """Generate Table 2 (IDWA by demographics) in LaTeX format."""
-    
-    lines = [
-        r"\begin{table}[htbp]",
-        r"\centering",
-        r"\caption{Prevalence of Iron Deficiency Without Anemia by Demographic Characteristics}",
-        r"\label{tab:table2}",
-        r"\begin{tabular}{lccc}",
-        r"\toprule",
-        r"\textbf{Characteristic} & \textbf{n/N} & \textbf{Prevalence, \\% (SE)} \\",
-        r"\midrule",
+def table1_layout():
+    """Layout of Table 1 (one value column, per-row formats)."""
+    def percent_row(key, label, indent=1, bold=False):
+        return {'key': key, 'label': label, 'format': 'percent_se', 'indent': indent, 'bold': bold}
+    
+    races = TABLE2_GROUPS['Race/Ethnicity'][1]
+    poverty = TABLE2_GROUPS['Poverty Status'][1]
+    rows = [
+        {'key': 'N', 'label': 'Sample size, n', 'format': 'count'},
+        {'rule': True},
+        {'section': 'Age, years'},
+        {'key': 'age_mean', 'label': 'Mean (SD)', 'format': 'mean_sd', 'indent': 1},
+        {'key': 'age_median', 'label': 'Median [IQR]', 'format': 'median_iqr', 'indent': 1},
+        {'rule': True},
+        {'section': 'Race/Ethnicity, % (SE)'},
+        *[percent_row(race_key(race), race) for race in races],
+        {'rule': True},
+        {'section': 'Poverty Status'},
+        {'key': 'poverty_mean', 'label': 'Poverty ratio, mean (SD)', 'format': 'mean_sd', 'indent': 1},
+        {'label': 'Poverty category, % (SE)', 'indent': 1, 'cells': ['']},
+        *[percent_row(poverty_key(category), category, indent=2) for category in poverty],
+        {'rule': True},
+        {'key': 'bmi_mean', 'label': 'BMI, kg/m², mean (SD)', 'format': 'mean_sd', 'bold': True},
+        {'rule': True},
+        {'section': 'Iron Status'},
+        {'key': 'ferritin_median', 'label': 'Ferritin, ng/mL, median [IQR]', 'format': 'median_iqr',
+         'indent': 1},
+        {'key': 'hemoglobin_mean', 'label': 'Hemoglobin, g/dL, mean (SD)', 'format': 'mean_sd',
+         'indent': 1},
+        {'rule': True},
+        percent_row('idwa_prevalence', 'IDWA prevalence, % (SE)', indent=0, bold=True),
+        percent_row('iron_deficiency_prevalence', 'Iron deficiency prevalence, % (SE)', indent=0),
+        percent_row('anemia_prevalence', 'Anemia prevalence, % (SE)', indent=0),
+        {'rule': True},
+        percent_row('supplement_prevalence', 'Iron supplement use, % (SE)', indent=0, bold=True),
+        {'label': 'Iron dose category, % (SE)', 'indent': 1, 'cells': ['']},
+        *[percent_row(f'dose_{dose.lower()}', dose, indent=2) for dose in IRON_DOSE_CATEGORIES],
     ]
-    
-    # Group by category
-    groups = df_idwa['group'].unique()
-    
+    return {
+        'caption': 'Characteristics of Study Population',
+        'label': 'tab:table1',
+        'stub_header': 'Characteristic',
+        'columns': [{'header': 'Value'}],
+        'rows': rows,
+        'missing': 'N/A',
+        'note': 'IDWA = Iron Deficiency Without Anemia. Values are weighted estimates unless '
+                'otherwise noted. SE = standard error. IQR = interquartile range.',
+    }
+
+def table2_tidy(df_idwa):
+    """Table 2 rows keyed by 'group|subgroup'."""
+    return df_idwa.assign(term=df_idwa['group'] + '|' + df_idwa['subgroup'].astype(str),
+                          n_cases=df_idwa['n_idwa'], estimate=df_idwa['idwa_prevalence'],
+                          se=df_idwa['idwa_se'])
+
+def table2_layout(df_idwa):
+    """Layout of Table 2: one section per grouping, headed by its Rao-Scott p-value."""
+    rows = []
+    groups = list(df_idwa['group'].unique())
     for group in groups:
         group_data = df_idwa[df_idwa['group'] == group]
-        
-        if len(group_data) > 0:
-            # Group header
-            lines.append(f"\\textbf{{{group}}} & & \\\\")
-            
-            for _, row in group_data.iterrows():
-                subgroup = row['subgroup']
-                n_idwa = int(row['n_idwa'])
-                n_total = int(row['n_total'])
-                pct = row['idwa_pct']
-                lines.append(f"\quad {subgroup} & {n_idwa}/{n_total} & {pct} \\\\")
-            
-            if group != groups[-1]:
-                lines.append(r"\midrule")
-    
-    lines.extend([
-        r"\bottomrule",
-        r"\end{tabular}",
-        r"\begin{flushleft}",
-        r"\footnotesize{\textit{Note:} n = number with IDWA; N = total in subgroup. SE = standard error.}",
-        r"\end{flushleft}",
-        r"\end{table}",
-    ])
-    
-    return "\n".join(lines)
+        header = group
+        if 'rao_scott_pvalue' in group_data.columns and pd.notna(group_data['rao_scott_pvalue'].iloc[0]):
+            p = group_data['rao_scott_pvalue'].iloc[0]
+            header += f" (p{'<0.001' if p < 0.001 else f'={p:.3f}'})"
+        rows.append({'section': header})
+        rows.extend({'key': f"{group}|{subgroup}", 'label': str(subgroup), 'indent': 1}
+                    for subgroup in group_data['subgroup'])
+        if group != groups[-1]:
+            rows.append({'rule': True})
+    
+    return {
+        'caption': 'Prevalence of Iron Deficiency Without Anemia by Demographic Characteristics',
+        'label': 'tab:table2',
+        'stub_header': 'Characteristic',
+        'columns': [{'header': 'n/N', 'format': 'cases_total'},
+                    {'header': 'Prevalence, % (SE)', 'format': 'percent_se'}],
+        'rows': rows,
+        'missing': 'N/A',
+        'note': 'n = number with IDWA; N = total in subgroup. SE = standard error. p-values: '
+                'Rao-Scott second-order corrected chi-square test of equal prevalence across subgroups.',
+    }
+
+def threshold_table_tidy(sensitivity):
+    """Threshold sensitivity cells keyed by (ferritin cutoff, hemoglobin cutoff)."""
+    return sensitivity.assign(term=sensitivity['ferritin_cutoff'], estimate=sensitivity['prevalence'],
+                              se=sensitivity['se_design'])
+
+def threshold_table_layout(sensitivity):
+    """Layout of the threshold sensitivity table: ferritin rows by hemoglobin columns."""
+    hb_cutoffs = sorted(sensitivity['hemoglobin_cutoff'].unique())
+    fer_cutoffs = sorted(sensitivity['ferritin_cutoff'].unique())
+    return {
+        'caption': 'Sensitivity of IDWA Prevalence to Ferritin and Hemoglobin Cutoffs',
+        'label': 'tab:threshold_sensitivity',
+        'stub_header': 'Ferritin cutoff',
+        'column_key': 'hemoglobin_cutoff',
+        'columns': [{'header': f'Hb ≥ {hb:.1f} g/dL', 'key': hb, 'format': 'percent_se'}
+                    for hb in hb_cutoffs],
+        'rows': [{'key': fer, 'label': f"< {fer:.0f} ng/mL" + (" (primary)" if fer == FERRITIN_CUTOFF else "")}
+                 for fer in fer_cutoffs],
+        'missing': 'N/A',
+        'note': 'Weighted IDWA prevalence, % (design-based SE), defined as ferritin below the cutoff '
+                'and hemoglobin at or above the cutoff.',
+    }
 
 def main():
     print("=" * 70)
@@ -381,6 +351,7 @@ def main():
     print("=" * 70)
     print()
     
+    phase('load')
     # Load processed data
     data_file = os.path.join(OUTPUT_DIR, 'processed_data.csv')
     if not os.path.exists(data_file):
@@ -388,16 +359,20 @@ def main():
         print("Please run 01_data_prep.py first.")
         sys.exit(1)
     
-    df = pd.read_csv(data_file)
+    df = read_processed_data(data_file)
     print(f"Loaded processed data: {len(df)} rows")
     print()
     
+    phase('table1')
     # Calculate Table 1 characteristics
     print("=" * 70)
     print("Calculating Table 1: Study population characteristics...")
     print("=" * 70)
     
-    table1_results = calculate_table1_characteristics(df)
+    # Survey design shared by every estimate below
+    design = SurveyDesign.from_dataframe(df)
+    
+    table1_results = calculate_table1_characteristics(df, design)
     
     # Display results
     print(f"\nSample size: {table1_results['N']:,}")
@@ -406,33 +381,53 @@ def main():
     print(f"IDWA prevalence: {format_percent(table1_results['idwa_prevalence'], table1_results['idwa_se'])}")
     print(f"Iron supplement use: {format_percent(table1_results['supplement_prevalence'], table1_results['supplement_se'])}")
     
+    phase('table2')
     # Calculate IDWA by demographics (Table 2)
     print("\n" + "=" * 70)
     print("Calculating Table 2: IDWA prevalence by demographics...")
     print("=" * 70)
     
-    df_idwa = calculate_idwa_by_demographics(df)
+    cube = PrevalenceCube(df, design, outcome='IDWA')
+    df_idwa = calculate_idwa_by_demographics(cube, design)
     print(df_idwa[['group', 'subgroup', 'n_total', 'n_idwa', 'idwa_pct']].to_string(index=False))
     
-    # Generate LaTeX tables
+    if 'rao_scott_pvalue' in df_idwa.columns:
+        print("\nRao-Scott tests of equal IDWA prevalence:")
+        tests = df_idwa.dropna(subset=['rao_scott_pvalue']).drop_duplicates('group')
+        for _, row in tests.iterrows():
+            print(f"  {row['group']}: F = {row['rao_scott_f']:.2f} "
+                  f"(df {row['rao_scott_df1']:.2f}, {row['rao_scott_df2']:.1f}), p = {row['rao_scott_pvalue']:.4f}")
+    
+    phase('threshold sweep')
+    # Threshold sweep over ferritin x hemoglobin cutoffs
     print("\n" + "=" * 70)
-    print("Generating LaTeX tables...")
+    print("Sweeping IDWA prevalence over ferritin and hemoglobin cutoffs...")
     print("=" * 70)
     
-    # Table 1
-    table1_latex = generate_table1_latex(table1_results)
-    table1_file = os.path.join(TABLES_DIR, 'table1_characteristics.tex')
-    with open(table1_file, 'w') as f:
-        f.write(table1_latex)
-    print(f"Saved Table 1 to: {table1_file}")
+    sweep = sweep_idwa_prevalence(df, design, by=['age_group', 'race_category', 'iron_supplement'])
+    sensitivity = sweep[(sweep['group'] == 'Overall')
+                        & sweep['ferritin_cutoff'].isin(SENSITIVITY_FERRITIN_CUTOFFS)
+                        & sweep['hemoglobin_cutoff'].isin(SENSITIVITY_HEMOGLOBIN_CUTOFFS)]
+    print(sensitivity[['ferritin_cutoff', 'hemoglobin_cutoff', 'n_cases', 'prevalence',
+                       'se_design']].to_string(index=False))
     
-    # Table 2
-    table2_latex = generate_table2_latex(df_idwa)
-    table2_file = os.path.join(TABLES_DIR, 'table2_idwa_by_demographics.tex')
-    with open(table2_file, 'w') as f:
-        f.write(table2_latex)
-    print(f"Saved Table 2 to: {table2_file}")
+    phase('render tables')
+    # Render LaTeX, Markdown and formatted CSV tables
+    print("\n" + "=" * 70)
+    print("Rendering tables...")
+    print("=" * 70)
     
+    tables = {
+        'table1_characteristics': (table1_tidy(table1_results), table1_layout()),
+        'table2_idwa_by_demographics': (table2_tidy(df_idwa), table2_layout(df_idwa)),
+        'tableS3_threshold_sensitivity': (threshold_table_tidy(sensitivity),
+                                          threshold_table_layout(sensitivity)),
+    }
+    for name, (tidy, layout) in tables.items():
+        for path, written in render_table(tidy, layout, TABLES_DIR, name).items():
+            print(f"{'Saved' if written else 'Unchanged'}: {path}")
+    
+    phase('write')
     # Save CSVs for reference
     table1_df = pd.DataFrame([table1_results])
     table1_csv = os.path.join(TABLES_DIR, 'table1_characteristics.csv')
@@ -443,9 +438,33 @@ def main():
     df_idwa.to_csv(table2_csv, index=False)
     print(f"Saved Table 2 CSV to: {table2_csv}")
     
+    sweep_csv = os.path.join(TABLES_DIR, 'threshold_sweep.csv')
+    sweep.to_csv(sweep_csv, index=False)
+    print(f"Saved threshold sweep CSV to: {sweep_csv}")
+    
+    sensitivity_csv = os.path.join(TABLES_DIR, 'threshold_sensitivity.csv')
+    sensitivity.to_csv(sensitivity_csv, index=False)
+    print(f"Saved threshold sensitivity CSV to: {sensitivity_csv}")
+    
+    # Estimates for the results summary and run comparisons
+    sample = pd.DataFrame({
+        'term': ['n_total', 'n_idwa', 'n_supplement', 'n_cycles'],
+        'estimate': [len(df), df['IDWA'].sum(), df['iron_supplement'].sum(), df['cycle'].nunique()],
+    })
+    estimates = {
+        'sample': sample,
+        'table1_characteristics': table1_tidy(table1_results),
+        'idwa_by_demographics': df_idwa.rename(columns={'group': 'term'}),
+        'threshold_sensitivity': sensitivity.drop(columns=['group', 'subgroup']).assign(
+            term=sensitivity['ferritin_cutoff'], subgroup=sensitivity['hemoglobin_cutoff']),
+    }
+    n_values = sum(write_estimates(RESULTS_STORE, name, tidy) for name, tidy in estimates.items())
+    print(f"Saved {n_values} estimates (run {current_run_id()}) to: {RESULTS_STORE}")
+    
     print("\n" + "=" * 70)
     print("Descriptive statistics complete!")
     print("=" * 70)
 
 if __name__ == "__main__":
-    main()
+    with StageProfiler('02_descriptive_stats', OUTPUT_DIR):
+        main()
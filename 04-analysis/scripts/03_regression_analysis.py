@@ -8,9 +8,14 @@ This script:
 2. Model 1: Unadjusted (log ferritin ~ supplement use)
 3. Model 2: Demographics-adjusted
 4. Model 3: Fully adjusted (add BMI)
-5. Performs dose-response analysis
-6. Generates forest plot of regression coefficients
-7. Outputs regression results in LaTeX table format
+5. Performs dose-response analysis (trend test and pairwise dose contrasts)
+   and a restricted cubic spline curve for continuous dose
+6. Fits survey-weighted logistic regression of IDWA status
+7. Tests effect modification of supplement use (interaction analysis)
+8. Fits secondary biomarker outcomes (serum iron, TIBC, TSAT) jointly
+9. Outputs regression results in LaTeX table format (Tables 3 and 4 also
+   as Markdown, via table_renderer.py), with the CSVs the forest plot and
+   dose-response curve are drawn from (04_generate_figures.py)
 
 Author: NHANES Analysis Pipeline
 Date: 2026-01-31
@@ -20,77 +25,33 @@ import pandas as pd
 import numpy as np
 import os
 import sys
-import matplotlib.pyplot as plt
-import seaborn as sns
 from scipy import stats
-import statsmodels.api as sm
-from statsmodels.regression.linear_model import WLS
+
+from dose_spline import fit_dose_spline
+from interaction_analysis import run_interaction_analysis
+from profiling import StageProfiler, phase, step
+from regression_models import (prepare_data_for_regression, cycle_dummy_columns, weighted_least_squares,
+                               fit_multi_outcome, dose_contrasts, MODEL3_COVARIATES)
+from results_store import STORE_FILE, current_run_id, write_estimates
+from schema import read_processed_data
+from survey_design import SurveyDesign
+from survey_logistic import fit_logistic_models
+from survey_weights import CYCLE_TABLE
+from table_renderer import render_table
 
 # Set random seed for reproducibility
 np.random.seed(42)
 
 OUTPUT_DIR = "studies/iron-deficiency-women-2026-01-31/04-analysis"
 TABLES_DIR = os.path.join(OUTPUT_DIR, "outputs", "tables")
-FIGURES_DIR = os.path.join(OUTPUT_DIR, "outputs", "figures")
-
-def prepare_data_for_regression(df):
-    """Prepare data for regression analysis."""
-    
-    # Create binary variables for race
-    df['race_nhw'] = (df['race_category'] == 'Non-Hispanic White').astype(int)
-    df['race_nhb'] = (df['race_category'] == 'Non-Hispanic Black').astype(int)
-    df['race_mex'] = (df['race_category'] == 'Mexican American').astype(int)
-    df['race_oth_hisp'] = (df['race_category'] == 'Other Hispanic').astype(int)
-    df['race_other'] = (df['race_category'] == 'Other Race').astype(int)
-    
-    # Create poverty binary variable
-    df['poverty_low'] = (df['poverty_category'] == 'Low (<1.3)').astype(int)
-    
-    # Create age squared for potential non-linearity
-    df['age_sq'] = df['RIDAGEYR'] ** 2
-    
-    # Create iron supplement binary and categorical variables
-    df['supp_any'] = df['iron_supplement']
-    
-    # Dose categories as dummy variables
-    df['dose_low'] = (df['iron_dose'] == 'Low').astype(int)
-    df['dose_mod'] = (df['iron_dose'] == 'Moderate').astype(int)
-    df['dose_high'] = (df['iron_dose'] == 'High').astype(int)
-    
-    # Create BMI categories
-    df['bmi_under'] = (df['BMXBMI'] < 18.5).astype(int)
-    df['bmi_normal'] = ((df['BMXBMI'] >= 18.5) & (df['BMXBMI'] < 25)).astype(int)
-    df['bmi_over'] = ((df['BMXBMI'] >= 25) & (df['BMXBMI'] < 30)).astype(int)
-    df['bmi_obese'] = (df['BMXBMI'] >= 30).astype(int)
-    
-    return df
+RESULTS_STORE = os.path.join(OUTPUT_DIR, "outputs", STORE_FILE)
 
-def weighted_least_squares(X, y, weights):
-    """Perform weighted least squares regression."""
-    
-    # Remove rows with missing values
-    mask = (~np.isnan(y)) & (~np.isnan(weights)) & (weights > 0)
-    for col in X.columns:
-        mask = mask & (~np.isnan(X[col]))
-    
-    X_clean = X[mask].copy()
-    y_clean = y[mask].copy()
-    w_clean = weights[mask].copy()
-    
-    if len(y_clean) < 10:
-        return None, None, None
-    
-    # Add constant
-    X_clean = sm.add_constant(X_clean)
-    
-    # Fit WLS
-    try:
-        model = WLS(y_clean, X_clean, weights=w_clean)
-        results = model.fit()
-        return results, X_clean, y_clean
-    except Exception as e:
-        print(f"Error fitting model: {e}")
-        return None, None, None
+# Secondary biomarker outcomes (FETIB component) and their display labels
+SECONDARY_OUTCOMES = {
+    'LBXIRN': 'Serum iron, $\\mu$g/dL',
+    'LBXTIB': 'TIBC, $\\mu$g/dL',
+    'LBDPCT': 'Transferrin saturation, \\%',
+}
 
 def run_regression_models(df):
     """Run all regression models."""
@@ -106,7 +67,8 @@ def run_regression_models(df):
     # Model 1: Unadjusted
     print("\n--- Model 1: Unadjusted ---")
     X1 = df[['supp_any']].copy()
-    res1, X1_clean, y1_clean = weighted_least_squares(X1, y, weights)
+    with step('fit model1'):
+        res1, X1_clean, y1_clean = weighted_least_squares(X1, y, weights)
     
     if res1 is not None:
         conf_int_1 = res1.conf_int()
@@ -130,7 +92,8 @@ def run_regression_models(df):
     print("\n--- Model 2: Demographics-adjusted ---")
     X2 = df[['supp_any', 'RIDAGEYR', 'race_nhb', 'race_mex', 'race_oth_hisp', 
              'race_other', 'INDFMPIR']].copy()
-    res2, X2_clean, y2_clean = weighted_least_squares(X2, y, weights)
+    with step('fit model2'):
+        res2, X2_clean, y2_clean = weighted_least_squares(X2, y, weights)
     
     if res2 is not None:
         conf_int_2 = res2.conf_int()
@@ -158,7 +121,8 @@ def run_regression_models(df):
     print("\n--- Model 3: Fully adjusted ---")
     X3 = df[['supp_any', 'RIDAGEYR', 'race_nhb', 'race_mex', 'race_oth_hisp', 
              'race_other', 'INDFMPIR', 'BMXBMI']].copy()
-    res3, X3_clean, y3_clean = weighted_least_squares(X3, y, weights)
+    with step('fit model3'):
+        res3, X3_clean, y3_clean = weighted_least_squares(X3, y, weights)
     
     if res3 is not None:
         conf_int_3 = res3.conf_int()
@@ -186,7 +150,11 @@ def run_regression_models(df):
     return results
 
 def run_dose_response_analysis(df):
-    """Run dose-response analysis."""
+    """Run dose-response analysis.
+
+    Returns the category coefficients (with the trend test) and the
+    pairwise dose contrasts, both taken from the single fitted model.
+    """
     
     print("\n" + "=" * 70)
     print("Dose-Response Analysis")
@@ -200,9 +168,11 @@ def run_dose_response_analysis(df):
     X_dose = df[['dose_low', 'dose_mod', 'dose_high', 'RIDAGEYR', 'race_nhb', 
                  'race_mex', 'race_oth_hisp', 'race_other', 'INDFMPIR', 'BMXBMI']].copy()
     
-    res_dose, X_clean, y_clean = weighted_least_squares(X_dose, y, weights)
+    with step('fit dose categories'):
+        res_dose, X_clean, y_clean = weighted_least_squares(X_dose, y, weights)
     
     dose_results = {}
+    pairwise = None
     
     if res_dose is not None:
         conf_int_dose = res_dose.conf_int()
@@ -237,256 +207,313 @@ def run_dose_response_analysis(df):
         print(f"\n  High dose coefficient: {dose_results['coef_high']:.4f}")
         print(f"    95% CI: [{dose_results['ci_low_high']:.4f}, {dose_results['ci_high_high']:.4f}]")
         print(f"    p-value: {dose_results['pvalue_high']:.4f}")
+        
+        # Trend and pairwise contrasts from the same coefficient covariance
+        trend, pairwise = dose_contrasts(res_dose.params, res_dose.cov_params(), res_dose.df_resid)
+        dose_results.update({
+            'coef_trend': trend['estimate'],
+            'se_trend': trend['se'],
+            'ci_low_trend': trend['ci_low'],
+            'ci_high_trend': trend['ci_high'],
+            'pvalue_trend': trend['pvalue'],
+            'f_joint': trend['f_joint'],
+            'pvalue_joint': trend['pvalue_joint'],
+        })
+        
+        print(f"\n  Linear trend (per category): {dose_results['coef_trend']:.4f}")
+        print(f"    p-trend: {dose_results['pvalue_trend']:.4f}")
+        print(f"    Joint test of dose terms: F = {dose_results['f_joint']:.2f}, "
+              f"p = {dose_results['pvalue_joint']:.4f}")
+        
+        print("\n--- Pairwise Dose Contrasts (Bonferroni) ---")
+        print(pairwise[['contrast', 'estimate', 'ci_low', 'ci_high', 'pvalue',
+                        'pvalue_bonferroni']].to_string(index=False))
+    
+    return dose_results, pairwise
+
+def run_dose_spline_analysis(df):
+    """Fit the restricted cubic spline for continuous iron dose."""
+    
+    print("\n--- Continuous Dose (Restricted Cubic Spline) ---")
+    with step('fit dose spline'):
+        spline = fit_dose_spline(df)
+    if spline is None:
+        print("  Spline model could not be fitted")
+        return None
+    
+    print(f"  N: {spline['n']}")
+    print(f"  Knots (mg/day): {', '.join(f'{k:g}' for k in spline['knots'])}")
+    print(f"  Overall dose association: F = {spline['f_overall']:.2f}, p = {spline['pvalue_overall']:.4f}")
+    print(f"  Non-linearity: F = {spline['f_nonlinear']:.2f}, p = {spline['pvalue_nonlinear']:.4f}")
+    
+    return spline
+
+def run_logistic_models(df, design):
+    """Run survey-weighted logistic regression of IDWA status."""
     
-    return dose_results
+    print("\n" + "=" * 70)
+    print("Logistic Regression: Factors Associated with IDWA")
+    print("=" * 70)
+    
+    covariates = ['RIDAGEYR', 'race_nhb', 'race_mex', 'race_oth_hisp', 'race_other',
+                  'INDFMPIR', 'BMXBMI'] + cycle_dummy_columns(df)
+    specs = {
+        'idwa_model1': covariates,
+        'idwa_model2': covariates + ['supp_any'],
+    }
+    labels = {
+        'idwa_model1': 'Age, race, poverty, BMI, cycle',
+        'idwa_model2': 'Additionally adjusted for iron supplement use',
+    }
+    
+    fits = fit_logistic_models(df, 'IDWA', specs, design)
+    
+    for name, fit in fits.items():
+        if fit is None:
+            continue
+        fit['name'] = labels[name]
+        print(f"\n--- {labels[name]} ---")
+        status = 'converged' if fit['converged'] else 'did not converge'
+        print(f"  N: {fit['n']} ({status} in {fit['iterations']} iterations)")
+        if not fit['converged']:
+            print("  Warning: IRLS did not converge; estimates may be unreliable (check for separation)")
+        table = fit['table'].drop(index='const')
+        for term, row in table.iterrows():
+            print(f"  {term}: OR {row['odds_ratio']:.3f} "
+                  f"[{row['or_ci_low']:.3f}, {row['or_ci_high']:.3f}], p={row['pvalue']:.4f}")
+    
+    return fits
 
-def generate_regression_table_latex(results):
-    """Generate LaTeX table for regression results."""
+def generate_logistic_table_latex(fits):
+    """Generate LaTeX table for the IDWA logistic regression."""
+    
+    term_labels = {
+        'supp_any': 'Iron supplement use',
+        'RIDAGEYR': 'Age, years',
+        'race_nhb': 'Non-Hispanic Black',
+        'race_mex': 'Mexican American',
+        'race_oth_hisp': 'Other Hispanic',
+        'race_other': 'Other Race',
+        'INDFMPIR': 'Poverty ratio',
+        'BMXBMI': 'BMI, kg/m\\textsuperscript{2}',
+    }
+    for cycle in CYCLE_TABLE.index:
+        term_labels[f'cycle_{cycle}'] = f"Cycle {CYCLE_TABLE.loc[cycle, 'cycle_year']}"
+    
+    models = [fits[m] for m in ['idwa_model1', 'idwa_model2'] if fits.get(m) is not None]
     
     latex = []
     latex.append("\\begin{table}[htbp]")
     latex.append("\\centering")
-    latex.append("\\caption{Association Between Iron Supplement Use and Log-Transformed Ferritin}")
-    latex.append("\\label{tab:regression}")
-    latex.append("\\begin{tabular}{lccc}")
+    latex.append("\\caption{Factors Associated with Iron Deficiency Without Anemia}")
+    latex.append("\\label{tab:idwa_logistic}")
+    latex.append("\\begin{tabular}{l" + "c" * len(models) + "}")
     latex.append("\\toprule")
-    latex.append("\\textbf{Variable} & \\textbf{Model 1} & \\textbf{Model 2} & \\textbf{Model 3} \\\\")
-    latex.append(" & \\textbf{(Unadjusted)} & \\textbf{(Demographics)} & \\textbf{(Fully Adjusted)} \\\\")
+    header = " & ".join(f"\\textbf{{Model {i + 1}}}" for i in range(len(models)))
+    latex.append(f"\\textbf{{Variable}} & {header} \\\\")
     latex.append("\\midrule")
     
-    # Iron supplement use
-    if 'model1' in results:
-        m1 = results['model1']
-        coef1 = f"{m1['coef_supp']:.3f}"
-        ci1 = f"[{m1['ci_low_supp']:.3f}, {m1['ci_high_supp']:.3f}]"
-        p1 = f"{m1['pvalue_supp']:.3f}"
-        if m1['pvalue_supp'] < 0.001:
-            p1 = "<0.001"
-        m1_str = f"{coef1} {ci1}; p={p1}"
-    else:
-        m1_str = "N/A"
-    
-    if 'model2' in results:
-        m2 = results['model2']
-        coef2 = f"{m2['coef_supp']:.3f}"
-        ci2 = f"[{m2['ci_low_supp']:.3f}, {m2['ci_high_supp']:.3f}]"
-        p2 = f"{m2['pvalue_supp']:.3f}"
-        if m2['pvalue_supp'] < 0.001:
-            p2 = "<0.001"
-        m2_str = f"{coef2} {ci2}; p={p2}"
-    else:
-        m2_str = "N/A"
-    
-    if 'model3' in results:
-        m3 = results['model3']
-        coef3 = f"{m3['coef_supp']:.3f}"
-        ci3 = f"[{m3['ci_low_supp']:.3f}, {m3['ci_high_supp']:.3f}]"
-        p3 = f"{m3['pvalue_supp']:.3f}"
-        if m3['pvalue_supp'] < 0.001:
-            p3 = "<0.001"
-        m3_str = f"{coef3} {ci3}; p={p3}"
-    else:
-        m3_str = "N/A"
-    
-    latex.append(f"Iron supplement use & {m1_str} & {m2_str} & {m3_str} \\\\")
+    for term, label in term_labels.items():
+        cells = []
+        for fit in models:
+            if term not in fit['table'].index:
+                cells.append("---")
+                continue
+            row = fit['table'].loc[term]
+            cells.append(f"{row['odds_ratio']:.2f} [{row['or_ci_low']:.2f}, {row['or_ci_high']:.2f}]")
+        if all(c == "---" for c in cells):
+            continue
+        latex.append(f"{label} & {' & '.join(cells)} \\\\")
+    
     latex.append("\\midrule")
+    latex.append("N & " + " & ".join(str(fit['n']) for fit in models) + " \\\\")
+    latex.append("\\bottomrule")
+    latex.append("\\end{tabular}")
+    latex.append("\\begin{flushleft}")
+    latex.append("\\footnotesize{\\textit{Note:} Values are odds ratios with 95\\% CI from survey-weighted ")
+    latex.append("logistic regression with design-based (linearized) standard errors. ")
+    latex.append("Reference categories: Non-Hispanic White; earliest survey cycle.}")
+    latex.append("\\end{flushleft}")
+    latex.append("\\end{table}")
+    
+    return "\n".join(latex)
+
+def run_secondary_biomarker_models(df):
+    """Fit Model 3 to every secondary biomarker outcome in one solve."""
     
-    # Age
-    if 'model2' in results and 'coef_age' in results['model2']:
-        age2 = f"{results['model2']['coef_age']:.3f}"
-        age3 = f"{results['model3']['coef_age']:.3f}" if 'model3' in results else "N/A"
-        latex.append(f"Age, years & --- & {age2} & {age3} \\\\")
-    
-    # Race (Non-Hispanic Black)
-    if 'model2' in results and 'coef_nhb' in results['model2']:
-        nhb2 = f"{results['model2']['coef_nhb']:.3f}"
-        nhb3 = f"{results['model3']['coef_nhb']:.3f}" if 'model3' in results else "N/A"
-        latex.append(f"Non-Hispanic Black & --- & {nhb2} & {nhb3} \\\\")
-    
-    # Race (Mexican American)
-    if 'model2' in results and 'coef_mex' in results['model2']:
-        mex2 = f"{results['model2']['coef_mex']:.3f}"
-        mex3 = f"{results['model3']['coef_mex']:.3f}" if 'model3' in results else "N/A"
-        latex.append(f"Mexican American & --- & {mex2} & {mex3} \\\\")
-    
-    # Poverty ratio
-    if 'model2' in results and 'coef_pov' in results['model2']:
-        pov2 = f"{results['model2']['coef_pov']:.3f}"
-        pov3 = f"{results['model3']['coef_pov']:.3f}" if 'model3' in results else "N/A"
-        latex.append(f"Poverty ratio & --- & {pov2} & {pov3} \\\\")
-    
-    # BMI
-    if 'model3' in results and 'coef_bmi' in results['model3']:
-        bmi3 = f"{results['model3']['coef_bmi']:.3f}"
-        latex.append(f"BMI, kg/m\\textsuperscript{{2}} & --- & --- & {bmi3} \\\\")
+    print("\n" + "=" * 70)
+    print("Secondary Biomarker Outcomes")
+    print("=" * 70)
     
-    latex.append("\\midrule")
+    outcomes = [col for col in SECONDARY_OUTCOMES if col in df.columns]
+    if not outcomes:
+        print("  Secondary biomarkers not available")
+        return None
+    if 'weight_fetib' not in df.columns:
+        print("  Transferrin receptor weight (weight_fetib) not available")
+        return None
+    
+    with step('fit secondary outcomes'):
+        secondary = fit_multi_outcome(df, outcomes, MODEL3_COVARIATES, 'weight_fetib')
+    if secondary is None:
+        print("  Too few complete cases for secondary biomarker models")
+        return None
+    
+    print(f"  N: {secondary['n'].iloc[0]}")
+    for _, row in secondary.iterrows():
+        print(f"  {row['outcome']}: {row['coef']:.3f} [{row['ci_low']:.3f}, {row['ci_high']:.3f}], "
+              f"p={row['pvalue']:.4f} (Bonferroni {row['pvalue_bonferroni']:.4f}, BH {row['pvalue_bh']:.4f})")
+    
+    return secondary
+
+def generate_table5_latex(secondary):
+    """Generate Table 5 (secondary biomarker outcomes) in LaTeX format."""
+    
+    def format_p(p):
+        return "<0.001" if p < 0.001 else f"{p:.3f}"
     
-    # Sample size
-    n1 = str(results['model1']['n']) if 'model1' in results else "N/A"
-    n2 = str(results['model2']['n']) if 'model2' in results else "N/A"
-    n3 = str(results['model3']['n']) if 'model3' in results else "N/A"
-    latex.append(f"N & {n1} & {n2} & {n3} \\\\")
+    latex = []
+    latex.append("\\begin{table}[htbp]")
+    latex.append("\\centering")
+    latex.append("\\caption{Association Between Iron Supplement Use and Secondary Iron Biomarkers}")
+    latex.append("\\label{tab:secondary_biomarkers}")
+    latex.append("\\begin{tabular}{lcccc}")
+    latex.append("\\toprule")
+    latex.append("\\textbf{Outcome} & \\textbf{Coefficient [95\\% CI]} & \\textbf{p-value} & \\textbf{Bonferroni p} & \\textbf{BH q} \\\\")
+    latex.append("\\midrule")
     
-    # R-squared
-    r1 = f"{results['model1']['r2']:.3f}" if 'model1' in results else "N/A"
-    r2 = f"{results['model2']['r2']:.3f}" if 'model2' in results else "N/A"
-    r3 = f"{results['model3']['r2']:.3f}" if 'model3' in results else "N/A"
-    latex.append(f"R\\textsuperscript{{2}} & {r1} & {r2} & {r3} \\\\")
+    for _, row in secondary.iterrows():
+        est = f"{row['coef']:.2f} [{row['ci_low']:.2f}, {row['ci_high']:.2f}]"
+        latex.append(f"{SECONDARY_OUTCOMES[row['outcome']]} & {est} & {format_p(row['pvalue'])} & "
+                     f"{format_p(row['pvalue_bonferroni'])} & {format_p(row['pvalue_bh'])} \\\\")
     
+    latex.append("\\midrule")
+    latex.append(f"N & \\multicolumn{{4}}{{c}}{{{secondary['n'].iloc[0]}}} \\\\")
     latex.append("\\bottomrule")
     latex.append("\\end{tabular}")
     latex.append("\\begin{flushleft}")
-    latex.append("\\footnotesize{\\textit{Note:} Values are regression coefficients with 95\\% CI. ")
-    latex.append("Model 1: Unadjusted. Model 2: Adjusted for age, race/ethnicity, and poverty ratio. ")
-    latex.append("Model 3: Additionally adjusted for BMI. Reference category for race: Non-Hispanic White.}")
+    latex.append("\\footnotesize{\\textit{Note:} Coefficients for iron supplement use adjusted for age, race/ethnicity, ")
+    latex.append("poverty ratio and BMI, using iron/TIBC examination weights (2005-2006 and 2017-2018). ")
+    latex.append("Bonferroni and Benjamini-Hochberg (BH) adjustments are across the three outcomes.}")
     latex.append("\\end{flushleft}")
     latex.append("\\end{table}")
     
     return "\n".join(latex)
 
-def generate_dose_response_table_latex(dose_results):
-    """Generate LaTeX table for dose-response analysis."""
+def generate_interaction_table_latex(interactions):
+    """Generate LaTeX table for stratum-specific supplement effects."""
     
     latex = []
     latex.append("\\begin{table}[htbp]")
     latex.append("\\centering")
-    latex.append("\\caption{Dose-Response Analysis: Iron Supplement Dose and Log-Transformed Ferritin}")
-    latex.append("\\label{tab:dose_response}")
-    latex.append("\\begin{tabular}{lcccc}")
+    latex.append("\\caption{Iron Supplement Use and Log-Transformed Ferritin by Subgroup}")
+    latex.append("\\label{tab:interactions}")
+    latex.append("\\begin{tabular}{lccc}")
     latex.append("\\toprule")
-    latex.append("\\textbf{Dose Category} & \\textbf{Coefficient} & \\textbf{95\\% CI} & \\textbf{p-value} \\\\")
+    latex.append("\\textbf{Subgroup} & \\textbf{N} & \\textbf{Coefficient [95\\% CI]} & \\textbf{p-interaction} \\\\")
     latex.append("\\midrule")
     
-    # None (reference)
-    latex.append("None (reference) & 0.000 & Reference & --- \\\\")
-    
-    # Low dose
-    if 'coef_low' in dose_results:
-        coef = f"{dose_results['coef_low']:.3f}"
-        ci = f"[{dose_results['ci_low_low']:.3f}, {dose_results['ci_high_low']:.3f}]"
-        p = f"{dose_results['pvalue_low']:.3f}"
-        if dose_results['pvalue_low'] < 0.001:
-            p = "<0.001"
-        latex.append(f"Low & {coef} & {ci} & {p} \\\\")
-    
-    # Moderate dose
-    if 'coef_mod' in dose_results:
-        coef = f"{dose_results['coef_mod']:.3f}"
-        ci = f"[{dose_results['ci_low_mod']:.3f}, {dose_results['ci_high_mod']:.3f}]"
-        p = f"{dose_results['pvalue_mod']:.3f}"
-        if dose_results['pvalue_mod'] < 0.001:
-            p = "<0.001"
-        latex.append(f"Moderate & {coef} & {ci} & {p} \\\\")
-    
-    # High dose
-    if 'coef_high' in dose_results:
-        coef = f"{dose_results['coef_high']:.3f}"
-        ci = f"[{dose_results['ci_low_high']:.3f}, {dose_results['ci_high_high']:.3f}]"
-        p = f"{dose_results['pvalue_high']:.3f}"
-        if dose_results['pvalue_high'] < 0.001:
-            p = "<0.001"
-        latex.append(f"High & {coef} & {ci} & {p} \\\\")
+    for modifier, rows in interactions.groupby('modifier', sort=False):
+        p_int = rows['p_interaction'].iloc[0]
+        p_str = "---" if pd.isna(p_int) else ("<0.001" if p_int < 0.001 else f"{p_int:.3f}")
+        latex.append(f"\\textbf{{{rows['modifier_label'].iloc[0]}}} & & & {p_str} \\\\")
+        for _, row in rows.iterrows():
+            if pd.isna(row.get('coef_supp')):
+                est = "---"
+            else:
+                est = f"{row['coef_supp']:.3f} [{row['ci_low_supp']:.3f}, {row['ci_high_supp']:.3f}]"
+            stratum = row['stratum'].replace('≥', '$\\geq$').replace('<', '$<$')
+            latex.append(f"\\quad {stratum} & {row['n']} & {est} & \\\\")
     
     latex.append("\\bottomrule")
     latex.append("\\end{tabular}")
     latex.append("\\begin{flushleft}")
-    latex.append("\\footnotesize{\\textit{Note:} Low dose: >0 to <18 mg/day. ")
-    latex.append("Moderate dose: 18 to <27 mg/day. High dose: ≥27 mg/day. ")
-    latex.append("Model adjusted for age, race/ethnicity, poverty ratio, and BMI.}")
+    latex.append("\\footnotesize{\\textit{Note:} Stratum-specific coefficients for iron supplement use from Model 3 ")
+    latex.append("fitted within each subgroup. p-interaction: joint Wald F test of supplement $\\times$ subgroup terms ")
+    latex.append("in the pooled model.}")
     latex.append("\\end{flushleft}")
     latex.append("\\end{table}")
     
     return "\n".join(latex)
 
-def create_forest_plot(results, dose_results, output_file):
-    """Create forest plot of regression coefficients."""
-    
-    fig, ax = plt.subplots(figsize=(10, 8), dpi=300)
-    
-    # Prepare data for plotting
-    labels = []
-    coeffs = []
-    ci_lows = []
-    ci_highs = []
-    colors = []
-    
-    # Main models
-    if 'model1' in results:
-        labels.append('Model 1: Unadjusted')
-        coeffs.append(results['model1']['coef_supp'])
-        ci_lows.append(results['model1']['ci_low_supp'])
-        ci_highs.append(results['model1']['ci_high_supp'])
-        colors.append('#2E86AB')
-    
-    if 'model2' in results:
-        labels.append('Model 2: Demographics-adjusted')
-        coeffs.append(results['model2']['coef_supp'])
-        ci_lows.append(results['model2']['ci_low_supp'])
-        ci_highs.append(results['model2']['ci_high_supp'])
-        colors.append('#A23B72')
-    
-    if 'model3' in results:
-        labels.append('Model 3: Fully adjusted')
-        coeffs.append(results['model3']['coef_supp'])
-        ci_lows.append(results['model3']['ci_low_supp'])
-        ci_highs.append(results['model3']['ci_high_supp'])
-        colors.append('#F18F01')
-    
-    # Add dose-response
-    if 'coef_low' in dose_results:
-        labels.append('Dose: Low')
-        coeffs.append(dose_results['coef_low'])
-        ci_lows.append(dose_results['ci_low_low'])
-        ci_highs.append(dose_results['ci_high_low'])
-        colors.append('#C73E1D')
-    
-    if 'coef_mod' in dose_results:
-        labels.append('Dose: Moderate')
-        coeffs.append(dose_results['coef_mod'])
-        ci_lows.append(dose_results['ci_low_mod'])
-        ci_highs.append(dose_results['ci_high_mod'])
-        colors.append('#6A994E')
-    
-    if 'coef_high' in dose_results:
-        labels.append('Dose: High')
-        coeffs.append(dose_results['coef_high'])
-        ci_lows.append(dose_results['ci_low_high'])
-        ci_highs.append(dose_results['ci_high_high'])
-        colors.append('#BC4B51')
-    
-    # Plot
-    y_pos = np.arange(len(labels))
-    
-    # Reference line at 0
-    ax.axvline(x=0, color='gray', linestyle='--', linewidth=0.8, alpha=0.7)
-    
-    # Plot points and error bars
-    for i, (label, coef, ci_low, ci_high, color) in enumerate(zip(labels, coeffs, ci_lows, ci_highs, colors)):
-        ax.errorbar(coef, i, xerr=[[coef - ci_low], [ci_high - coef]], 
-                   fmt='o', color=color, ecolor=color, capsize=5, capthick=2, 
-                   markersize=8, elinewidth=2)
-    
-    ax.set_yticks(y_pos)
-    ax.set_yticklabels(labels, fontsize=11)
-    ax.set_xlabel('Regression Coefficient (Log Ferritin)', fontsize=12, fontweight='bold')
-    ax.set_title('Forest Plot: Association Between Iron Supplement Use and Ferritin\n(Non-Pregnant Women 18-45 Years, NHANES 2005-2022)', 
-                fontsize=13, fontweight='bold', pad=15)
-    
-    # Invert y-axis so first model is at top
-    ax.invert_yaxis()
-    
-    # Add grid
-    ax.grid(axis='x', alpha=0.3, linestyle=':')
-    ax.set_axisbelow(True)
-    
-    # Tight layout
-    plt.tight_layout()
-    
-    # Save
-    plt.savefig(output_file, dpi=300, bbox_inches='tight', facecolor='white')
-    print(f"\nSaved forest plot to: {output_file}")
-    plt.close()
+# Table 3 rows: result key suffix -> label
+REGRESSION_TABLE_TERMS = {
+    'age': 'Age, years',
+    'nhb': 'Non-Hispanic Black',
+    'mex': 'Mexican American',
+    'pov': 'Poverty ratio',
+    'bmi': 'BMI, kg/m²',
+}
+
+def regression_table_tidy(results):
+    """Table 3 results as tidy rows (term, model, estimate, ci_low, ci_high, pvalue)."""
+    rows = []
+    for model, fit in results.items():
+        for key, value in fit.items():
+            if key.startswith('coef_'):
+                term = key[len('coef_'):]
+                rows.append({'term': term, 'model': model, 'estimate': value,
+                             'ci_low': fit.get(f'ci_low_{term}'), 'ci_high': fit.get(f'ci_high_{term}'),
+                             'pvalue': fit.get(f'pvalue_{term}')})
+        rows.append({'term': 'n', 'model': model, 'estimate': fit['n']})
+        rows.append({'term': 'r2', 'model': model, 'estimate': fit['r2']})
+    return pd.DataFrame(rows)
+
+def regression_table_layout():
+    """Layout of Table 3: supplement effect, covariates, N and R-squared by model."""
+    columns = [
+        {'header': ['Model 1', '(Unadjusted)'], 'key': 'model1'},
+        {'header': ['Model 2', '(Demographics)'], 'key': 'model2'},
+        {'header': ['Model 3', '(Fully Adjusted)'], 'key': 'model3'},
+    ]
+    return {
+        'caption': 'Association Between Iron Supplement Use and Log-Transformed Ferritin',
+        'label': 'tab:regression',
+        'stub_header': 'Variable',
+        'column_key': 'model',
+        'columns': columns,
+        'rows': [
+            {'key': 'supp', 'label': 'Iron supplement use', 'format': 'estimate_ci_p'},
+            {'rule': True},
+            *[{'key': term, 'label': label, 'format': 'number3'}
+              for term, label in REGRESSION_TABLE_TERMS.items()],
+            {'rule': True},
+            {'key': 'n', 'label': 'N', 'format': 'integer'},
+            {'key': 'r2', 'label': 'R²', 'format': 'number3'},
+        ],
+        'note': 'Values are regression coefficients with 95% CI. Model 1: Unadjusted. '
+                'Model 2: Adjusted for age, race/ethnicity, and poverty ratio. '
+                'Model 3: Additionally adjusted for BMI. Reference category for race: Non-Hispanic White.',
+    }
+
+def dose_table_tidy(dose_results):
+    """Table 4 rows (dose level or 'trend') with estimate, CI and p-value."""
+    rows = [{'term': level, 'estimate': dose_results.get(f'coef_{level}'),
+             'ci_low': dose_results.get(f'ci_low_{level}'), 'ci_high': dose_results.get(f'ci_high_{level}'),
+             'pvalue': dose_results.get(f'pvalue_{level}')}
+            for level in ['low', 'mod', 'high', 'trend']]
+    return pd.DataFrame(rows)
+
+def dose_table_layout(dose_results):
+    """Layout of Table 4: dose categories against no supplement, then the trend test."""
+    rows = [{'label': 'None (reference)', 'cells': ['0.000', 'Reference', '---']}]
+    rows.extend({'key': level, 'label': label}
+                for level, label in [('low', 'Low'), ('mod', 'Moderate'), ('high', 'High')]
+                if f'coef_{level}' in dose_results)
+    if 'pvalue_trend' in dose_results:
+        rows.extend([{'rule': True}, {'key': 'trend', 'label': 'p for trend', 'cells': ['', '', None]}])
+    return {
+        'caption': 'Dose-Response Analysis: Iron Supplement Dose and Log-Transformed Ferritin',
+        'label': 'tab:dose_response',
+        'stub_header': 'Dose Category',
+        'columns': [{'header': 'Coefficient', 'format': 'number3'},
+                    {'header': '95% CI', 'format': 'ci'},
+                    {'header': 'p-value', 'format': 'p'}],
+        'rows': rows,
+        'note': 'Low dose: >0 to <18 mg/day. Moderate dose: 18 to <27 mg/day. High dose: ≥27 mg/day. '
+                'Model adjusted for age, race/ethnicity, poverty ratio, and BMI. '
+                'p for trend: Wald test of a linear contrast with category scores 0-3.',
+    }
 
 def main():
     print("=" * 70)
@@ -494,6 +521,7 @@ def main():
     print("=" * 70)
     print()
     
+    phase('load')
     # Load processed data
     data_file = os.path.join(OUTPUT_DIR, 'processed_data.csv')
     if not os.path.exists(data_file):
@@ -501,37 +529,74 @@ def main():
         print("Please run 01_data_prep.py first.")
         sys.exit(1)
     
-    df = pd.read_csv(data_file)
+    df = read_processed_data(data_file)
     print(f"Loaded processed data: {len(df)} rows")
     print()
     
+    phase('prepare')
     # Prepare data for regression
     df = prepare_data_for_regression(df)
     
+    phase('linear models')
     # Run main regression models
     results = run_regression_models(df)
     
+    phase('dose response')
     # Run dose-response analysis
-    dose_results = run_dose_response_analysis(df)
+    dose_results, dose_pairwise = run_dose_response_analysis(df)
+    dose_spline = run_dose_spline_analysis(df)
+    if dose_spline is not None:
+        dose_results.update({
+            'spline_n': dose_spline['n'],
+            'spline_knots': ';'.join(f'{k:.6g}' for k in dose_spline['knots']),
+            'spline_pvalue_overall': dose_spline['pvalue_overall'],
+            'spline_pvalue_nonlinear': dose_spline['pvalue_nonlinear'],
+        })
+    
+    phase('logistic models')
+    # Run IDWA logistic regression
+    design = SurveyDesign.from_dataframe(df)
+    logistic_fits = run_logistic_models(df, design)
+    
+    phase('interactions')
+    # Effect modification of supplement use
+    print("\n" + "=" * 70)
+    print("Effect Modification: Supplement Use x Subgroup")
+    print("=" * 70)
+    interactions = run_interaction_analysis(df)
+    print(interactions[['modifier', 'stratum', 'n', 'coef_supp', 'pvalue_supp',
+                        'p_interaction']].to_string(index=False))
     
+    phase('secondary outcomes')
+    # Secondary biomarker outcomes
+    secondary = run_secondary_biomarker_models(df)
+    
+    phase('write')
     # Generate LaTeX tables
     print("\n" + "=" * 70)
     print("Generating LaTeX tables...")
     print("=" * 70)
     
-    # Table 3: Regression results
-    table3_latex = generate_regression_table_latex(results)
-    table3_file = os.path.join(TABLES_DIR, 'table3_regression_results.tex')
-    with open(table3_file, 'w') as f:
-        f.write(table3_latex)
-    print(f"Saved Table 3 to: {table3_file}")
-    
-    # Table 4: Dose-response results
-    table4_latex = generate_dose_response_table_latex(dose_results)
-    table4_file = os.path.join(TABLES_DIR, 'table4_dose_response.tex')
-    with open(table4_file, 'w') as f:
-        f.write(table4_latex)
-    print(f"Saved Table 4 to: {table4_file}")
+    # Tables 3 and 4: LaTeX, Markdown and formatted CSV from the tidy results
+    tables = {
+        'table3_regression_results': (regression_table_tidy(results), regression_table_layout()),
+        'table4_dose_response': (dose_table_tidy(dose_results), dose_table_layout(dose_results)),
+    }
+    for name, (tidy, layout) in tables.items():
+        for path, written in render_table(tidy, layout, TABLES_DIR, name).items():
+            print(f"{'Saved' if written else 'Unchanged'}: {path}")
+    
+    # Table 5: Secondary biomarker outcomes
+    if secondary is not None:
+        table5_latex = generate_table5_latex(secondary)
+        table5_file = os.path.join(TABLES_DIR, 'table5_secondary_biomarkers.tex')
+        with open(table5_file, 'w') as f:
+            f.write(table5_latex)
+        print(f"Saved Table 5 to: {table5_file}")
+        
+        table5_csv = os.path.join(TABLES_DIR, 'table5_secondary_biomarkers.csv')
+        secondary.to_csv(table5_csv, index=False)
+        print(f"Saved Table 5 CSV to: {table5_csv}")
     
     # Save regression results to CSV
     results_df = pd.DataFrame([{
@@ -548,17 +613,63 @@ def main():
     dose_df.to_csv(dose_csv, index=False)
     print(f"Saved dose-response results CSV to: {dose_csv}")
     
-    # Create forest plot
-    print("\n" + "=" * 70)
-    print("Creating forest plot...")
-    print("=" * 70)
-    
-    forest_file = os.path.join(FIGURES_DIR, 'figure4_forest_plot.png')
-    create_forest_plot(results, dose_results, forest_file)
+    if dose_pairwise is not None:
+        contrasts_csv = os.path.join(TABLES_DIR, 'dose_contrasts.csv')
+        dose_pairwise.to_csv(contrasts_csv, index=False)
+        print(f"Saved dose contrasts CSV to: {contrasts_csv}")
+    
+    if dose_spline is not None:
+        spline_csv = os.path.join(TABLES_DIR, 'dose_response_spline.csv')
+        dose_spline['curve'].to_csv(spline_csv, index=False)
+        print(f"Saved dose-response spline CSV to: {spline_csv}")
+    
+    # IDWA logistic regression: LaTeX table and long-format CSV
+    logistic_tables = [
+        fit['table'].reset_index().assign(model=name, n=fit['n'], converged=fit['converged'])
+        for name, fit in logistic_fits.items() if fit is not None
+    ]
+    logistic_df = pd.concat(logistic_tables, ignore_index=True) if logistic_tables else None
+    if logistic_df is not None:
+        logistic_latex = generate_logistic_table_latex(logistic_fits)
+        logistic_file = os.path.join(TABLES_DIR, 'tableS2_idwa_logistic.tex')
+        with open(logistic_file, 'w') as f:
+            f.write(logistic_latex)
+        print(f"Saved IDWA logistic table to: {logistic_file}")
+        
+        logistic_csv = os.path.join(TABLES_DIR, 'idwa_logistic_results.csv')
+        logistic_df.to_csv(logistic_csv, index=False)
+        print(f"Saved IDWA logistic results CSV to: {logistic_csv}")
+    
+    # Interaction analysis
+    interaction_latex = generate_interaction_table_latex(interactions)
+    interaction_file = os.path.join(TABLES_DIR, 'tableS4_interactions.tex')
+    with open(interaction_file, 'w') as f:
+        f.write(interaction_latex)
+    print(f"Saved interaction table to: {interaction_file}")
+    
+    interaction_csv = os.path.join(TABLES_DIR, 'interaction_results.csv')
+    interactions.to_csv(interaction_csv, index=False)
+    print(f"Saved interaction results CSV to: {interaction_csv}")
+    
+    # Estimates for the results summary and run comparisons
+    estimates = {
+        'regression': regression_table_tidy(results),
+        'dose_response': dose_table_tidy(dose_results),
+    }
+    if logistic_df is not None:
+        estimates['idwa_logistic'] = logistic_df
+    estimates['interactions'] = interactions.rename(columns={'modifier': 'model', 'stratum': 'subgroup'})
+    if dose_pairwise is not None:
+        estimates['dose_contrasts'] = dose_pairwise.rename(columns={'contrast': 'term'})
+    if secondary is not None:
+        estimates['secondary_biomarkers'] = secondary.rename(columns={'outcome': 'term'})
+    n_values = sum(write_estimates(RESULTS_STORE, name, tidy) for name, tidy in estimates.items())
+    print(f"Saved {n_values} estimates (run {current_run_id()}) to: {RESULTS_STORE}")
     
     print("\n" + "=" * 70)
     print("Regression analysis complete!")
     print("=" * 70)
 
 if __name__ == "__main__":
-    main()
+    with StageProfiler('03_regression_analysis', OUTPUT_DIR):
+        main()
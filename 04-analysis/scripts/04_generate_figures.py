@@ -4,21 +4,43 @@ NHANES Iron Deficiency Without Anemia Study - Figure Generation Script
 =====================================================================
 
 This script generates all figures for the manuscript:
-- Figure 1: Study flow diagram (CONSORT-style)
-- Figure 2: Ferritin distribution by supplement use
+- Figure 1: Study flow diagram (CONSORT-style, from the exclusion cascade)
+- Figure 2: Survey-weighted ferritin distribution by supplement use
 - Figure 3: IDWA prevalence by demographics
+- Figure 4: Forest plot of regression coefficients (from 03 outputs)
+- Figure 5: IDWA prevalence across ferritin and hemoglobin cutoffs
+- Figure 6: Spline dose-response curve (from 03 outputs)
+
+Each figure has a compute step that writes compact plot data to
+outputs/plot_data (see plot_data.py) and a render step that only reads it.
+Figures are rendered in their own worker processes by the figure service
+(see figure_service.py) as PNG, PDF and SVG; figures whose plot data and
+style are unchanged since the last run (per figure_manifest.json) are not
+re-rendered. Run with --render-only to restyle figures from the existing
+plot data without loading the microdata, and --force to re-render all.
 
 Author: NHANES Analysis Pipeline
 Date: 2026-01-31
 """
 
-import pandas as pd
+import argparse
 import numpy as np
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import seaborn as sns
 import os
 from matplotlib.patches import FancyBboxPatch, FancyArrowPatch
-from matplotlib.patches import Rectangle
+
+from figure_service import render_figures, VECTOR_FORMATS, MANIFEST_FILE
+from plot_data import (write_plot_data, figure1_plot_data, figure2_plot_data,
+                       figure3_plot_data, figure4_plot_data, figure5_plot_data, figure6_plot_data)
+from prevalence_cube import PrevalenceCube
+from profiling import StageProfiler, phase, step
+from schema import AGE_GROUPS, read_processed_data
+from survey_design import SurveyDesign
+from threshold_sweep import (sweep_idwa_prevalence, FERRITIN_CUTOFF, HEMOGLOBIN_CUTOFF,
+                             SENSITIVITY_FERRITIN_CUTOFF)
 
 # Set random seed for reproducibility
 np.random.seed(42)
@@ -29,13 +51,27 @@ sns.set_palette("husl")
 
 OUTPUT_DIR = "studies/iron-deficiency-women-2026-01-31/04-analysis"
 FIGURES_DIR = os.path.join(OUTPUT_DIR, "outputs", "figures")
+TABLES_DIR = os.path.join(OUTPUT_DIR, "outputs", "tables")
+PLOT_DATA_DIR = os.path.join(OUTPUT_DIR, "outputs", "plot_data")
+CASCADE_CSV = os.path.join(OUTPUT_DIR, "exclusion_cascade.csv")
+
+# The flow diagram is boxes and text only: save it as vector graphics
+FIGURE_FORMAT_OVERRIDES = {'figure1_flow_diagram': VECTOR_FORMATS}
+
+RACE_ORDER = ['Non-Hispanic White', 'Non-Hispanic Black', 'Mexican American',
+              'Other Hispanic', 'Other Race']
 
-def create_figure1_flow_diagram():
-    """Create Figure 1: Study flow diagram."""
+def create_figure1_flow_diagram(plot_data):
+    """Create Figure 1: Study flow diagram from the exclusion cascade."""
     
-    fig, ax = plt.subplots(figsize=(12, 14), dpi=300)
-    ax.set_xlim(0, 10)
-    ax.set_ylim(0, 16)
+    cascade = plot_data['cascade']
+    meta = plot_data['meta']
+    row_gap = 2.0
+    height = 6.0 + row_gap * len(cascade)
+    
+    fig, ax = plt.subplots(figsize=(12, 0.875 * height))
+    ax.set_xlim(0, 12)
+    ax.set_ylim(0, height)
     ax.axis('off')
     
     # Color scheme
@@ -45,130 +81,93 @@ def create_figure1_flow_diagram():
     color_border = '#2E86AB'
     
     # Title
-    ax.text(5, 15.5, 'Study Flow Diagram', fontsize=16, fontweight='bold', 
+    years = f"{meta['first_year']}-{meta['last_year']}"
+    ax.text(6, height - 0.5, 'Study Flow Diagram', fontsize=16, fontweight='bold',
             ha='center', va='center')
-    ax.text(5, 15.0, 'NHANES Iron Deficiency Without Anemia Study (2005-2022)', 
+    ax.text(6, height - 1.0, f'NHANES Iron Deficiency Without Anemia Study ({years})',
             fontsize=11, ha='center', va='center', style='italic')
     
-    # Box 1: Initial sample
-    box1 = FancyBboxPatch((1.5, 13.5), 7, 1, boxstyle="round,pad=0.1", 
-                          facecolor=color_box, edgecolor=color_border, linewidth=2)
-    ax.add_patch(box1)
-    ax.text(5, 14.0, 'NHANES Participants\nCycles D, E, F, G, H, I, J, L\n(2005-2022)', 
+    # Main column: initial sample, then the population remaining after each criterion
+    y = height - 2.3
+    ax.add_patch(FancyBboxPatch((1, y - 0.5), 6, 1, boxstyle="round,pad=0.1",
+                                facecolor=color_box, edgecolor=color_border, linewidth=2))
+    ax.text(4, y, f"NHANES Participants\nCycles {', '.join(meta['cycles'])} ({years})\n"
+            f"n = {cascade['n_before'].iloc[0]:,}",
             fontsize=11, ha='center', va='center', fontweight='bold')
     
-    # Exclusion: Age
-    box_excl1 = FancyBboxPatch((0.2, 11.8), 3, 0.8, boxstyle="round,pad=0.05",
-                               facecolor=color_excluded, edgecolor='red', linewidth=1.5)
-    ax.add_patch(box_excl1)
-    ax.text(1.7, 12.2, 'Age <18 or >45\n(~40,000 excluded)', fontsize=9, ha='center', va='center')
-    
-    # Exclusion: Male
-    box_excl2 = FancyBboxPatch((6.8, 11.8), 3, 0.8, boxstyle="round,pad=0.05",
-                               facecolor=color_excluded, edgecolor='red', linewidth=1.5)
-    ax.add_patch(box_excl2)
-    ax.text(8.3, 12.2, 'Male\n(~35,000 excluded)', fontsize=9, ha='center', va='center')
-    
-    # Box 2: Age and gender eligible
-    arrow1 = FancyArrowPatch((5, 13.5), (5, 12.0), arrowstyle='->', 
-                            mutation_scale=20, linewidth=2, color=color_border)
-    ax.add_patch(arrow1)
-    
-    box2 = FancyBboxPatch((1.5, 10.5), 7, 1, boxstyle="round,pad=0.1",
-                          facecolor=color_box, edgecolor=color_border, linewidth=2)
-    ax.add_patch(box2)
-    ax.text(5, 11.0, 'Women 18-45 years\n~10,500 included', fontsize=11, ha='center', va='center')
-    
-    # Exclusion: Pregnant
-    box_excl3 = FancyBboxPatch((0.2, 9.3), 3, 0.7, boxstyle="round,pad=0.05",
-                               facecolor=color_excluded, edgecolor='red', linewidth=1.5)
-    ax.add_patch(box_excl3)
-    ax.text(1.7, 9.65, 'Pregnant\n(~600 excluded)', fontsize=9, ha='center', va='center')
-    
-    # Box 3: Non-pregnant
-    arrow2 = FancyArrowPatch((5, 10.5), (5, 9.3), arrowstyle='->',
-                            mutation_scale=20, linewidth=2, color=color_border)
-    ax.add_patch(arrow2)
-    
-    box3 = FancyBboxPatch((1.5, 8.0), 7, 1, boxstyle="round,pad=0.1",
-                          facecolor=color_box, edgecolor=color_border, linewidth=2)
-    ax.add_patch(box3)
-    ax.text(5, 8.5, 'Non-pregnant women 18-45\n~9,900 included', fontsize=11, ha='center', va='center')
-    
-    # Exclusion: Missing ferritin
-    box_excl4 = FancyBboxPatch((0.2, 6.8), 3, 0.7, boxstyle="round,pad=0.05",
-                               facecolor=color_excluded, edgecolor='red', linewidth=1.5)
-    ax.add_patch(box_excl4)
-    ax.text(1.7, 7.15, 'Missing ferritin\n(~2,500 excluded)', fontsize=9, ha='center', va='center')
-    
-    # Box 4: With ferritin
-    arrow3 = FancyArrowPatch((5, 8.0), (5, 7.0), arrowstyle='->',
-                            mutation_scale=20, linewidth=2, color=color_border)
-    ax.add_patch(arrow3)
-    
-    box4 = FancyBboxPatch((1.5, 5.5), 7, 1, boxstyle="round,pad=0.1",
-                          facecolor=color_box, edgecolor=color_border, linewidth=2)
-    ax.add_patch(box4)
-    ax.text(5, 6.0, 'With ferritin measurement\n~7,400 included', fontsize=11, ha='center', va='center')
-    
-    # Exclusion: Missing hemoglobin
-    box_excl5 = FancyBboxPatch((0.2, 4.3), 3, 0.7, boxstyle="round,pad=0.05",
-                               facecolor=color_excluded, edgecolor='red', linewidth=1.5)
-    ax.add_patch(box_excl5)
-    ax.text(1.7, 4.65, 'Missing hemoglobin\n(~50 excluded)', fontsize=9, ha='center', va='center')
-    
-    # Box 5: Final analytic sample
-    arrow4 = FancyArrowPatch((5, 5.5), (5, 4.5), arrowstyle='->',
-                            mutation_scale=20, linewidth=2, color=color_border)
-    ax.add_patch(arrow4)
-    
-    box5 = FancyBboxPatch((1.5, 2.8), 7, 1.5, boxstyle="round,pad=0.1",
-                          facecolor=color_final, edgecolor='green', linewidth=3)
-    ax.add_patch(box5)
-    ax.text(5, 3.8, 'FINAL ANALYTIC SAMPLE\nNon-pregnant women 18-45 years\nwith complete iron status data\n~7,350 participants', 
-            fontsize=12, ha='center', va='center', fontweight='bold')
+    for i, row in enumerate(cascade.itertuples()):
+        previous_y, y = y, y - row_gap
+        final = i == len(cascade) - 1
+        ax.add_patch(FancyArrowPatch((4, previous_y - 0.6), (4, y + 0.6), arrowstyle='->',
+                                     mutation_scale=20, linewidth=2, color=color_border))
+        
+        # Exclusion box beside the arrow
+        mid = (previous_y + y) / 2
+        ax.add_patch(FancyArrowPatch((4, mid), (8, mid), arrowstyle='->',
+                                     mutation_scale=15, linewidth=1.5, color='red'))
+        ax.add_patch(FancyBboxPatch((8, mid - 0.4), 3.5, 0.8, boxstyle="round,pad=0.05",
+                                    facecolor=color_excluded, edgecolor='red', linewidth=1.5))
+        ax.text(9.75, mid, f"{row.exclusion}\n(n = {row.n_excluded:,} excluded)",
+                fontsize=9, ha='center', va='center')
+        
+        if final:
+            ax.add_patch(FancyBboxPatch((1, y - 0.6), 6, 1.2, boxstyle="round,pad=0.1",
+                                        facecolor=color_final, edgecolor='green', linewidth=3))
+            ax.text(4, y, f"FINAL ANALYTIC SAMPLE\n{row.population}\nn = {row.n_after:,}",
+                    fontsize=12, ha='center', va='center', fontweight='bold')
+        else:
+            ax.add_patch(FancyBboxPatch((1, y - 0.5), 6, 1, boxstyle="round,pad=0.1",
+                                        facecolor=color_box, edgecolor=color_border, linewidth=2))
+            ax.text(4, y, f"{row.population}\nn = {row.n_after:,}",
+                    fontsize=11, ha='center', va='center')
     
     # Breakdown of final sample
-    box6 = FancyBboxPatch((0.5, 0.8), 4, 1.5, boxstyle="round,pad=0.08",
-                          facecolor='#FFF8E8', edgecolor='orange', linewidth=1.5)
-    ax.add_patch(box6)
-    ax.text(2.5, 1.8, 'IDWA Cases\n~800-1,000 (10-12%)\nFerritin <15 & Hgb ≥12', 
+    n_final, n_idwa = meta['n_final'], meta['n_idwa']
+    y_breakdown = y - 2.3
+    ax.add_patch(FancyBboxPatch((0.7, y_breakdown - 0.6), 3, 1.2, boxstyle="round,pad=0.08",
+                                facecolor='#FFF8E8', edgecolor='orange', linewidth=1.5))
+    ax.text(2.2, y_breakdown, f"IDWA Cases\n{n_idwa:,} ({100 * n_idwa / n_final:.1f}%)\n"
+            f"Ferritin <{FERRITIN_CUTOFF:g} & Hgb ≥{HEMOGLOBIN_CUTOFF:g}",
             fontsize=10, ha='center', va='center')
-    
-    box7 = FancyBboxPatch((5.5, 0.8), 4, 1.5, boxstyle="round,pad=0.08",
-                          facecolor='#E8F0FF', edgecolor='blue', linewidth=1.5)
-    ax.add_patch(box7)
-    ax.text(7.5, 1.8, 'Normal Iron Status\n~6,350-6,550 (88-90%)', 
+    ax.add_patch(FancyBboxPatch((4.3, y_breakdown - 0.6), 3, 1.2, boxstyle="round,pad=0.08",
+                                facecolor='#E8F0FF', edgecolor='blue', linewidth=1.5))
+    ax.text(5.8, y_breakdown, f"Without IDWA\n{n_final - n_idwa:,} "
+            f"({100 * (n_final - n_idwa) / n_final:.1f}%)",
             fontsize=10, ha='center', va='center')
     
     # Arrows to breakdown
-    arrow5a = FancyArrowPatch((3.5, 2.8), (2.5, 2.3), arrowstyle='->',
-                             mutation_scale=15, linewidth=1.5, color='orange')
-    ax.add_patch(arrow5a)
-    arrow5b = FancyArrowPatch((6.5, 2.8), (7.5, 2.3), arrowstyle='->',
-                             mutation_scale=15, linewidth=1.5, color='blue')
-    ax.add_patch(arrow5b)
+    ax.add_patch(FancyArrowPatch((3, y - 0.7), (2.2, y_breakdown + 0.7), arrowstyle='->',
+                                 mutation_scale=15, linewidth=1.5, color='orange'))
+    ax.add_patch(FancyArrowPatch((5, y - 0.7), (5.8, y_breakdown + 0.7), arrowstyle='->',
+                                 mutation_scale=15, linewidth=1.5, color='blue'))
     
     plt.tight_layout()
-    output_file = os.path.join(FIGURES_DIR, 'figure1_flow_diagram.png')
-    plt.savefig(output_file, dpi=300, bbox_inches='tight', facecolor='white')
-    print(f"Saved Figure 1 to: {output_file}")
-    plt.close()
+    return fig
 
-def create_figure2_ferritin_distribution(df):
-    """Create Figure 2: Ferritin distribution by supplement use."""
+def create_figure2_ferritin_distribution(plot_data):
+    """Create Figure 2: Survey-weighted ferritin distribution by supplement use."""
     
     fig, axes = plt.subplots(2, 2, figsize=(14, 12), dpi=300)
+    groups = ['No Supplement', 'Iron Supplement']
+    colors = {'No Supplement': '#E74C3C', 'Iron Supplement': '#27AE60'}
+    kde = plot_data['kde']
+    box = plot_data['box'].set_index(['variable', 'group'])
     
-    # Filter to reasonable ferritin range for visualization
-    df_plot = df[(df['LBXFER'] >= 2) & (df['LBXFER'] <= 150)].copy()
-    
-    # Panel A: Violin plot
+    # Panel A: Violin plot (mirrored KDE with inner quartile box)
     ax1 = axes[0, 0]
-    supp_labels = {0: 'No Supplement', 1: 'Iron Supplement'}
-    df_plot['supp_label'] = df_plot['iron_supplement'].map(supp_labels)
-    
-    sns.violinplot(data=df_plot, x='supp_label', y='LBXFER', ax=ax1, palette=['#E74C3C', '#27AE60'])
+    for i, group in enumerate(groups):
+        curve = kde[kde['group'] == group]
+        if len(curve) == 0:
+            continue
+        half = curve['density'] / curve['density'].max() * 0.4
+        ax1.fill_betweenx(curve['ferritin'], i - half, i + half, facecolor=colors[group],
+                          edgecolor='#333333', linewidth=1)
+        stats_row = box.loc[('LBXFER', group)]
+        ax1.vlines(i, stats_row['whislo'], stats_row['whishi'], color='#333333', linewidth=1.5)
+        ax1.vlines(i, stats_row['q1'], stats_row['q3'], color='#333333', linewidth=5)
+        ax1.scatter(i, stats_row['med'], color='white', s=20, zorder=3)
+    ax1.set_xticks(range(len(groups)))
+    ax1.set_xticklabels(groups)
     ax1.set_ylabel('Ferritin (ng/mL)', fontsize=12, fontweight='bold')
     ax1.set_xlabel('Iron Supplement Use', fontsize=12, fontweight='bold')
     ax1.set_title('A. Ferritin Distribution by Supplement Use', fontsize=13, fontweight='bold')
@@ -178,9 +177,16 @@ def create_figure2_ferritin_distribution(df):
     ax1.axhline(y=15, color='red', linestyle='--', linewidth=2, alpha=0.7, label='IDWA threshold')
     ax1.legend(loc='upper right')
     
-    # Panel B: Box plot (log scale)
+    # Panel B: Box plot (log scale) from precomputed statistics
     ax2 = axes[0, 1]
-    sns.boxplot(data=df_plot, x='supp_label', y='log_ferritin', ax=ax2, palette=['#E74C3C', '#27AE60'])
+    fliers = plot_data['fliers']
+    present = [g for g in groups if ('log_ferritin', g) in box.index]
+    box_stats = [{**box.loc[('log_ferritin', g)].to_dict(), 'label': g,
+                  'fliers': fliers.loc[fliers['group'] == g, 'log_ferritin'].to_numpy()}
+                 for g in present]
+    parts = ax2.bxp(box_stats, positions=range(len(present)), widths=0.6, patch_artist=True)
+    for patch, group in zip(parts['boxes'], present):
+        patch.set_facecolor(colors[group])
     ax2.set_ylabel('Log(Ferritin)', fontsize=12, fontweight='bold')
     ax2.set_xlabel('Iron Supplement Use', fontsize=12, fontweight='bold')
     ax2.set_title('B. Log-Transformed Ferritin', fontsize=13, fontweight='bold')
@@ -189,15 +195,17 @@ def create_figure2_ferritin_distribution(df):
     ax2.axhline(y=np.log(15), color='red', linestyle='--', linewidth=2, alpha=0.7, label='IDWA threshold')
     ax2.legend(loc='lower right')
     
-    # Panel C: Histogram
+    # Panel C: Histogram from weighted bin shares
     ax3 = axes[1, 0]
-    bins = np.linspace(2, 100, 30)
-    ax3.hist(df_plot[df_plot['iron_supplement'] == 0]['LBXFER'], bins=bins, alpha=0.6, 
-            label='No Supplement', color='#E74C3C', edgecolor='white')
-    ax3.hist(df_plot[df_plot['iron_supplement'] == 1]['LBXFER'], bins=bins, alpha=0.6,
-            label='Iron Supplement', color='#27AE60', edgecolor='white')
+    hist = plot_data['hist']
+    for group in groups:
+        shares = hist[hist['group'] == group]
+        if len(shares) == 0:
+            continue
+        ax3.bar(shares['bin_left'], shares['percent'], width=shares['bin_right'] - shares['bin_left'],
+                align='edge', alpha=0.6, label=group, color=colors[group], edgecolor='white')
     ax3.set_xlabel('Ferritin (ng/mL)', fontsize=12, fontweight='bold')
-    ax3.set_ylabel('Frequency', fontsize=12, fontweight='bold')
+    ax3.set_ylabel('Weighted Percent of Group (%)', fontsize=12, fontweight='bold')
     ax3.set_title('C. Ferritin Distribution Histogram', fontsize=13, fontweight='bold')
     ax3.legend()
     ax3.set_xlim(0, 100)
@@ -205,17 +213,13 @@ def create_figure2_ferritin_distribution(df):
     # Add vertical line at IDWA threshold
     ax3.axvline(x=15, color='red', linestyle='--', linewidth=2, alpha=0.7)
     
-    # Panel D: Cumulative distribution
+    # Panel D: Weighted cumulative distribution on the ferritin grid
     ax4 = axes[1, 1]
-    
-    no_supp = df_plot[df_plot['iron_supplement'] == 0]['LBXFER'].sort_values()
-    supp = df_plot[df_plot['iron_supplement'] == 1]['LBXFER'].sort_values()
-    
-    y_no_supp = np.arange(1, len(no_supp) + 1) / len(no_supp) * 100
-    y_supp = np.arange(1, len(supp) + 1) / len(supp) * 100
-    
-    ax4.plot(no_supp, y_no_supp, label='No Supplement', color='#E74C3C', linewidth=2)
-    ax4.plot(supp, y_supp, label='Iron Supplement', color='#27AE60', linewidth=2)
+    ecdf = plot_data['ecdf']
+    for group in groups:
+        curve = ecdf[ecdf['group'] == group]
+        ax4.step(curve['ferritin'], curve['percentile'], where='post', label=group,
+                 color=colors[group], linewidth=2)
     ax4.set_xlabel('Ferritin (ng/mL)', fontsize=12, fontweight='bold')
     ax4.set_ylabel('Cumulative Percentile (%)', fontsize=12, fontweight='bold')
     ax4.set_title('D. Cumulative Distribution', fontsize=13, fontweight='bold')
@@ -232,55 +236,26 @@ def create_figure2_ferritin_distribution(df):
             ha='left', va='bottom')
     
     plt.tight_layout()
-    output_file = os.path.join(FIGURES_DIR, 'figure2_ferritin_distribution.png')
-    plt.savefig(output_file, dpi=300, bbox_inches='tight', facecolor='white')
-    print(f"Saved Figure 2 to: {output_file}")
-    plt.close()
+    return fig
 
-def create_figure3_idwa_prevalence(df):
+def create_figure3_idwa_prevalence(margins):
     """Create Figure 3: IDWA prevalence by age and race."""
     
     fig, axes = plt.subplots(2, 2, figsize=(14, 12), dpi=300)
     
-    weights = df['weight_adjusted'].values
-    
     # Panel A: IDWA prevalence by age group
     ax1 = axes[0, 0]
     
-    age_groups = ['18-25', '26-30', '31-35', '36-40', '41-45']
-    age_prev = []
-    age_se = []
-    age_n = []
+    by_age = margins['age'].set_index('age_group').reindex(AGE_GROUPS)
+    age_prev = (by_age['prevalence'].fillna(0) * 100).tolist()
+    age_se = (by_age['se'].fillna(0) * 100).tolist()
+    age_n = by_age['n_total'].fillna(0).astype(int).tolist()
     
-    for age_grp in age_groups:
-        subgroup = df[df['age_group'] == age_grp]
-        n_total = len(subgroup)
-        n_idwa = subgroup['IDWA'].sum()
-        
-        if n_total > 0:
-            w = subgroup['weight_adjusted'].values
-            idwa_vals = subgroup['IDWA'].astype(int).values
-            mask = (~np.isnan(w)) & (~np.isnan(idwa_vals)) & (w > 0)
-            if mask.sum() > 0:
-                prev = np.average(idwa_vals[mask], weights=w[mask])
-                # Approximate SE
-                se = np.sqrt(prev * (1 - prev) / mask.sum())
-            else:
-                prev = n_idwa / n_total if n_total > 0 else 0
-                se = 0
-        else:
-            prev = 0
-            se = 0
-        
-        age_prev.append(prev * 100)
-        age_se.append(se * 100)
-        age_n.append(n_total)
-    
-    x_pos = np.arange(len(age_groups))
+    x_pos = np.arange(len(AGE_GROUPS))
     bars1 = ax1.bar(x_pos, age_prev, yerr=age_se, capsize=5, color='#3498DB', 
                    edgecolor='black', linewidth=1.5, alpha=0.8)
     ax1.set_xticks(x_pos)
-    ax1.set_xticklabels(age_groups)
+    ax1.set_xticklabels(AGE_GROUPS)
     ax1.set_xlabel('Age Group (years)', fontsize=12, fontweight='bold')
     ax1.set_ylabel('IDWA Prevalence (%)', fontsize=12, fontweight='bold')
     ax1.set_title('A. IDWA Prevalence by Age Group', fontsize=13, fontweight='bold')
@@ -298,41 +273,10 @@ def create_figure3_idwa_prevalence(df):
     
     races = ['Non-Hispanic\nWhite', 'Non-Hispanic\nBlack', 'Mexican\nAmerican', 
              'Other\nHispanic', 'Other\nRace']
-    race_prev = []
-    race_se = []
-    race_n = []
-    
-    race_mapping = {
-        'Non-Hispanic White': 'Non-Hispanic\nWhite',
-        'Non-Hispanic Black': 'Non-Hispanic\nBlack',
-        'Mexican American': 'Mexican\nAmerican',
-        'Other Hispanic': 'Other\nHispanic',
-        'Other Race': 'Other\nRace'
-    }
-    
-    for race in ['Non-Hispanic White', 'Non-Hispanic Black', 'Mexican American',
-                 'Other Hispanic', 'Other Race']:
-        subgroup = df[df['race_category'] == race]
-        n_total = len(subgroup)
-        n_idwa = subgroup['IDWA'].sum()
-        
-        if n_total > 0:
-            w = subgroup['weight_adjusted'].values
-            idwa_vals = subgroup['IDWA'].astype(int).values
-            mask = (~np.isnan(w)) & (~np.isnan(idwa_vals)) & (w > 0)
-            if mask.sum() > 0:
-                prev = np.average(idwa_vals[mask], weights=w[mask])
-                se = np.sqrt(prev * (1 - prev) / mask.sum())
-            else:
-                prev = n_idwa / n_total if n_total > 0 else 0
-                se = 0
-        else:
-            prev = 0
-            se = 0
-        
-        race_prev.append(prev * 100)
-        race_se.append(se * 100)
-        race_n.append(n_total)
+    by_race = margins['race'].set_index('race_category').reindex(RACE_ORDER)
+    race_prev = (by_race['prevalence'].fillna(0) * 100).tolist()
+    race_se = (by_race['se'].fillna(0) * 100).tolist()
+    race_n = by_race['n_total'].fillna(0).astype(int).tolist()
     
     colors_race = ['#E74C3C', '#3498DB', '#2ECC71', '#F39C12', '#9B59B6']
     x_pos = np.arange(len(races))
@@ -355,30 +299,12 @@ def create_figure3_idwa_prevalence(df):
     # Panel C: Heatmap by age and race
     ax3 = axes[1, 0]
     
-    heatmap_data = []
-    for age_grp in age_groups:
-        row = []
-        for race in ['Non-Hispanic White', 'Non-Hispanic Black', 'Mexican American',
-                     'Other Hispanic', 'Other Race']:
-            subgroup = df[(df['age_group'] == age_grp) & (df['race_category'] == race)]
-            n_total = len(subgroup)
-            
-            if n_total >= 20:  # Minimum sample size
-                w = subgroup['weight_adjusted'].values
-                idwa_vals = subgroup['IDWA'].astype(int).values
-                mask = (~np.isnan(w)) & (~np.isnan(idwa_vals)) & (w > 0)
-                if mask.sum() > 0:
-                    prev = np.average(idwa_vals[mask], weights=w[mask]) * 100
-                else:
-                    prev = np.nan
-            else:
-                prev = np.nan
-            row.append(prev)
-        heatmap_data.append(row)
-    
-    heatmap_df = pd.DataFrame(heatmap_data, 
-                             index=age_groups,
-                             columns=['NHW', 'NHB', 'MA', 'OH', 'OR'])
+    by_age_race = margins['age_race'].copy()
+    # Minimum sample size of 20 per cell
+    by_age_race.loc[by_age_race['n_total'] < 20, 'prevalence'] = np.nan
+    heatmap_df = (by_age_race.pivot(index='age_group', columns='race_category', values='prevalence')
+                  .reindex(index=AGE_GROUPS, columns=RACE_ORDER) * 100)
+    heatmap_df.columns = ['NHW', 'NHB', 'MA', 'OH', 'OR']
     
     sns.heatmap(heatmap_df, annot=True, fmt='.1f', cmap='YlOrRd', 
                cbar_kws={'label': 'IDWA Prevalence (%)'}, ax=ax3,
@@ -390,23 +316,18 @@ def create_figure3_idwa_prevalence(df):
     # Panel D: Prevalence by supplement use and race
     ax4 = axes[1, 1]
     
+    by_race_supp = margins['race_supp'].set_index(['race_category', 'iron_supplement'])
+    
     supp_race_prev = []
     supp_race_labels = []
     supp_race_colors = []
     
     for race in ['Non-Hispanic White', 'Non-Hispanic Black', 'Mexican American']:
         for supp in [0, 1]:
-            subgroup = df[(df['race_category'] == race) & (df['iron_supplement'] == supp)]
-            n_total = len(subgroup)
-            
-            if n_total >= 10:
-                w = subgroup['weight_adjusted'].values
-                idwa_vals = subgroup['IDWA'].astype(int).values
-                mask = (~np.isnan(w)) & (~np.isnan(idwa_vals)) & (w > 0)
-                if mask.sum() > 0:
-                    prev = np.average(idwa_vals[mask], weights=w[mask]) * 100
-                else:
-                    prev = 0
+            cell = by_race_supp.loc[(race, supp)]
+            # Minimum sample size of 10 per cell
+            if cell['n_total'] >= 10 and cell['weighted_total'] > 0:
+                prev = cell['prevalence'] * 100
             else:
                 prev = 0
             
@@ -432,47 +353,247 @@ def create_figure3_idwa_prevalence(df):
     ax4.legend(handles=legend_elements, loc='upper right')
     
     plt.tight_layout()
-    output_file = os.path.join(FIGURES_DIR, 'figure3_idwa_prevalence.png')
-    plt.savefig(output_file, dpi=300, bbox_inches='tight', facecolor='white')
-    print(f"Saved Figure 3 to: {output_file}")
-    plt.close()
+    return fig
+
+def create_figure4_forest_plot(plot_data):
+    """Create Figure 4: Forest plot of regression coefficients."""
+    
+    fig, ax = plt.subplots(figsize=(10, 8), dpi=300)
+    
+    coefficients = plot_data['coefficients']
+    row_colors = {
+        'Model 1: Unadjusted': '#2E86AB',
+        'Model 2: Demographics-adjusted': '#A23B72',
+        'Model 3: Fully adjusted': '#F18F01',
+        'Dose: Low': '#C73E1D',
+        'Dose: Moderate': '#6A994E',
+        'Dose: High': '#BC4B51',
+    }
+    labels = coefficients['label'].tolist()
+    coeffs = coefficients['coef'].tolist()
+    ci_lows = coefficients['ci_low'].tolist()
+    ci_highs = coefficients['ci_high'].tolist()
+    colors = [row_colors.get(label, '#333333') for label in labels]
+    
+    # Plot
+    y_pos = np.arange(len(labels))
+    
+    # Reference line at 0
+    ax.axvline(x=0, color='gray', linestyle='--', linewidth=0.8, alpha=0.7)
+    
+    # Plot points and error bars
+    for i, (label, coef, ci_low, ci_high, color) in enumerate(zip(labels, coeffs, ci_lows, ci_highs, colors)):
+        ax.errorbar(coef, i, xerr=[[coef - ci_low], [ci_high - coef]], 
+                   fmt='o', color=color, ecolor=color, capsize=5, capthick=2, 
+                   markersize=8, elinewidth=2)
+    
+    ax.set_yticks(y_pos)
+    ax.set_yticklabels(labels, fontsize=11)
+    ax.set_xlabel('Regression Coefficient (Log Ferritin)', fontsize=12, fontweight='bold')
+    ax.set_title('Forest Plot: Association Between Iron Supplement Use and Ferritin\n(Non-Pregnant Women 18-45 Years, NHANES 2005-2022)', 
+                fontsize=13, fontweight='bold', pad=15)
+    
+    # Invert y-axis so first model is at top
+    ax.invert_yaxis()
+    
+    # Add grid
+    ax.grid(axis='x', alpha=0.3, linestyle=':')
+    ax.set_axisbelow(True)
+    
+    # Tight layout
+    plt.tight_layout()
+    return fig
+
+def create_figure5_threshold_curve(plot_data):
+    """Create Figure 5: IDWA prevalence versus ferritin and hemoglobin cutoffs."""
+    
+    sweep = plot_data['sweep']
+    fig, axes = plt.subplots(1, 2, figsize=(14, 6), dpi=300)
+    
+    # Panel A: Overall prevalence, one curve per hemoglobin cutoff
+    ax1 = axes[0]
+    overall = sweep[sweep['group'] == 'Overall']
+    hb_cutoffs = sorted(overall['hemoglobin_cutoff'].unique())
+    colors_hb = sns.color_palette('viridis', len(hb_cutoffs))
+    
+    for hb, color in zip(hb_cutoffs, colors_hb):
+        curve = overall[overall['hemoglobin_cutoff'] == hb]
+        primary = hb == HEMOGLOBIN_CUTOFF
+        ax1.plot(curve['ferritin_cutoff'], curve['prevalence'] * 100, color=color,
+                linewidth=2.5 if primary else 1.5, label=f'Hb ≥{hb:.1f} g/dL')
+        if primary:
+            ax1.fill_between(curve['ferritin_cutoff'], curve['ci_low'] * 100, curve['ci_high'] * 100,
+                            color=color, alpha=0.2)
+    
+    for cutoff, label in [(FERRITIN_CUTOFF, 'Primary'), (SENSITIVITY_FERRITIN_CUTOFF, 'SA1')]:
+        ax1.axvline(cutoff, color='gray', linestyle='--', linewidth=1)
+        ax1.text(cutoff + 0.3, ax1.get_ylim()[1] * 0.95, f'{label}\n<{cutoff:g} ng/mL', fontsize=9, va='top')
+    
+    ax1.set_xlabel('Ferritin Cutoff (ng/mL)', fontsize=12, fontweight='bold')
+    ax1.set_ylabel('IDWA Prevalence (%)', fontsize=12, fontweight='bold')
+    ax1.set_title('A. IDWA Prevalence by Diagnostic Cutoff', fontsize=13, fontweight='bold')
+    ax1.legend(loc='lower right')
+    ax1.grid(alpha=0.3)
+    
+    # Panel B: Primary hemoglobin cutoff by race/ethnicity
+    ax2 = axes[1]
+    by_race = sweep[(sweep['group'] == 'race_category')
+                    & (sweep['hemoglobin_cutoff'] == HEMOGLOBIN_CUTOFF)]
+    colors_race = ['#E74C3C', '#3498DB', '#2ECC71', '#F39C12', '#9B59B6']
+    
+    for race, color in zip(RACE_ORDER, colors_race):
+        curve = by_race[by_race['subgroup'] == race]
+        if len(curve) == 0:
+            continue
+        ax2.plot(curve['ferritin_cutoff'], curve['prevalence'] * 100, color=color, linewidth=2, label=race)
+        ax2.fill_between(curve['ferritin_cutoff'], curve['ci_low'] * 100, curve['ci_high'] * 100,
+                        color=color, alpha=0.12)
+    
+    ax2.axvline(FERRITIN_CUTOFF, color='gray', linestyle='--', linewidth=1)
+    ax2.axvline(SENSITIVITY_FERRITIN_CUTOFF, color='gray', linestyle='--', linewidth=1)
+    ax2.set_xlabel('Ferritin Cutoff (ng/mL)', fontsize=12, fontweight='bold')
+    ax2.set_ylabel('IDWA Prevalence (%)', fontsize=12, fontweight='bold')
+    ax2.set_title(f'B. By Race/Ethnicity (Hb ≥{HEMOGLOBIN_CUTOFF:g} g/dL)', fontsize=13, fontweight='bold')
+    ax2.legend(loc='upper left', fontsize=9)
+    ax2.grid(alpha=0.3)
+    
+    plt.tight_layout()
+    return fig
+
+def create_figure6_dose_response_curve(plot_data):
+    """Create Figure 6: Spline dose-response curve relative to no supplementation."""
+    
+    curve = plot_data['curve']
+    spline = plot_data['meta']
+    fig, ax = plt.subplots(figsize=(8, 5.5), dpi=300)
+    
+    ax.fill_between(curve['dose'], curve['difference_ci_low'], curve['difference_ci_high'],
+                    color='#2E86AB', alpha=0.2, linewidth=0, label='95% CI')
+    ax.plot(curve['dose'], curve['difference'], color='#2E86AB', linewidth=2, label='Spline estimate')
+    ax.axhline(y=0, color='gray', linestyle='--', linewidth=0.8, alpha=0.7)
+    
+    # Knot positions
+    for knot in spline['knots']:
+        ax.axvline(x=knot, color='#BC4B51', linestyle=':', linewidth=0.8, alpha=0.6)
+    
+    ax.set_xlabel('Supplemental Iron Dose (mg/day)', fontsize=12, fontweight='bold')
+    ax.set_ylabel('Difference in Log Ferritin vs. None', fontsize=12, fontweight='bold')
+    ax.set_title('Dose-Response: Supplemental Iron and Ferritin\n'
+                 f"(Restricted Cubic Spline, p non-linearity = {spline['pvalue_nonlinear']:.3f})",
+                 fontsize=13, fontweight='bold', pad=15)
+    ax.legend(loc='lower right', fontsize=10)
+    ax.grid(alpha=0.3, linestyle=':')
+    ax.set_axisbelow(True)
+    
+    plt.tight_layout()
+    return fig
+
+# Renderer for every figure, in output order
+FIGURES = {
+    'figure1_flow_diagram': create_figure1_flow_diagram,
+    'figure2_ferritin_distribution': create_figure2_ferritin_distribution,
+    'figure3_idwa_prevalence': create_figure3_idwa_prevalence,
+    'figure4_forest_plot': create_figure4_forest_plot,
+    'figure5_threshold_curve': create_figure5_threshold_curve,
+    'figure6_dose_response_curve': create_figure6_dose_response_curve,
+}
+
+def compute_plot_data(df):
+    """Compute every figure's plot data from the microdata and write the artifacts."""
+    
+    with step('prevalence cube'):
+        design = SurveyDesign.from_dataframe(df)
+        cube = PrevalenceCube(df, design, outcome='IDWA')
+    with step('threshold sweep'):
+        sweep = sweep_idwa_prevalence(df, design, by=['race_category'])
+    
+    builders = {
+        'figure1_flow_diagram': lambda: figure1_plot_data(CASCADE_CSV, df),
+        'figure2_ferritin_distribution': lambda: figure2_plot_data(df),
+        'figure3_idwa_prevalence': lambda: figure3_plot_data(cube),
+        'figure4_forest_plot': lambda: figure4_plot_data(TABLES_DIR),
+        'figure5_threshold_curve': lambda: figure5_plot_data(sweep),
+        'figure6_dose_response_curve': lambda: figure6_plot_data(TABLES_DIR),
+    }
+    for name, build in builders.items():
+        with step(name):
+            result = build()
+        if result is None:
+            # Figure 1 is drawn from the cascade of 01_data_prep.py, Figures 4
+            # and 6 from the outputs of 03_regression_analysis.py
+            print(f"No plot data for {name}: run 01_data_prep.py and 03_regression_analysis.py first")
+            continue
+        tables, meta = result
+        path = os.path.join(PLOT_DATA_DIR, f'{name}.json')
+        write_plot_data(path, tables, meta)
+        print(f"Saved plot data to: {path}")
 
 def main():
+    parser = argparse.ArgumentParser(description="NHANES IDWA figure generation")
+    parser.add_argument('--render-only', action='store_true',
+                        help="re-render figures from existing plot data without reading the microdata")
+    parser.add_argument('--force', action='store_true',
+                        help="re-render every figure even if its plot data and style are unchanged")
+    args = parser.parse_args()
+    
     print("=" * 70)
     print("NHANES Iron Deficiency Without Anemia - Figure Generation")
     print("=" * 70)
     print()
     
-    # Load processed data
-    data_file = os.path.join(OUTPUT_DIR, 'processed_data.csv')
-    if not os.path.exists(data_file):
-        print(f"Error: Processed data not found at {data_file}")
-        print("Please run 01_data_prep.py first.")
-        return
-    
-    df = pd.read_csv(data_file)
-    print(f"Loaded processed data: {len(df)} rows")
-    print()
-    
-    # Create figures
-    print("=" * 70)
-    print("Creating Figure 1: Study flow diagram...")
-    print("=" * 70)
-    create_figure1_flow_diagram()
+    os.makedirs(PLOT_DATA_DIR, exist_ok=True)
     
+    if not args.render_only:
+        phase('load')
+        # Load processed data
+        data_file = os.path.join(OUTPUT_DIR, 'processed_data.csv')
+        if not os.path.exists(data_file):
+            print(f"Error: Processed data not found at {data_file}")
+            print("Please run 01_data_prep.py first.")
+            return
+        
+        df = read_processed_data(data_file)
+        print(f"Loaded processed data: {len(df)} rows")
+        print()
+        
+        phase('plot data')
+        # Compute plot data once; renderers only read the artifacts
+        print("=" * 70)
+        print("Computing plot data...")
+        print("=" * 70)
+        compute_plot_data(df)
+    
+    jobs = []
+    for name, renderer in FIGURES.items():
+        path = os.path.join(PLOT_DATA_DIR, f'{name}.json')
+        if not os.path.exists(path):
+            print(f"Skipping {name}: plot data not found at {path}")
+            continue
+        jobs.append((name, renderer, path, os.path.join(FIGURES_DIR, name)))
+    
+    phase('render')
+    # Render changed figures in their own worker processes
     print("\n" + "=" * 70)
-    print("Creating Figure 2: Ferritin distribution...")
+    print(f"Rendering {len(jobs)} figures...")
     print("=" * 70)
-    create_figure2_ferritin_distribution(df)
+    manifest_path = os.path.join(FIGURES_DIR, MANIFEST_FILE)
+    timings = render_figures(jobs, figure_formats=FIGURE_FORMAT_OVERRIDES,
+                             manifest_path=manifest_path, force=args.force)
+    for _, row in timings.iterrows():
+        if row['status'] == 'unchanged':
+            print(f"Unchanged {row['figure']} ({row['format']}): {row['file']}")
+        else:
+            print(f"Saved {row['figure']} ({row['format']}, {row['save_seconds']:.2f}s) to: {row['file']}")
+    print(f"Saved figure manifest to: {manifest_path}")
     
-    print("\n" + "=" * 70)
-    print("Creating Figure 3: IDWA prevalence by demographics...")
-    print("=" * 70)
-    create_figure3_idwa_prevalence(df)
+    timings_csv = os.path.join(FIGURES_DIR, 'figure_timings.csv')
+    timings.to_csv(timings_csv, index=False)
+    print(f"Saved figure timings to: {timings_csv}")
     
     print("\n" + "=" * 70)
     print("Figure generation complete!")
     print("=" * 70)
 
 if __name__ == "__main__":
-    main()
+    with StageProfiler('04_generate_figures', OUTPUT_DIR):
+        main()
@@ -15,8 +15,17 @@ import numpy as np
 import os
 from datetime import datetime
 
+from profiling import StageProfiler, phase
+from results_store import STORE_FILE, current_run_id, read_estimates
+from schema import RACE_CATEGORIES, POVERTY_CATEGORIES
+
 OUTPUT_DIR = "studies/iron-deficiency-women-2026-01-31/04-analysis"
 TABLES_DIR = os.path.join(OUTPUT_DIR, "outputs", "tables")
+RESULTS_STORE = os.path.join(OUTPUT_DIR, "outputs", STORE_FILE)
+
+# Markdown tables written by table_renderer.py, in manuscript order
+MARKDOWN_TABLES = ['table1_characteristics', 'table2_idwa_by_demographics',
+                   'table3_regression_results', 'table4_dose_response']
 
 def format_number(n, decimals=1):
     """Format number with specified decimals."""
@@ -30,41 +39,38 @@ def format_percent(n, decimals=1):
         return "N/A"
     return f"{n*100:.{decimals}f}%"
 
-def generate_results_summary():
-    """Generate comprehensive results summary."""
-    
-    # Load processed data
-    data_file = os.path.join(OUTPUT_DIR, 'processed_data.csv')
-    df = pd.read_csv(data_file)
-    
-    # Load table results
-    table1_file = os.path.join(TABLES_DIR, 'table1_characteristics.csv')
-    table1 = pd.read_csv(table1_file).iloc[0] if os.path.exists(table1_file) else None
-    
-    table2_file = os.path.join(TABLES_DIR, 'table2_idwa_by_demographics.csv')
-    table2 = pd.read_csv(table2_file) if os.path.exists(table2_file) else None
-    
-    reg_file = os.path.join(TABLES_DIR, 'regression_results.csv')
-    reg_results = pd.read_csv(reg_file) if os.path.exists(reg_file) else None
-    
-    dose_file = os.path.join(TABLES_DIR, 'dose_response_results.csv')
-    dose_results = pd.read_csv(dose_file) if os.path.exists(dose_file) else None
-    
-    # Calculate key statistics
-    n_total = len(df)
-    n_idwa = df['IDWA'].sum()
+def format_percent_se(value, se):
+    """Format percentage (SE) as in Table 2."""
+    if pd.isna(value):
+        return "N/A"
+    return f"{value*100:.1f} ({se*100:.1f})"
+
+def generate_results_summary(estimates):
+    """Generate comprehensive results summary from the stored estimates."""
+    
+    def analysis(name):
+        return estimates[estimates['analysis'] == name]
+    
+    # Estimates written by 02_descriptive_stats.py and 03_regression_analysis.py
+    sample = analysis('sample').set_index('term')['estimate']
+    table1 = analysis('table1_characteristics').set_index('term')
+    table2 = analysis('idwa_by_demographics').rename(columns={'term': 'group'})
+    reg_results = analysis('regression')
+    dose_results = analysis('dose_response').set_index('term')
+    
+    # Key statistics
+    n_total = int(sample['n_total'])
+    n_idwa = int(sample['n_idwa'])
     idwa_prev = n_idwa / n_total
     
-    n_supp = df['iron_supplement'].sum()
+    n_supp = int(sample['n_supplement'])
+    n_weight_cycles = int(sample['n_cycles'])
     supp_prev = n_supp / n_total
     
-    # Weighted estimates
-    weights = df['weight_adjusted'].values
-    
-    # Weighted IDWA prevalence
-    mask = (~np.isnan(weights)) & (weights > 0)
-    idwa_weighted = np.average(df.loc[mask, 'IDWA'].astype(int).values, weights=weights[mask])
-    idwa_se = np.sqrt(idwa_weighted * (1 - idwa_weighted) / mask.sum())
+    # Weighted IDWA prevalence (overall row of Table 2)
+    overall = table2[table2['group'] == 'Overall'].iloc[0]
+    idwa_weighted = overall['idwa_prevalence']
+    idwa_se = overall['idwa_se']
     idwa_ci_low = max(0, idwa_weighted - 1.96 * idwa_se)
     idwa_ci_high = min(1, idwa_weighted + 1.96 * idwa_se)
     
@@ -118,7 +124,7 @@ def generate_results_summary():
     summary.append("")
     
     # IDWA by demographics
-    if table2 is not None:
+    if len(table2) > 0:
         summary.append("### 3.2 IDWA Prevalence by Demographics")
         summary.append("")
         
@@ -127,7 +133,7 @@ def generate_results_summary():
         if len(age_data) > 0:
             summary.append("**By Age Group:**")
             for _, row in age_data.iterrows():
-                summary.append(f"- {row['subgroup']}: {row['idwa_pct']}")
+                summary.append(f"- {row['subgroup']}: {format_percent_se(row['idwa_prevalence'], row['idwa_se'])}")
             summary.append("")
         
         # Race
@@ -135,7 +141,7 @@ def generate_results_summary():
         if len(race_data) > 0:
             summary.append("**By Race/Ethnicity:**")
             for _, row in race_data.iterrows():
-                summary.append(f"- {row['subgroup']}: {row['idwa_pct']}")
+                summary.append(f"- {row['subgroup']}: {format_percent_se(row['idwa_prevalence'], row['idwa_se'])}")
             summary.append("")
         
         # Supplement use
@@ -143,22 +149,22 @@ def generate_results_summary():
         if len(supp_data) > 0:
             summary.append("**By Iron Supplement Use:**")
             for _, row in supp_data.iterrows():
-                summary.append(f"- {row['subgroup']}: {row['idwa_pct']}")
+                summary.append(f"- {row['subgroup']}: {format_percent_se(row['idwa_prevalence'], row['idwa_se'])}")
             summary.append("")
     
     # Regression results
     summary.append("### 3.3 Association Between Iron Supplement Use and Ferritin")
     summary.append("")
     
-    if reg_results is not None:
-        for _, row in reg_results.iterrows():
-            model_name = row['model']
-            coef = row['coef_supp']
-            ci_low = row['ci_low_supp']
-            ci_high = row['ci_high_supp']
-            pval = row['pvalue_supp']
-            n = int(row['n'])
-            r2 = row['r2']
+    if len(reg_results) > 0:
+        for model_name, model_rows in reg_results.groupby('model', sort=False):
+            fit = model_rows.set_index('term')
+            coef = fit.loc['supp', 'estimate']
+            ci_low = fit.loc['supp', 'ci_low']
+            ci_high = fit.loc['supp', 'ci_high']
+            pval = fit.loc['supp', 'pvalue']
+            n = int(fit.loc['n', 'estimate'])
+            r2 = fit.loc['r2', 'estimate']
             
             p_str = f"{pval:.4f}" if pval >= 0.001 else "<0.001"
             sig = "***" if pval < 0.001 else "**" if pval < 0.01 else "*" if pval < 0.05 else "ns"
@@ -174,64 +180,63 @@ def generate_results_summary():
     summary.append("### 3.4 Dose-Response Analysis")
     summary.append("")
     
-    if dose_results is not None and len(dose_results) > 0:
-        dose = dose_results.iloc[0]
-        
+    if len(dose_results) > 0:
         summary.append("**Dose Categories (vs. None):**")
         summary.append("")
         
-        if 'coef_low' in dose and not pd.isna(dose['coef_low']):
-            p_str = f"{dose['pvalue_low']:.4f}" if dose['pvalue_low'] >= 0.001 else "<0.001"
-            summary.append(f"- **Low dose (>0 to <18 mg/day):**")
-            summary.append(f"  - Coefficient: {format_number(dose['coef_low'], 4)} (95% CI: {format_number(dose['ci_low_low'], 4)} to {format_number(dose['ci_high_low'], 4)})")
-            summary.append(f"  - p-value: {p_str}")
-            summary.append("")
-        
-        if 'coef_mod' in dose and not pd.isna(dose['coef_mod']):
-            p_str = f"{dose['pvalue_mod']:.4f}" if dose['pvalue_mod'] >= 0.001 else "<0.001"
-            summary.append(f"- **Moderate dose (18 to <27 mg/day):**")
-            summary.append(f"  - Coefficient: {format_number(dose['coef_mod'], 4)} (95% CI: {format_number(dose['ci_low_mod'], 4)} to {format_number(dose['ci_high_mod'], 4)})")
-            summary.append(f"  - p-value: {p_str}")
-            summary.append("")
-        
-        if 'coef_high' in dose and not pd.isna(dose['coef_high']):
-            p_str = f"{dose['pvalue_high']:.4f}" if dose['pvalue_high'] >= 0.001 else "<0.001"
-            summary.append(f"- **High dose (≥27 mg/day):**")
-            summary.append(f"  - Coefficient: {format_number(dose['coef_high'], 4)} (95% CI: {format_number(dose['ci_low_high'], 4)} to {format_number(dose['ci_high_high'], 4)})")
+        for level, label in [('low', 'Low dose (>0 to <18 mg/day)'),
+                             ('mod', 'Moderate dose (18 to <27 mg/day)'),
+                             ('high', 'High dose (≥27 mg/day)')]:
+            if level not in dose_results.index or pd.isna(dose_results.loc[level, 'estimate']):
+                continue
+            dose = dose_results.loc[level]
+            p_str = f"{dose['pvalue']:.4f}" if dose['pvalue'] >= 0.001 else "<0.001"
+            summary.append(f"- **{label}:**")
+            summary.append(f"  - Coefficient: {format_number(dose['estimate'], 4)} (95% CI: {format_number(dose['ci_low'], 4)} to {format_number(dose['ci_high'], 4)})")
             summary.append(f"  - p-value: {p_str}")
             summary.append("")
     
+    # Manuscript tables, as rendered by 02/03 (no re-formatting here)
+    rendered = [name for name in MARKDOWN_TABLES
+                if os.path.exists(os.path.join(TABLES_DIR, f'{name}.md'))]
+    if rendered:
+        summary.append("### 3.5 Manuscript Tables")
+        summary.append("")
+        for name in rendered:
+            with open(os.path.join(TABLES_DIR, f'{name}.md')) as f:
+                summary.append(f.read())
+    
     # Characteristics
     summary.append("## 4. Study Population Characteristics")
     summary.append("")
     
-    if table1 is not None:
-        summary.append(f"- **Mean age:** {format_number(table1['age_mean'], 1)} ± {format_number(table1['age_sd'], 1)} years")
-        summary.append(f"- **Mean BMI:** {format_number(table1['bmi_mean'], 1)} ± {format_number(table1['bmi_sd'], 1)} kg/m²")
-        summary.append(f"- **Median ferritin:** {format_number(table1['ferritin_median'], 1)} ng/mL (IQR: {format_number(table1['ferritin_q25'], 1)} - {format_number(table1['ferritin_q75'], 1)})")
-        summary.append(f"- **Mean hemoglobin:** {format_number(table1['hemoglobin_mean'], 1)} ± {format_number(table1['hemoglobin_sd'], 1)} g/dL")
-        summary.append(f"- **Iron supplement use:** {format_percent(table1['supplement_prevalence'], 1)}")
+    if len(table1) > 0:
+        summary.append(f"- **Mean age:** {format_number(table1.loc['age_mean', 'estimate'], 1)} ± {format_number(table1.loc['age_mean', 'sd'], 1)} years")
+        summary.append(f"- **Mean BMI:** {format_number(table1.loc['bmi_mean', 'estimate'], 1)} ± {format_number(table1.loc['bmi_mean', 'sd'], 1)} kg/m²")
+        summary.append(f"- **Median ferritin:** {format_number(table1.loc['ferritin_median', 'estimate'], 1)} ng/mL (IQR: {format_number(table1.loc['ferritin_median', 'q25'], 1)} - {format_number(table1.loc['ferritin_median', 'q75'], 1)})")
+        summary.append(f"- **Mean hemoglobin:** {format_number(table1.loc['hemoglobin_mean', 'estimate'], 1)} ± {format_number(table1.loc['hemoglobin_mean', 'sd'], 1)} g/dL")
+        summary.append(f"- **Iron supplement use:** {format_percent(table1.loc['supplement_prevalence', 'estimate'], 1)}")
         summary.append("")
         
         summary.append("**Race/Ethnicity Distribution:**")
-        for race in ['Mexican American', 'Other Hispanic', 'Non-Hispanic White', 'Non-Hispanic Black', 'Other Race']:
+        for race in RACE_CATEGORIES:
             key = f'race_{race.replace(" ", "_").replace("-", "_")}'
-            if key in table1:
-                summary.append(f"- {race}: {format_percent(table1[key], 1)}")
+            if key in table1.index:
+                summary.append(f"- {race}: {format_percent(table1.loc[key, 'estimate'], 1)}")
         summary.append("")
         
         summary.append("**Poverty Status Distribution:**")
-        for pov in ['Low (<1.3)', 'Medium (1.3-3.5)', 'High (≥3.5)']:
+        for pov in POVERTY_CATEGORIES:
             cat_key = pov.replace(" ", "_").replace("(", "").replace(")", "").replace("<", "lt_").replace("≥", "ge_")
             key = f'poverty_{cat_key}'
-            if key in table1:
-                summary.append(f"- {pov}: {format_percent(table1[key], 1)}")
+            if key in table1.index:
+                summary.append(f"- {pov}: {format_percent(table1.loc[key, 'estimate'], 1)}")
         summary.append("")
     
     # Statistical Methods
     summary.append("## 5. Statistical Methods")
     summary.append("")
-    summary.append("- **Survey weights:** Adjusted for 8-year pooled analysis (WTMEC2YR / 8)")
+    summary.append(f"- **Survey weights:** WTMEC2YR pooled over the {n_weight_cycles} cycles contributing ferritin data (WTMEC2YR / {n_weight_cycles})")
     summary.append("- **Regression models:** Survey-weighted linear regression (WLS)")
     summary.append("- **Outcome transformation:** Natural log of ferritin")
     summary.append("- **Missing data:** Complete case analysis")
@@ -242,12 +247,12 @@ def generate_results_summary():
     summary.append("## 6. Key Interpretations")
     summary.append("")
     
-    if reg_results is not None:
+    if len(reg_results) > 0:
         # Get fully adjusted model
-        model3 = reg_results[reg_results['model'] == 'model3']
+        model3 = reg_results[(reg_results['model'] == 'model3') & (reg_results['term'] == 'supp')]
         if len(model3) > 0:
-            coef = model3.iloc[0]['coef_supp']
-            pval = model3.iloc[0]['pvalue_supp']
+            coef = model3.iloc[0]['estimate']
+            pval = model3.iloc[0]['pvalue']
             
             if pval < 0.05:
                 direction = "higher" if coef > 0 else "lower"
@@ -281,6 +286,8 @@ def generate_results_summary():
     summary.append("### Data Files")
     summary.append("- `processed_data.csv` - Final analytic dataset")
     summary.append("- `exclusions.csv` - Exclusion criteria summary")
+    summary.append("- `exclusion_cascade.csv` - Sample size before and after each criterion")
+    summary.append("- `outputs/results.sqlite` - Results store: estimates from every run, keyed by run, analysis, model, term and subgroup")
     summary.append("")
     summary.append("### Tables (LaTeX)")
     summary.append("- `table1_characteristics.tex` - Study population characteristics")
@@ -293,9 +300,10 @@ def generate_results_summary():
     summary.append("- `table2_idwa_by_demographics.csv` - Table 2 data")
     summary.append("- `regression_results.csv` - Regression coefficients")
     summary.append("- `dose_response_results.csv` - Dose-response coefficients")
+    summary.append("- `*_formatted.csv` / `*.md` - Tables 1-4 and S3 as formatted in the manuscript")
     summary.append("")
-    summary.append("### Figures (300 DPI PNG)")
-    summary.append("- `figure1_flow_diagram.png` - Study flow diagram")
+    summary.append("### Figures (300 DPI PNG, PDF and SVG)")
+    summary.append("- `figure1_flow_diagram.pdf` / `.svg` - Study flow diagram")
     summary.append("- `figure2_ferritin_distribution.png` - Ferritin distribution")
     summary.append("- `figure3_idwa_prevalence.png` - IDWA by demographics")
     summary.append("- `figure4_forest_plot.png` - Regression forest plot")
@@ -318,16 +326,19 @@ def main():
     print("Generating Results Summary...")
     print("=" * 70)
     
-    # Check if processed data exists
-    data_file = os.path.join(OUTPUT_DIR, 'processed_data.csv')
-    if not os.path.exists(data_file):
-        print(f"Error: Processed data not found at {data_file}")
+    phase('load')
+    # Estimates of this run from the results store
+    estimates = read_estimates(RESULTS_STORE) if os.path.exists(RESULTS_STORE) else None
+    if estimates is None or 'sample' not in set(estimates['analysis']):
+        print(f"Error: No estimates for run {current_run_id()} in {RESULTS_STORE}")
         print("Please run the analysis pipeline first.")
         return
     
+    phase('summary')
     # Generate summary
-    summary = generate_results_summary()
+    summary = generate_results_summary(estimates)
     
+    phase('write')
     # Save summary
     output_file = os.path.join(OUTPUT_DIR, 'results_summary.md')
     with open(output_file, 'w') as f:
@@ -339,4 +350,5 @@ def main():
     print(summary[:2000] + "..." if len(summary) > 2000 else summary)
 
 if __name__ == "__main__":
-    main()
+    with StageProfiler('05_generate_summary', OUTPUT_DIR):
+        main()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+NHANES Iron Deficiency Without Anemia Study - Trend Analysis Script
+===================================================================
+
+This script:
+1. Computes per-cycle sufficient statistics (PSU-level weighted totals)
+2. Caches them per cycle, keyed by the fingerprint of that cycle's raw
+   files that 01_data_prep.py records for its prepared rows
+3. Estimates per-cycle IDWA prevalence and mean log-ferritin with
+   Taylor-linearized standard errors
+4. Tests for a linear trend across cycles (survey-weighted Wald test)
+5. Outputs trend tables in LaTeX and CSV
+
+Cycle-specific estimates use the 2-year weight (WTMEC2YR), so a cycle's
+cached statistics stay valid when cycles are added to the pooled sample.
+Neither processed_data.csv nor any unchanged cycle is read: only the
+prepared rows of new or changed cycles are loaded and aggregated.
+
+Author: NHANES Analysis Pipeline
+Date: 2026-10-19
+"""
+
+import pandas as pd
+import numpy as np
+import os
+import sys
+from scipy import stats
+
+from cycle_cache import PREPARED_CYCLES_DIR, read_cached_cycle, read_cycle_meta, write_cached_cycle
+from profiling import StageProfiler, phase
+from survey_design import stratified_psu_variance
+from survey_weights import CYCLE_TABLE
+
+# Set random seed for reproducibility
+np.random.seed(42)
+
+OUTPUT_DIR = "studies/iron-deficiency-women-2026-01-31/04-analysis"
+TABLES_DIR = os.path.join(OUTPUT_DIR, "outputs", "tables")
+CACHE_DIR = os.path.join(OUTPUT_DIR, "cache", "trend_cycle_stats")
+
+# Bump when the sufficient statistics change so stale caches are rebuilt
+STATS_VERSION = 1
+STAT_COLUMNS = ['SDMVSTRA', 'SDMVPSU', 'WTMEC2YR', 'IDWA', 'log_ferritin']
+
+def compute_cycle_stats(cycle_df):
+    """Compute PSU-level weighted totals for one cycle."""
+    w = cycle_df['WTMEC2YR'].where(cycle_df['WTMEC2YR'] > 0, 0).fillna(0)
+    idwa = cycle_df['IDWA'].astype(float)
+    log_fer = cycle_df['log_ferritin']
+    has_fer = log_fer.notna()
+
+    psu_stats = pd.DataFrame({
+        'SDMVSTRA': cycle_df['SDMVSTRA'],
+        'SDMVPSU': cycle_df['SDMVPSU'],
+        'n': 1,
+        'n_idwa': idwa,
+        'w': w,
+        'w_idwa': w * idwa,
+        'w_fer': w * has_fer,
+        'w_logfer': (w * log_fer).where(has_fer, 0),
+    }).groupby(['SDMVSTRA', 'SDMVPSU'], as_index=False).sum()
+
+    return psu_stats
+
+def load_cycle_stats():
+    """Return sufficient statistics per cycle, recomputing only new or changed cycles.
+
+    Cycles come from the per-cycle preparation of 01_data_prep.py; a
+    cycle's statistics are reused while its preparation fingerprint (its
+    raw files, preparation code and settings) is unchanged.
+    """
+    prepared_dir = os.path.join(OUTPUT_DIR, PREPARED_CYCLES_DIR)
+
+    cycle_stats = {}
+    for cycle in CYCLE_TABLE.index:
+        prepared = read_cycle_meta(prepared_dir, cycle)
+        if prepared is None or prepared['n_rows'] == 0:
+            continue
+        fingerprint = f"{prepared['fingerprint']}:v{STATS_VERSION}"
+
+        cached = read_cached_cycle(CACHE_DIR, cycle, fingerprint)
+        if cached is not None:
+            print(f"Cycle {cycle}: using cached statistics")
+            cycle_stats[cycle] = cached[0]
+            continue
+
+        cycle_df, _ = read_cached_cycle(prepared_dir, cycle, prepared['fingerprint'],
+                                        usecols=STAT_COLUMNS)
+        print(f"Cycle {cycle}: computing statistics from {len(cycle_df):,} rows")
+        psu_stats = compute_cycle_stats(cycle_df)
+        write_cached_cycle(CACHE_DIR, cycle, psu_stats, fingerprint)
+        cycle_stats[cycle] = psu_stats
+
+    return cycle_stats
+
+def ratio_estimate(numerator, denominator, psu_stratum):
+    """Ratio of weighted totals with its linearized standard error."""
+    total = denominator.sum()
+    if total <= 0:
+        return np.nan, np.nan
+    ratio = numerator.sum() / total
+    z = (numerator - ratio * denominator) / total
+    return ratio, np.sqrt(stratified_psu_variance(z, psu_stratum))
+
+def estimate_by_cycle(cycle_stats):
+    """Estimate IDWA prevalence and mean log-ferritin for each cycle."""
+
+    rows = []
+    for cycle, psu_stats in cycle_stats.items():
+        psu_stratum = pd.factorize(psu_stats['SDMVSTRA'])[0]
+        prev, prev_se = ratio_estimate(psu_stats['w_idwa'].values, psu_stats['w'].values, psu_stratum)
+        mean_lf, mean_lf_se = ratio_estimate(psu_stats['w_logfer'].values, psu_stats['w_fer'].values,
+                                             psu_stratum)
+        start_year = int(CYCLE_TABLE.loc[cycle, 'cycle_year'][:4])
+        rows.append({
+            'cycle': cycle,
+            'cycle_year': CYCLE_TABLE.loc[cycle, 'cycle_year'],
+            'midpoint_year': start_year + CYCLE_TABLE.loc[cycle, 'n_years'] / 2,
+            'n': int(psu_stats['n'].sum()),
+            'n_idwa': int(psu_stats['n_idwa'].sum()),
+            'n_psu': len(psu_stats),
+            'n_strata': psu_stratum.max() + 1,
+            'idwa_prevalence': prev,
+            'idwa_se': prev_se,
+            'mean_log_ferritin': mean_lf,
+            'mean_log_ferritin_se': mean_lf_se,
+            'geometric_mean_ferritin': np.exp(mean_lf),
+        })
+
+    return pd.DataFrame(rows)
+
+def linear_trend_test(by_cycle, estimate_col, se_col):
+    """Survey-weighted Wald test for a linear trend across cycles.
+
+    Cycles are independent samples, so the orthogonal linear contrast over
+    midpoint years has variance sum(c^2 * SE^2). The contrast is scaled so
+    the estimate is the change per year.
+    """
+    valid = by_cycle[estimate_col].notna() & by_cycle[se_col].notna()
+    data = by_cycle[valid]
+    if len(data) < 3:
+        return None
+
+    years = data['midpoint_year'].values
+    centered = years - years.mean()
+    contrast = centered / (centered ** 2).sum()
+
+    slope = np.dot(contrast, data[estimate_col].values)
+    se = np.sqrt(np.dot(contrast ** 2, data[se_col].values ** 2))
+    df_design = int((data['n_psu'] - data['n_strata']).sum())
+    t_stat = slope / se
+    p_value = 2 * stats.t.sf(abs(t_stat), df_design)
+    t_crit = stats.t.ppf(0.975, df_design)
+
+    return {
+        'outcome': estimate_col,
+        'n_cycles': len(data),
+        'first_cycle': data['cycle'].iloc[0],
+        'last_cycle': data['cycle'].iloc[-1],
+        'slope_per_year': slope,
+        'se': se,
+        'ci_low': slope - t_crit * se,
+        'ci_high': slope + t_crit * se,
+        't_stat': t_stat,
+        'df': df_design,
+        'p_trend': p_value,
+    }
+
+def generate_trend_table_latex(by_cycle, trend_tests):
+    """Generate LaTeX table of per-cycle estimates and trend tests."""
+
+    latex = []
+    latex.append("\\begin{table}[htbp]")
+    latex.append("\\centering")
+    latex.append("\\caption{IDWA Prevalence and Ferritin by NHANES Cycle}")
+    latex.append("\\label{tab:trend_by_cycle}")
+    latex.append("\\begin{tabular}{lcccc}")
+    latex.append("\\toprule")
+    latex.append("\\textbf{Cycle} & \\textbf{n} & \\textbf{IDWA, \\% (SE)} & \\textbf{Geometric Mean Ferritin} & \\textbf{Log-Ferritin (SE)} \\\\")
+    latex.append("\\midrule")
+
+    for _, row in by_cycle.iterrows():
+        prev = f"{row['idwa_prevalence']*100:.1f} ({row['idwa_se']*100:.1f})"
+        gm = f"{row['geometric_mean_ferritin']:.1f}"
+        lf = f"{row['mean_log_ferritin']:.3f} ({row['mean_log_ferritin_se']:.3f})"
+        latex.append(f"{row['cycle_year']} & {row['n']:,} & {prev} & {gm} & {lf} \\\\")
+
+    latex.append("\\midrule")
+    labels = {'idwa_prevalence': 'IDWA prevalence', 'mean_log_ferritin': 'Log-ferritin'}
+    for _, test in trend_tests.iterrows():
+        p = f"{test['p_trend']:.3f}" if test['p_trend'] >= 0.001 else "<0.001"
+        latex.append(f"\\multicolumn{{5}}{{l}}{{{labels[test['outcome']]} trend: "
+                     f"{test['slope_per_year']:.4f} per year "
+                     f"[{test['ci_low']:.4f}, {test['ci_high']:.4f}]; p={p}}} \\\\")
+
+    latex.append("\\bottomrule")
+    latex.append("\\end{tabular}")
+    latex.append("\\begin{flushleft}")
+    latex.append("\\footnotesize{\\textit{Note:} Cycle-specific estimates use 2-year MEC weights. ")
+    latex.append("Trend tests use the orthogonal linear contrast over cycle midpoint years with ")
+    latex.append("Taylor-linearized standard errors.}")
+    latex.append("\\end{flushleft}")
+    latex.append("\\end{table}")
+
+    return "\n".join(latex)
+
+def main():
+    print("=" * 70)
+    print("NHANES Iron Deficiency Without Anemia - Trend Analysis")
+    print("=" * 70)
+    print()
+
+    phase('cycle statistics')
+    # Per-cycle sufficient statistics (cached)
+    print("=" * 70)
+    print("Loading per-cycle sufficient statistics...")
+    print("=" * 70)
+    cycle_stats = load_cycle_stats()
+    if not cycle_stats:
+        print(f"Error: No prepared cycles found in {os.path.join(OUTPUT_DIR, PREPARED_CYCLES_DIR)}")
+        print("Please run 01_data_prep.py first.")
+        sys.exit(1)
+
+    # Per-cycle estimates
+    print("\n" + "=" * 70)
+    print("Estimating IDWA prevalence and log-ferritin by cycle...")
+    print("=" * 70)
+    by_cycle = estimate_by_cycle(cycle_stats)
+    print(by_cycle[['cycle_year', 'n', 'idwa_prevalence', 'idwa_se',
+                    'mean_log_ferritin', 'mean_log_ferritin_se']].to_string(index=False))
+
+    phase('trend tests')
+    # Trend tests
+    print("\n" + "=" * 70)
+    print("Testing for linear trends across cycles...")
+    print("=" * 70)
+    tests = [linear_trend_test(by_cycle, 'idwa_prevalence', 'idwa_se'),
+             linear_trend_test(by_cycle, 'mean_log_ferritin', 'mean_log_ferritin_se')]
+    trend_tests = pd.DataFrame([t for t in tests if t is not None])
+    for _, test in trend_tests.iterrows():
+        print(f"  {test['outcome']}: {test['slope_per_year']:.5f} per year "
+              f"(95% CI {test['ci_low']:.5f} to {test['ci_high']:.5f}), p-trend = {test['p_trend']:.4f}")
+
+    phase('write')
+    # Save outputs
+    print("\n" + "=" * 70)
+    print("Saving trend tables...")
+    print("=" * 70)
+
+    by_cycle_csv = os.path.join(TABLES_DIR, 'trend_by_cycle.csv')
+    by_cycle.to_csv(by_cycle_csv, index=False)
+    print(f"Saved per-cycle estimates to: {by_cycle_csv}")
+
+    tests_csv = os.path.join(TABLES_DIR, 'trend_tests.csv')
+    trend_tests.to_csv(tests_csv, index=False)
+    print(f"Saved trend tests to: {tests_csv}")
+
+    if len(trend_tests) > 0:
+        trend_latex = generate_trend_table_latex(by_cycle, trend_tests)
+        trend_file = os.path.join(TABLES_DIR, 'tableS1_trend_by_cycle.tex')
+        with open(trend_file, 'w') as f:
+            f.write(trend_latex)
+        print(f"Saved trend table to: {trend_file}")
+
+    print("\n" + "=" * 70)
+    print("Trend analysis complete!")
+    print("=" * 70)
+
+if __name__ == "__main__":
+    with StageProfiler('06_trend_analysis', OUTPUT_DIR):
+        main()
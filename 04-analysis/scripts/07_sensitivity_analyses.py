@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+NHANES Iron Deficiency Without Anemia Study - Sensitivity Analysis Script
+=========================================================================
+
+This script:
+1. Loads the analytic dataset once
+2. Runs sensitivity analyses SA1-SA5 as masks/overrides over that frame
+   in a process pool (see sensitivity_analysis.py)
+3. Outputs Table 6 in LaTeX and CSV format
+4. Re-fits the Table 3 models after multiple imputation of poverty ratio
+   and BMI (see multiple_imputation.py), pooled with Rubin's rules
+
+Author: NHANES Analysis Pipeline
+Date: 2026-10-19
+"""
+
+import pandas as pd
+import numpy as np
+import os
+import sys
+
+from multiple_imputation import run_multiple_imputation, N_IMPUTATIONS
+from profiling import StageProfiler, phase
+from regression_models import prepare_data_for_regression
+from schema import read_processed_data
+from sensitivity_analysis import build_sensitivity_specs, run_sensitivity_suite
+
+# Set random seed for reproducibility
+np.random.seed(42)
+
+OUTPUT_DIR = "studies/iron-deficiency-women-2026-01-31/04-analysis"
+TABLES_DIR = os.path.join(OUTPUT_DIR, "outputs", "tables")
+
+def format_estimate(estimate, ci_low, ci_high, digits=3):
+    """Format estimate [95% CI]."""
+    if pd.isna(estimate):
+        return "---"
+    return f"{estimate:.{digits}f} [{ci_low:.{digits}f}, {ci_high:.{digits}f}]"
+
+def generate_table6_latex(results):
+    """Generate Table 6 (sensitivity analyses) in LaTeX format."""
+    
+    lines = [
+        r"\begin{table}[htbp]",
+        r"\centering",
+        r"\caption{Sensitivity Analyses}",
+        r"\label{tab:sensitivity}",
+        r"\begin{tabular}{lcccc}",
+        r"\toprule",
+        r"\textbf{Analysis} & \textbf{N} & \textbf{IDWA, \% (SE)} & \textbf{Log-Ferritin $\beta$ [95\% CI]} & \textbf{IDWA OR [95\% CI]} \\",
+        r"\midrule",
+    ]
+    
+    for _, row in results.iterrows():
+        if row['status'] != 'ok':
+            lines.append(f"{row['analysis']}: {row['label']} & \\multicolumn{{4}}{{c}}{{Not available}} \\\\")
+            continue
+        prev = f"{row['idwa_prevalence']*100:.1f} ({row['idwa_se']*100:.1f})"
+        beta = format_estimate(row.get('ferritin_coef'), row.get('ferritin_ci_low'), row.get('ferritin_ci_high'))
+        odds = format_estimate(row.get('idwa_or'), row.get('idwa_or_ci_low'), row.get('idwa_or_ci_high'), 2)
+        lines.append(f"{row['analysis'].replace('_', ' ')}: {row['label']} & {int(row['n']):,} & {prev} & {beta} & {odds} \\\\")
+    
+    lines.extend([
+        r"\bottomrule",
+        r"\end{tabular}",
+        r"\begin{flushleft}",
+        r"\footnotesize{\textit{Note:} $\beta$: iron supplement use coefficient on log ferritin, adjusted for age, race/ethnicity, poverty ratio and BMI. ",
+        r"OR: odds of IDWA for supplement users, additionally adjusted for survey cycle, with design-based standard errors. ",
+        r"SA5 rows are cycle-specific estimates.}",
+        r"\end{flushleft}",
+        r"\end{table}",
+    ])
+    
+    return "\n".join(lines)
+
+def main():
+    print("=" * 70)
+    print("NHANES Iron Deficiency Without Anemia - Sensitivity Analyses")
+    print("=" * 70)
+    print()
+    
+    phase('load')
+    # Load processed data
+    data_file = os.path.join(OUTPUT_DIR, 'processed_data.csv')
+    if not os.path.exists(data_file):
+        print(f"Error: Processed data not found at {data_file}")
+        print("Please run 01_data_prep.py first.")
+        sys.exit(1)
+    
+    df = read_processed_data(data_file)
+    print(f"Loaded processed data: {len(df)} rows")
+    print()
+    
+    phase('sensitivity suite')
+    df = prepare_data_for_regression(df)
+    specs = build_sensitivity_specs(df)
+    
+    print("=" * 70)
+    print(f"Running {len(specs)} sensitivity analyses...")
+    print("=" * 70)
+    results = run_sensitivity_suite(df, specs)
+    
+    display_cols = [c for c in ['analysis', 'n', 'idwa_prevalence', 'ferritin_coef', 'idwa_or', 'status']
+                    if c in results.columns]
+    print(results[display_cols].to_string(index=False))
+    
+    phase('write')
+    # Save outputs
+    print("\n" + "=" * 70)
+    print("Saving Table 6...")
+    print("=" * 70)
+    
+    table6_latex = generate_table6_latex(results)
+    table6_file = os.path.join(TABLES_DIR, 'table6_sensitivity_analyses.tex')
+    with open(table6_file, 'w') as f:
+        f.write(table6_latex)
+    print(f"Saved Table 6 to: {table6_file}")
+    
+    table6_csv = os.path.join(TABLES_DIR, 'table6_sensitivity_analyses.csv')
+    results.to_csv(table6_csv, index=False)
+    print(f"Saved Table 6 CSV to: {table6_csv}")
+    
+    phase('multiple imputation')
+    # Missing data: multiple imputation of INDFMPIR and BMXBMI
+    print("\n" + "=" * 70)
+    print(f"Multiple imputation of poverty ratio and BMI (M = {N_IMPUTATIONS})...")
+    print("=" * 70)
+    mi_results, _ = run_multiple_imputation(df)
+    if mi_results.empty:
+        print("  No model could be fitted on the imputed data")
+    else:
+        print(mi_results[['model', 'n', 'n_complete_case', 'coef', 'ci_low', 'ci_high',
+                          'coef_complete_case', 'fmi']].to_string(index=False))
+        
+        mi_csv = os.path.join(TABLES_DIR, 'mi_regression_results.csv')
+        mi_results.to_csv(mi_csv, index=False)
+        print(f"Saved multiple imputation results CSV to: {mi_csv}")
+    
+    print("\n" + "=" * 70)
+    print("Sensitivity analyses complete!")
+    print("=" * 70)
+
+if __name__ == "__main__":
+    with StageProfiler('07_sensitivity_analyses', OUTPUT_DIR):
+        main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+NHANES Iron Deficiency Without Anemia Study - Run Comparison
+============================================================
+
+This module:
+1. Reads the result CSVs written by 02_descriptive_stats.py and
+   03_regression_analysis.py (Tables 1-4, regression coefficients,
+   prevalences, threshold sweep) from two runs' table directories
+2. Lines the two runs up value by value in one vectorized merge, keyed
+   by table, row key and column
+3. Reports estimates that changed beyond an absolute plus relative
+   tolerance (configurable, with per-column overrides), and rows or
+   tables present in only one run
+4. Exits with status 1 on any difference, so it can gate the pipeline
+
+Usage:
+    python compare_runs.py BASELINE_TABLES_DIR [CURRENT_TABLES_DIR]
+        [--atol A] [--rtol R] [--tolerance 'pvalue*=1e-6' ...] [--report diff.csv]
+
+Author: NHANES Analysis Pipeline
+Date: 2026-10-19
+"""
+
+import argparse
+import fnmatch
+import os
+import sys
+import time
+
+import pandas as pd
+import numpy as np
+
+OUTPUT_DIR = "studies/iron-deficiency-women-2026-01-31/04-analysis"
+TABLES_DIR = os.path.join(OUTPUT_DIR, "outputs", "tables")
+
+# Result CSVs compared, with the columns identifying a row (none for
+# single-row tables)
+RESULT_TABLES = {
+    'table1_characteristics.csv': [],
+    'table2_idwa_by_demographics.csv': ['group', 'subgroup'],
+    'regression_results.csv': ['model'],
+    'dose_response_results.csv': [],
+    'dose_contrasts.csv': ['contrast'],
+    'idwa_logistic_results.csv': ['model', 'term'],
+    'interaction_results.csv': ['modifier', 'stratum'],
+    'table5_secondary_biomarkers.csv': ['outcome'],
+    'threshold_sensitivity.csv': ['group', 'subgroup', 'ferritin_cutoff', 'hemoglobin_cutoff'],
+    'threshold_sweep.csv': ['group', 'subgroup', 'ferritin_cutoff', 'hemoglobin_cutoff'],
+}
+
+# A value has drifted when |current - baseline| > atol + rtol * |baseline|.
+# The pipeline is seeded, so the defaults only absorb floating-point noise.
+DEFAULT_ATOL = 1e-10
+DEFAULT_RTOL = 1e-8
+
+
+def long_table(path, keys):
+    """One row per (row key, column) with the value as written.
+
+    Values are kept as text; read_run parses them to numbers in one pass.
+    """
+    df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    row = np.array([' | '.join(values) for values in zip(*(df[key] for key in keys))] if keys
+                   else [''] * len(df), dtype=object)
+    columns = [column for column in df.columns if column not in keys]
+    return pd.DataFrame({
+        'row': np.tile(row, len(columns)),
+        'column': np.repeat(columns, len(df)),
+        'text': df[columns].to_numpy(dtype=object).ravel(order='F'),
+    })
+
+
+def read_run(tables_dir, tables=None):
+    """Long table of every result CSV present in a run's table directory."""
+    if tables is None:
+        tables = RESULT_TABLES
+    parts = [long_table(os.path.join(tables_dir, name), keys).assign(table=name)
+             for name, keys in tables.items() if os.path.exists(os.path.join(tables_dir, name))]
+    if not parts:
+        return pd.DataFrame(columns=['row', 'column', 'text', 'table', 'number'])
+    run = pd.concat(parts, ignore_index=True)
+    run['number'] = pd.to_numeric(run['text'], errors='coerce').astype(float)
+    return run
+
+
+def tolerances(columns, atol=DEFAULT_ATOL, rtol=DEFAULT_RTOL, overrides=None):
+    """Absolute and relative tolerance per column; overrides map a glob pattern to an atol."""
+    overrides = overrides or {}
+    atols, rtols = {}, {}
+    for column in columns:
+        atols[column], rtols[column] = atol, rtol
+        for pattern, column_atol in overrides.items():
+            if fnmatch.fnmatch(column, pattern):
+                atols[column] = column_atol
+    return atols, rtols
+
+
+def compare_runs(baseline_dir, current_dir, atol=DEFAULT_ATOL, rtol=DEFAULT_RTOL,
+                 overrides=None, tables=None):
+    """Values that differ between two runs.
+
+    Returns (differences, n_compared). differences has one row per table,
+    row and column with status 'changed', 'added' (current run only) or
+    'removed' (baseline only); whole tables missing from one run are
+    reported with an empty row and column.
+    """
+    baseline = read_run(baseline_dir, tables)
+    current = read_run(current_dir, tables)
+    merged = baseline.merge(current, on=['table', 'row', 'column'], how='outer',
+                            suffixes=('_baseline', '_current'), indicator=True)
+
+    atols, rtols = tolerances(merged['column'].unique(), atol, rtol, overrides)
+    a, b = merged['number_baseline'].to_numpy(), merged['number_current'].to_numpy()
+    abs_diff = np.abs(b - a)
+    limit = merged['column'].map(atols).to_numpy() + merged['column'].map(rtols).to_numpy() * np.abs(a)
+    numeric = ~np.isnan(a) & ~np.isnan(b)
+    text_changed = ((merged['text_baseline'] != merged['text_current'])
+                    & ~(merged['text_baseline'].isna() | merged['text_current'].isna())).to_numpy()
+    changed = np.where(numeric, abs_diff > limit, text_changed)
+
+    merged['status'] = np.select([merged['_merge'] == 'left_only', merged['_merge'] == 'right_only', changed],
+                                 ['removed', 'added', 'changed'], default='')
+    merged['abs_diff'] = np.where(numeric, abs_diff, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        merged['rel_diff'] = np.where(numeric, abs_diff / np.abs(a), np.nan)
+
+    differences = merged[merged['status'] != ''].rename(
+        columns={'text_baseline': 'baseline', 'text_current': 'current'})
+    differences = differences[['table', 'row', 'column', 'status', 'baseline', 'current',
+                               'abs_diff', 'rel_diff']]
+
+    # Tables present in only one run
+    baseline_tables, current_tables = set(baseline['table']), set(current['table'])
+    missing = [{'table': name, 'row': '', 'column': '',
+                'status': 'removed' if name in baseline_tables else 'added'}
+               for name in sorted(baseline_tables ^ current_tables)]
+    differences = differences[~differences['table'].isin(baseline_tables ^ current_tables)]
+    if missing:
+        differences = pd.concat([pd.DataFrame(missing), differences], ignore_index=True)
+
+    n_compared = int((merged['_merge'] == 'both').sum())
+    return differences.reset_index(drop=True), n_compared
+
+
+def parse_overrides(items):
+    """'PATTERN=ATOL' strings to {pattern: atol}."""
+    overrides = {}
+    for item in items or []:
+        pattern, _, value = item.partition('=')
+        overrides[pattern] = float(value)
+    return overrides
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two runs' result tables")
+    parser.add_argument('baseline', help='table directory of the baseline run')
+    parser.add_argument('current', nargs='?', default=TABLES_DIR,
+                        help='table directory of the run to check (default: current outputs)')
+    parser.add_argument('--atol', type=float, default=DEFAULT_ATOL, help='absolute tolerance')
+    parser.add_argument('--rtol', type=float, default=DEFAULT_RTOL, help='relative tolerance')
+    parser.add_argument('--tolerance', action='append', metavar='PATTERN=ATOL',
+                        help="absolute tolerance for matching columns, e.g. 'pvalue*=1e-6'")
+    parser.add_argument('--report', help='write the differences to this CSV')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    differences, n_compared = compare_runs(args.baseline, args.current, args.atol, args.rtol,
+                                           parse_overrides(args.tolerance))
+    elapsed = time.perf_counter() - start
+
+    print(f"Compared {n_compared:,} values in {elapsed * 1000:.0f} ms: "
+          f"{len(differences)} difference(s) (atol={args.atol:g}, rtol={args.rtol:g})")
+    if len(differences):
+        with pd.option_context('display.max_rows', 50, 'display.width', 200, 'display.max_colwidth', 40):
+            print(differences.to_string(index=False, max_rows=50))
+    if args.report:
+        differences.to_csv(args.report, index=False)
+        print(f"Saved differences to: {args.report}")
+    return 1 if len(differences) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
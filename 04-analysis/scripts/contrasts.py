@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+NHANES Iron Deficiency Without Anemia Study - Linear Contrast Engine
+====================================================================
+
+This module:
+1. Builds contrast matrices from {term: weight} specifications
+2. Evaluates any number of linear contrasts L @ beta with standard errors,
+   confidence intervals and Wald tests in one vectorized call
+3. Runs joint Wald (F) tests of several contrasts
+4. Builds curve contrasts for spline terms, B(x) - B(reference), so a
+   whole dose-response curve is one contrast matrix
+
+Everything works from a fitted coefficient vector and its covariance
+matrix; no model is refitted.
+
+Author: NHANES Analysis Pipeline
+Date: 2026-10-19
+"""
+
+import pandas as pd
+import numpy as np
+from scipy import stats
+from statsmodels.stats.multitest import multipletests
+
+
+def contrast_matrix(terms, specs):
+    """Build a contrast matrix over `terms` from a list of {term: weight} dicts."""
+    terms = list(terms)
+    L = np.zeros((len(specs), len(terms)))
+    for i, spec in enumerate(specs):
+        for term, weight in spec.items():
+            L[i, terms.index(term)] = weight
+    return L
+
+
+def curve_contrasts(terms, basis_terms, basis, reference):
+    """Contrast rows B(x) - B(reference) for spline basis columns.
+
+    basis has one row per grid point and one column per entry of
+    basis_terms; reference is the basis row at the reference value.
+    """
+    terms = list(terms)
+    L = np.zeros((len(basis), len(terms)))
+    columns = [terms.index(term) for term in basis_terms]
+    L[:, columns] = np.asarray(basis) - np.asarray(reference)[None, :]
+    return L
+
+
+def evaluate_contrasts(params, cov, L, names=None, df=None, alpha=0.05, adjust=None):
+    """Estimate every row of L @ params with SE, CI and Wald test.
+
+    df gives t-based inference (None: normal). adjust is a statsmodels
+    multipletests method (e.g. 'bonferroni') applied across the rows.
+    """
+    params = np.asarray(params, dtype=float)
+    cov = np.asarray(cov, dtype=float)
+    L = np.atleast_2d(np.asarray(L, dtype=float))
+
+    estimate = L @ params
+    se = np.sqrt(np.einsum('ij,jk,ik->i', L, cov, L))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        statistic = estimate / se
+
+    if df is None:
+        crit = stats.norm.ppf(1 - alpha / 2)
+        pvalues = 2 * stats.norm.sf(np.abs(statistic))
+    else:
+        crit = stats.t.ppf(1 - alpha / 2, df)
+        pvalues = 2 * stats.t.sf(np.abs(statistic), df)
+
+    result = pd.DataFrame({
+        'contrast': names if names is not None else np.arange(len(L)),
+        'estimate': estimate,
+        'se': se,
+        'ci_low': estimate - crit * se,
+        'ci_high': estimate + crit * se,
+        'statistic': statistic,
+        'pvalue': pvalues,
+    })
+    if adjust is not None:
+        result[f'pvalue_{adjust}'] = multipletests(pvalues, alpha=alpha, method=adjust)[1]
+    return result
+
+
+def wald_test(params, cov, L, df=None):
+    """Joint Wald test that every row of L @ params is zero.
+
+    Returns (statistic, q, pvalue): an F statistic with (q, df) degrees of
+    freedom when df is given, otherwise a chi-square with q df.
+    """
+    params = np.asarray(params, dtype=float)
+    L = np.atleast_2d(np.asarray(L, dtype=float))
+    estimate = L @ params
+    V = L @ np.asarray(cov, dtype=float) @ L.T
+
+    q = np.linalg.matrix_rank(V)
+    chi2 = estimate @ np.linalg.pinv(V) @ estimate
+    if df is None:
+        return chi2, q, stats.chi2.sf(chi2, q)
+    return chi2 / q, q, stats.f.sf(chi2 / q, q, df)
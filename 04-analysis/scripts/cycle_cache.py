@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+NHANES Iron Deficiency Without Anemia Study - Per-Cycle Cache
+=============================================================
+
+This module:
+1. Fingerprints a cycle's raw input files by name, size and modification
+   time (plus the code and settings that process them), without reading
+   the files
+2. Stores one frame per NHANES cycle under a cache directory, with a
+   JSON sidecar holding the fingerprint and any metadata
+3. Returns a cached cycle only while its fingerprint still matches
+
+01_data_prep.py keeps each cycle's prepared rows here, keyed by that
+cycle's raw files, so a new release only processes its own files.
+06_trend_analysis.py keys its per-cycle sufficient statistics on the
+same fingerprints and reads only the prepared rows of changed cycles.
+
+Author: NHANES Analysis Pipeline
+Date: 2026-10-19
+"""
+
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+# Prepared rows of each cycle, relative to the analysis output directory
+PREPARED_CYCLES_DIR = os.path.join('cache', 'prepared_cycles')
+
+
+def source_hash(*paths):
+    """SHA-256 of the contents of source files (e.g. the preparation code)."""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def input_fingerprint(paths, extra=()):
+    """Fingerprint of input files (name, size, mtime) and extra settings."""
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        info = os.stat(path)
+        digest.update(f"{os.path.basename(path)}:{info.st_size}:{info.st_mtime_ns}\n".encode())
+    for item in extra:
+        digest.update(f"{item}\n".encode())
+    return digest.hexdigest()
+
+
+def _paths(cache_dir, cycle):
+    return os.path.join(cache_dir, f"{cycle}.csv"), os.path.join(cache_dir, f"{cycle}.json")
+
+
+def read_cycle_meta(cache_dir, cycle):
+    """Metadata of a cached cycle; None if the cycle is not cached."""
+    _, meta_file = _paths(cache_dir, cycle)
+    if not os.path.exists(meta_file):
+        return None
+    with open(meta_file) as f:
+        return json.load(f)
+
+
+def read_cached_cycle(cache_dir, cycle, fingerprint, **read_kwargs):
+    """(frame, metadata) of a cached cycle if its fingerprint matches, else None.
+
+    Cycles cached without rows return a None frame. Floats are parsed
+    exactly and only empty fields are read as missing, so values and
+    labels such as 'None' survive the round trip.
+    """
+    meta = read_cycle_meta(cache_dir, cycle)
+    if meta is None or meta.get('fingerprint') != fingerprint:
+        return None
+    if meta['n_rows'] == 0:
+        return None, meta
+    data_file, _ = _paths(cache_dir, cycle)
+    if not os.path.exists(data_file):
+        return None
+    return pd.read_csv(data_file, keep_default_na=False, na_values=[''], float_precision='round_trip',
+                       **read_kwargs), meta
+
+
+def write_cached_cycle(cache_dir, cycle, df, fingerprint, meta=None):
+    """Cache a cycle's frame (None for a cycle without rows) with its fingerprint."""
+    os.makedirs(cache_dir, exist_ok=True)
+    data_file, meta_file = _paths(cache_dir, cycle)
+    if df is None:
+        if os.path.exists(data_file):
+            os.remove(data_file)
+    else:
+        df.to_csv(data_file, index=False)
+    meta = dict(meta or {}, cycle=cycle, fingerprint=fingerprint,
+                n_rows=0 if df is None else len(df))
+    with open(meta_file, 'w') as f:
+        json.dump(meta, f, indent=2)
+    return meta
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+NHANES Iron Deficiency Without Anemia Study - Weighted Density Kernels
+======================================================================
+
+This module:
+1. Linearly bins weighted observations onto an equally spaced grid in a
+   single pass (np.bincount), so later steps cost O(grid), not O(n)
+2. Computes a weighted Gaussian KDE by FFT convolution of the binned
+   weights with the kernel, with Scott's rule bandwidth on the effective
+   sample size
+3. Computes a weighted ECDF and weighted histogram on a fixed grid
+4. Computes weighted quartiles and 1.5 IQR whiskers for box plots
+
+All kernels take survey weights; observations with missing values or
+non-positive weights are dropped.
+
+Author: NHANES Analysis Pipeline
+Date: 2026-10-19
+"""
+
+import numpy as np
+from scipy import signal
+from scipy import stats
+
+from survey_design import weighted_point_quantiles
+
+# Kernel support in bandwidths; the Gaussian is negligible beyond this
+KERNEL_TRUNCATE = 4.0
+
+
+def _valid(x, w):
+    """Drop missing values and non-positive weights."""
+    x = np.asarray(x, dtype=float)
+    w = np.asarray(w, dtype=float)
+    keep = ~np.isnan(x) & ~np.isnan(w) & (w > 0)
+    return x[keep], w[keep]
+
+
+def scott_bandwidth(x, w):
+    """Scott's rule bandwidth using the weighted SD and Kish effective n."""
+    x, w = _valid(x, w)
+    n_eff = w.sum() ** 2 / np.dot(w, w)
+    mean = np.dot(w, x) / w.sum()
+    sd = np.sqrt(np.dot(w, (x - mean) ** 2) / w.sum() * n_eff / (n_eff - 1))
+    return sd * n_eff ** (-1 / 5)
+
+
+def linear_bin(x, w, lo, hi, n_points):
+    """Spread each weight over its two neighbouring grid points.
+
+    Returns the binned weights on np.linspace(lo, hi, n_points). Values
+    outside [lo, hi] are assigned to the nearest end point.
+    """
+    x, w = _valid(x, w)
+    delta = (hi - lo) / (n_points - 1)
+    position = np.clip((x - lo) / delta, 0, n_points - 1)
+    left = np.minimum(np.floor(position).astype(int), n_points - 2)
+    frac = position - left
+    return (np.bincount(left, weights=w * (1 - frac), minlength=n_points)
+            + np.bincount(left + 1, weights=w * frac, minlength=n_points))
+
+
+def weighted_kde(x, w, n_points=256, cut=2, bw=None, lower=None):
+    """Weighted Gaussian KDE evaluated on a grid by binned FFT convolution.
+
+    The grid spans the data range extended by cut bandwidths on each side
+    (truncated at lower, if given). Returns (grid, density), with density
+    integrating to one over the real line.
+    """
+    x, w = _valid(x, w)
+    if bw is None:
+        bw = scott_bandwidth(x, w)
+    lo, hi = x.min() - cut * bw, x.max() + cut * bw
+    if lower is not None:
+        lo = max(lo, lower)
+
+    grid = np.linspace(lo, hi, n_points)
+    delta = grid[1] - grid[0]
+    counts = linear_bin(x, w, lo, hi, n_points)
+
+    half = min(n_points - 1, int(np.ceil(KERNEL_TRUNCATE * bw / delta)))
+    kernel = stats.norm.pdf(np.arange(-half, half + 1) * delta / bw) / bw
+    density = signal.fftconvolve(counts, kernel, mode='same') / w.sum()
+    return grid, np.maximum(density, 0)
+
+
+def weighted_ecdf(x, w, lo, hi, n_points=512):
+    """Weighted share (%) of observations at or below each grid point.
+
+    Each value is assigned to the first grid point at or above it in one
+    pass, so the ECDF is exact at the grid points.
+    """
+    x, w = _valid(x, w)
+    grid = np.linspace(lo, hi, n_points)
+    delta = grid[1] - grid[0]
+    index = np.ceil((x - lo) / delta - 1e-9).astype(int)
+    above = index >= n_points
+    counts = np.bincount(np.clip(index[~above], 0, None), weights=w[~above], minlength=n_points)
+    return grid, 100 * np.cumsum(counts) / w.sum()
+
+
+def weighted_histogram(x, w, bins):
+    """Weighted share (%) of observations in each bin."""
+    x, w = _valid(x, w)
+    totals, _ = np.histogram(x, bins=bins, weights=w)
+    return 100 * totals / w.sum()
+
+
+def weighted_percentiles(x, w, percentiles):
+    """Weighted percentiles by the quantile rule of survey_design (as in Table 1)."""
+    return weighted_point_quantiles(x, w, np.asarray(percentiles, dtype=float) / 100)
+
+
+def weighted_box_stats(x, w):
+    """Weighted quartiles and 1.5 IQR whiskers, keyed as matplotlib's Axes.bxp expects."""
+    x, w = _valid(x, w)
+    q1, med, q3 = weighted_percentiles(x, w, [25, 50, 75])
+    iqr = q3 - q1
+    inside = x[(x >= q1 - 1.5 * iqr) & (x <= q3 + 1.5 * iqr)]
+    return {'q1': q1, 'med': med, 'q3': q3,
+            'whislo': inside.min(), 'whishi': inside.max()}
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+NHANES Iron Deficiency Without Anemia Study - Figure Rendering Service
+======================================================================
+
+This module:
+1. Pins the non-interactive Agg backend before pyplot is imported, so
+   figures render headless in any worker process
+2. Renders every figure in its own worker process from its precomputed
+   plot-data artifact; renderers never see the microdata
+3. Saves each figure once per requested format (PNG, PDF and SVG by
+   default; vector-only for diagrams) and reports per-file timings
+4. Skips figures whose plot-data hash and style hash match the figure
+   manifest, and writes the manifest (hashes and output checksums) that
+   the manuscript build checks
+
+A renderer is a function that takes its plot data and returns a
+matplotlib Figure; the service owns saving and closing it. Run as a
+script with a manifest path to check that every listed file exists and
+is unchanged (exit status 1 otherwise).
+
+Author: NHANES Analysis Pipeline
+Date: 2026-10-19
+"""
+
+import hashlib
+import inspect
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import pandas as pd
+
+from plot_data import read_plot_data
+
+FIGURE_FORMATS = ['png', 'pdf', 'svg']
+VECTOR_FORMATS = ['pdf', 'svg']
+FIGURE_DPI = 300
+MANIFEST_FILE = 'figure_manifest.json'
+
+
+def file_hash(path):
+    """SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def style_hash(renderer):
+    """Hash of everything besides the plot data that shapes a figure.
+
+    Covers the renderer's source, the module-level constants it refers to
+    (colors, orderings, labels), the active rcParams, the DPI and the
+    matplotlib version.
+    """
+    parts = [inspect.getsource(renderer), matplotlib.__version__, str(FIGURE_DPI),
+             repr(sorted((key, repr(value)) for key, value in matplotlib.rcParams.items()))]
+    for name in sorted(set(renderer.__code__.co_names)):
+        value = renderer.__globals__.get(name)
+        if isinstance(value, (str, int, float, list, tuple, dict)):
+            parts.append(f"{name}={value!r}")
+    return hashlib.sha256('\n'.join(parts).encode()).hexdigest()
+
+
+def render_job(name, renderer, plot_data_path, output_stem, formats):
+    """Render one figure once, save it in every format and return timing records."""
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+
+    fig = renderer(read_plot_data(plot_data_path))
+    drawn = time.perf_counter()
+
+    records = []
+    for fmt in formats:
+        save_start = time.perf_counter()
+        output_file = f"{output_stem}.{fmt}"
+        fig.savefig(output_file, format=fmt, dpi=FIGURE_DPI, bbox_inches='tight', facecolor='white')
+        records.append({
+            'figure': name,
+            'format': fmt,
+            'file': output_file,
+            'status': 'rendered',
+            'build_seconds': drawn - start,
+            'save_seconds': time.perf_counter() - save_start,
+        })
+    plt.close(fig)
+
+    wall = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+    for record in records:
+        record.update({'wall_seconds': wall, 'cpu_seconds': cpu, 'pid': os.getpid()})
+    return records
+
+
+def load_manifest(path):
+    """Read a figure manifest; an empty one if it does not exist yet."""
+    if not os.path.exists(path):
+        return {'figures': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def check_manifest(path):
+    """List problems with a manifest: missing files or files changed since rendering."""
+    if not os.path.exists(path):
+        return [f"manifest not found: {path}"]
+    problems = []
+    for name, entry in load_manifest(path)['figures'].items():
+        for fmt, output in entry['files'].items():
+            if not os.path.exists(output['file']):
+                problems.append(f"{name} ({fmt}): missing {output['file']}")
+            elif file_hash(output['file']) != output['sha256']:
+                problems.append(f"{name} ({fmt}): {output['file']} changed since it was rendered")
+    return problems
+
+
+def render_figures(jobs, formats=None, max_workers=None, figure_formats=None,
+                   manifest_path=None, force=False):
+    """Render figures in parallel worker processes, skipping unchanged ones.
+
+    jobs is a list of (name, renderer, plot_data_path, output_stem).
+    Renderers must be module-level functions so they can be sent to the
+    workers. figure_formats optionally maps a figure name to its own
+    formats (e.g. vector-only diagrams). With a manifest, a figure whose
+    plot-data hash, style hash and formats match its manifest entry and
+    whose files are all present with their recorded checksums is not
+    re-rendered (unless force); the manifest is rewritten afterwards. Returns a DataFrame of per-file
+    timings in job order.
+    """
+    if formats is None:
+        formats = FIGURE_FORMATS
+    figure_formats = figure_formats or {}
+    manifest = load_manifest(manifest_path) if manifest_path else {'figures': {}}
+
+    entries, tasks = {}, []
+    for name, renderer, plot_data_path, stem in jobs:
+        job_formats = figure_formats.get(name, formats)
+        entry = {
+            'plot_data': plot_data_path,
+            'plot_data_hash': file_hash(plot_data_path),
+            'style_hash': style_hash(renderer),
+            'files': {fmt: {'file': f"{stem}.{fmt}"} for fmt in job_formats},
+        }
+        previous = manifest['figures'].get(name)
+        unchanged = (previous is not None
+                     and previous['plot_data_hash'] == entry['plot_data_hash']
+                     and previous['style_hash'] == entry['style_hash']
+                     and set(previous['files']) == set(job_formats)
+                     and all(os.path.exists(output['file']) and file_hash(output['file']) == output.get('sha256')
+                             for output in previous['files'].values()))
+        if unchanged and not force:
+            entries[name] = previous
+        else:
+            entries[name] = entry
+            tasks.append((name, renderer, plot_data_path, stem, job_formats))
+
+    results = {}
+    if tasks:
+        if max_workers is None:
+            max_workers = min(len(tasks), os.cpu_count() or 1)
+        if 'fork' in multiprocessing.get_all_start_methods():
+            executor = ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context('fork'))
+        else:
+            executor = ProcessPoolExecutor(max_workers)
+        with executor:
+            futures = {task[0]: executor.submit(render_job, *task) for task in tasks}
+            results = {name: future.result() for name, future in futures.items()}
+
+    timings = []
+    for name, _, _, _ in jobs:
+        if name in results:
+            for record in results[name]:
+                output = entries[name]['files'][record['format']]
+                output['sha256'] = file_hash(record['file'])
+                output['bytes'] = os.path.getsize(record['file'])
+                timings.append(record)
+        else:
+            timings.extend({'figure': name, 'format': fmt, 'file': output['file'],
+                            'status': 'unchanged'}
+                           for fmt, output in entries[name]['files'].items())
+
+    if manifest_path:
+        with open(manifest_path, 'w') as f:
+            json.dump({'figures': entries}, f, indent=2)
+
+    return pd.DataFrame(timings)
+
+
+if __name__ == "__main__":
+    problems = check_manifest(sys.argv[1])
+    for problem in problems:
+        print(problem)
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+NHANES Iron Deficiency Without Anemia Study - Effect Modification Analysis
+==========================================================================
+
+This module:
+1. Declares the pre-specified effect modifiers (race/ethnicity, poverty,
+   BMI category, age group) and their strata
+2. Fits the pooled model with supplement x stratum interaction terms and
+   a joint Wald F test (p-interaction)
+3. Sorts the complete cases by stratum once, so every stratum-specific
+   model is fitted on a contiguous slice of the same arrays
+4. Fits the stratum-specific models in parallel threads
+
+Models follow Model 3 (log ferritin on supplement use, age, race/ethnicity,
+poverty ratio and BMI); covariates that are constant within a stratum are
+dropped from that stratum's fit.
+
+Author: NHANES Analysis Pipeline
+Date: 2026-10-19
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import numpy as np
+from scipy import stats
+
+from regression_models import MODEL3_COVARIATES, wls_fit
+
+# Effect modifiers: categorical groupings or numeric bins (left-closed)
+EFFECT_MODIFIERS = {
+    'race': {
+        'label': 'Race/ethnicity',
+        'column': 'race_category',
+        'groups': {
+            'Non-Hispanic White': ['Non-Hispanic White'],
+            'Non-Hispanic Black': ['Non-Hispanic Black'],
+            'Hispanic': ['Mexican American', 'Other Hispanic'],
+            'Other': ['Other Race'],
+        },
+        # Race dummies are replaced by the stratum terms
+        'replaces': ['race_nhb', 'race_mex', 'race_oth_hisp', 'race_other'],
+    },
+    'poverty': {
+        'label': 'Poverty income ratio',
+        'column': 'INDFMPIR',
+        'bins': [0, 1.0, 2.0, 4.0, np.inf],
+        'labels': ['<1.0', '1.0-1.99', '2.0-3.99', '≥4.0'],
+    },
+    'bmi': {
+        'label': 'BMI category',
+        'column': 'BMXBMI',
+        'bins': [0, 18.5, 25, 30, np.inf],
+        'labels': ['Underweight (<18.5)', 'Normal (18.5-24.9)', 'Overweight (25-29.9)', 'Obese (≥30)'],
+    },
+    'age': {
+        'label': 'Age group',
+        'column': 'RIDAGEYR',
+        'bins': [18, 26, 36, 46],
+        'labels': ['18-25', '26-35', '36-45'],
+    },
+}
+
+
+def modifier_codes(df, spec):
+    """Return integer stratum codes (-1 = missing) and stratum labels."""
+    if 'groups' in spec:
+        mapping = {level: code for code, members in enumerate(spec['groups'].values())
+                   for level in members}
+        codes = df[spec['column']].map(mapping)
+        labels = list(spec['groups'])
+    else:
+        codes = pd.cut(df[spec['column']], bins=spec['bins'], labels=False, right=False)
+        labels = list(spec['labels'])
+    return codes.fillna(-1).astype(int).to_numpy(), labels
+
+
+def _coefficient(fit, j, alpha=0.05):
+    """Estimate, SE, t-based CI and p-value for coefficient j of a wls_fit."""
+    coef = fit['params'][j]
+    se = np.sqrt(fit['cov'][j, j])
+    t_crit = stats.t.ppf(1 - alpha / 2, fit['df_resid'])
+    return {
+        'coef_supp': coef,
+        'se_supp': se,
+        'ci_low_supp': coef - t_crit * se,
+        'ci_high_supp': coef + t_crit * se,
+        'pvalue_supp': 2 * stats.t.sf(abs(coef / se), fit['df_resid']),
+    }
+
+
+def interaction_test(X, y, w, codes, supp_col=1):
+    """Joint Wald F test of the supplement x stratum terms in the pooled model.
+
+    Strata enter as main-effect dummies (first stratum present = reference)
+    plus their products with the supplement column.
+    """
+    present = np.unique(codes)
+    if len(present) < 2:
+        return np.nan, np.nan
+    dummies = (codes[:, None] == present[None, 1:]).astype(float)
+    design = np.hstack([X, dummies, dummies * X[:, [supp_col]]])
+
+    fit = wls_fit(design, y, w)
+    if fit is None:
+        return np.nan, np.nan
+
+    terms = slice(X.shape[1] + dummies.shape[1], None)
+    b = fit['params'][terms]
+    V = fit['cov'][terms, terms]
+    q = len(b)
+    f_stat = b @ np.linalg.solve(V, b) / q
+    return f_stat, stats.f.sf(f_stat, q, fit['df_resid'])
+
+
+def fit_strata(X, y, w, codes, n_levels, supp_col=1, max_workers=None):
+    """Fit one model per stratum on contiguous slices of stratum-sorted arrays.
+
+    Returns a list (one entry per stratum) of (n, coefficient dict or None).
+    """
+    order = np.argsort(codes, kind='stable')
+    X, y, w, codes = X[order], y[order], w[order], codes[order]
+    bounds = np.searchsorted(codes, np.arange(n_levels + 1))
+
+    def fit_slice(level):
+        start, end = bounds[level], bounds[level + 1]
+        X_s = X[start:end]
+        # Drop covariates that do not vary within the stratum
+        keep = np.ptp(X_s, axis=0) > 0 if len(X_s) else np.zeros(X.shape[1], dtype=bool)
+        keep[0] = True
+        if not keep[supp_col]:
+            return end - start, None
+        fit = wls_fit(X_s[:, keep], y[start:end], w[start:end])
+        if fit is None:
+            return end - start, None
+        return end - start, _coefficient(fit, int(keep[:supp_col].sum()))
+
+    if max_workers is None:
+        max_workers = min(n_levels, os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers) as pool:
+        return list(pool.map(fit_slice, range(n_levels)))
+
+
+def run_interaction_analysis(df, modifiers=None, outcome='log_ferritin', weight_col='weight_adjusted'):
+    """Test supplement x modifier interactions and fit stratum-specific models."""
+    if modifiers is None:
+        modifiers = EFFECT_MODIFIERS
+
+    y_all = df[outcome].to_numpy(dtype=float)
+    w_all = df[weight_col].to_numpy(dtype=float)
+
+    rows = []
+    for name, spec in modifiers.items():
+        columns = [c for c in MODEL3_COVARIATES if c not in spec.get('replaces', [])]
+        codes, labels = modifier_codes(df, spec)
+        X_all = np.column_stack([np.ones(len(df)), df[columns].to_numpy(dtype=float)])
+
+        # Complete cases shared by the pooled and stratum-specific fits
+        mask = ((codes >= 0) & ~np.isnan(y_all) & ~np.isnan(w_all) & (w_all > 0)
+                & ~np.isnan(X_all).any(axis=1))
+        X, y, w, c = X_all[mask], y_all[mask], w_all[mask], codes[mask]
+        supp_col = 1 + columns.index('supp_any')
+
+        f_stat, p_interaction = interaction_test(X, y, w, c, supp_col)
+        strata = fit_strata(X, y, w, c, len(labels), supp_col)
+
+        for label, (n, coef) in zip(labels, strata):
+            row = {'modifier': name, 'modifier_label': spec['label'], 'stratum': label, 'n': n}
+            if coef is not None:
+                row.update(coef)
+            row['f_interaction'] = f_stat
+            row['p_interaction'] = p_interaction
+            rows.append(row)
+
+    return pd.DataFrame(rows)
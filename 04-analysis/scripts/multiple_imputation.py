@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+NHANES Iron Deficiency Without Anemia Study - Multiple Imputation
+=================================================================
+
+This module:
+1. Imputes missing poverty ratio (INDFMPIR) and BMI (BMXBMI) by chained
+   equations with predictive mean matching, so imputed values are always
+   observed values (poverty ratio stays within its top-coded range)
+2. Stores each imputation as a compact overlay holding only the imputed
+   cells, never M full copies of the dataset
+3. Generates the imputations and fits the Table 3 models on each in a
+   process pool; workers share the model arrays built once by the parent
+4. Pools the supplement coefficient across imputations with Rubin's rules
+   (Barnard-Rubin degrees of freedom)
+
+The imputation models include the outcome (log ferritin), supplement use,
+age, race/ethnicity and survey cycle, fitted with the analysis weights.
+
+Author: NHANES Analysis Pipeline
+Date: 2026-10-19
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import numpy as np
+from scipy import stats
+
+from regression_models import MODEL3_COVARIATES, cycle_dummy_columns, wls_fit
+
+MI_VARIABLES = ['INDFMPIR', 'BMXBMI']
+MI_PREDICTORS = ['log_ferritin', 'supp_any', 'RIDAGEYR', 'race_nhb', 'race_mex',
+                 'race_oth_hisp', 'race_other']
+N_IMPUTATIONS = 20
+N_ITERATIONS = 10
+N_DONORS = 5
+
+# Table 3 models
+MI_MODELS = {
+    'model1': {'name': 'Unadjusted', 'covariates': ['supp_any']},
+    'model2': {'name': 'Demographics-adjusted',
+               'covariates': [c for c in MODEL3_COVARIATES if c != 'BMXBMI']},
+    'model3': {'name': 'Fully adjusted', 'covariates': MODEL3_COVARIATES},
+}
+
+# Arrays shared with worker processes (set before the pool starts)
+_DATA = None
+
+
+def _init_worker(data):
+    global _DATA
+    _DATA = data
+
+
+def build_imputation_data(df, outcome='log_ferritin', weight_col='weight_adjusted'):
+    """Collect the arrays every imputation and model fit needs, once.
+
+    Rows are those with a usable outcome, weight and complete predictors;
+    only the MI_VARIABLES may be missing. Variables without any observed
+    value among these rows have no donors and are not imputed.
+    """
+    predictors = MI_PREDICTORS + cycle_dummy_columns(df)
+    covariates = [c for spec in MI_MODELS.values() for c in spec['covariates']
+                  if c not in MI_VARIABLES]
+    columns = list(dict.fromkeys(predictors + covariates))
+
+    base = df[columns].to_numpy(dtype=float)
+    y = df[outcome].to_numpy(dtype=float)
+    w = df[weight_col].to_numpy(dtype=float)
+    rows = ~np.isnan(base).any(axis=1) & ~np.isnan(y) & ~np.isnan(w) & (w > 0)
+
+    values = df.loc[rows, MI_VARIABLES].to_numpy(dtype=float)
+    missing = np.isnan(values)
+    return {
+        'columns': columns,
+        'base': base[rows],
+        'predictors': [columns.index(c) for c in predictors],
+        'y': y[rows],
+        'w': w[rows],
+        'values': values,
+        'missing': missing,
+        'imputable': [j for j in range(len(MI_VARIABLES)) if not missing[:, j].all()],
+    }
+
+
+def _pmm_draw(rng, yhat_obs, yhat_mis, donors_obs, k):
+    """Predictive mean matching: a random one of the k nearest observed donors."""
+    order = np.argsort(yhat_obs)
+    sorted_hat = yhat_obs[order]
+    n_obs = len(sorted_hat)
+
+    # Candidate window of 2k around each insertion point, then the k closest
+    pos = np.searchsorted(sorted_hat, yhat_mis)
+    window = np.clip(pos[:, None] + np.arange(-k, k)[None, :], 0, n_obs - 1)
+    distance = np.abs(sorted_hat[window] - yhat_mis[:, None])
+    nearest = np.take_along_axis(window, np.argsort(distance, axis=1)[:, :k], axis=1)
+    chosen = nearest[np.arange(len(yhat_mis)), rng.integers(0, k, len(yhat_mis))]
+    return donors_obs[order][chosen]
+
+
+def chained_equations(data, seed, n_iter=N_ITERATIONS, k=N_DONORS):
+    """Run one chain and return its overlay {variable: imputed values}.
+
+    Missing cells start as random draws from the observed values; each
+    iteration re-imputes every variable from the predictors and the other
+    (current) variables, with coefficients drawn from their sampling
+    distribution so imputations reflect parameter uncertainty. Variables
+    without observed donors keep their missing cells.
+    """
+    rng = np.random.default_rng(seed)
+    values = data['values'].copy()
+    missing = data['missing']
+    P = np.column_stack([np.ones(len(values)), data['base'][:, data['predictors']]])
+    w = data['w']
+    imputable = data['imputable']
+
+    for j in imputable:
+        observed = values[~missing[:, j], j]
+        values[missing[:, j], j] = rng.choice(observed, missing[:, j].sum())
+
+    for _ in range(n_iter):
+        for j in imputable:
+            mis = missing[:, j]
+            if not mis.any():
+                continue
+            X = np.column_stack([P, values[:, [i for i in imputable if i != j]]])
+            fit = wls_fit(X[~mis], values[~mis, j], w[~mis])
+            if fit is None:
+                continue
+            beta_star = rng.multivariate_normal(fit['params'], fit['cov'])
+            values[mis, j] = _pmm_draw(rng, X[~mis] @ fit['params'], X[mis] @ beta_star,
+                                       values[~mis, j], k)
+
+    return {var: values[missing[:, j], j] for j, var in enumerate(MI_VARIABLES)}
+
+
+def apply_overlay(data, overlay):
+    """Return the MI_VARIABLES matrix with an imputation's cells filled in."""
+    values = data['values'].copy()
+    for j, var in enumerate(MI_VARIABLES):
+        values[data['missing'][:, j], j] = overlay[var]
+    return values
+
+
+def fit_models(data, values, term='supp_any'):
+    """Fit every MI model on one completed dataset; return term estimates."""
+    estimates = {}
+    for key, spec in MI_MODELS.items():
+        X = np.column_stack([np.ones(len(values))] + [
+            values[:, MI_VARIABLES.index(c)] if c in MI_VARIABLES
+            else data['base'][:, data['columns'].index(c)]
+            for c in spec['covariates']])
+        keep = ~np.isnan(X).any(axis=1)
+        fit = wls_fit(X[keep], data['y'][keep], data['w'][keep])
+        if fit is None:
+            continue
+        j = 1 + spec['covariates'].index(term)
+        estimates[key] = (fit['params'][j], fit['cov'][j, j], fit['df_resid'], fit['n'])
+    return estimates
+
+
+def run_imputation(m, seed=42):
+    """Generate imputation m and fit the models on it (worker entry point)."""
+    overlay = chained_equations(_DATA, seed + m)
+    return overlay, fit_models(_DATA, apply_overlay(_DATA, overlay))
+
+
+def rubin_pool(estimates, variances, df_complete, alpha=0.05):
+    """Pool M estimates and their variances with Rubin's rules.
+
+    Degrees of freedom use the Barnard-Rubin small-sample adjustment.
+    """
+    estimates = np.asarray(estimates, dtype=float)
+    variances = np.asarray(variances, dtype=float)
+    m = len(estimates)
+
+    q_bar = estimates.mean()
+    within = variances.mean()
+    between = estimates.var(ddof=1)
+    total = within + (1 + 1 / m) * between
+
+    lam = (1 + 1 / m) * between / total
+    df_old = (m - 1) / lam ** 2 if lam > 0 else np.inf
+    df_obs = (df_complete + 1) / (df_complete + 3) * df_complete * (1 - lam)
+    df = 1 / (1 / df_old + 1 / df_obs)
+
+    se = np.sqrt(total)
+    t_crit = stats.t.ppf(1 - alpha / 2, df)
+    return {
+        'coef': q_bar,
+        'se': se,
+        'ci_low': q_bar - t_crit * se,
+        'ci_high': q_bar + t_crit * se,
+        'pvalue': 2 * stats.t.sf(abs(q_bar / se), df),
+        'df': df,
+        'within_var': within,
+        'between_var': between,
+        'fmi': lam,
+    }
+
+
+def run_multiple_imputation(df, n_imputations=N_IMPUTATIONS, seed=42, max_workers=None):
+    """Impute, fit the Table 3 models on each imputation and pool.
+
+    Returns (results, overlays): one pooled row per model, alongside the
+    complete-case estimate, and the list of per-imputation overlays.
+    """
+    global _DATA
+    data = build_imputation_data(df)
+    for j, var in enumerate(MI_VARIABLES):
+        if j not in data['imputable']:
+            print(f"  {var} has no observed values among the modelled rows; not imputed")
+    if max_workers is None:
+        max_workers = min(n_imputations, os.cpu_count() or 1)
+
+    _DATA = data
+    if 'fork' in multiprocessing.get_all_start_methods():
+        executor = ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context('fork'))
+    else:
+        executor = ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=(data,))
+
+    with executor:
+        outputs = list(executor.map(run_imputation, range(n_imputations),
+                                    [seed] * n_imputations))
+    overlays = [overlay for overlay, _ in outputs]
+
+    # Unimputed values: each model drops its own incomplete rows
+    complete_case = fit_models(data, data['values'])
+
+    rows = []
+    for key, spec in MI_MODELS.items():
+        fits = [fits[key] for _, fits in outputs if key in fits]
+        if len(fits) < 2:
+            continue
+        coefs, variances, dfs, ns = zip(*fits)
+        row = {'model': key, 'name': spec['name'], 'n': ns[0], 'n_imputations': len(fits),
+               'n_imputed_cells': int(sum(data['missing'][:, MI_VARIABLES.index(c)].sum()
+                                          for c in spec['covariates'] if c in MI_VARIABLES))}
+        row.update(rubin_pool(coefs, variances, dfs[0]))
+        if key in complete_case:
+            row['n_complete_case'] = complete_case[key][3]
+            row['coef_complete_case'] = complete_case[key][0]
+            row['se_complete_case'] = np.sqrt(complete_case[key][1])
+        rows.append(row)
+
+    return pd.DataFrame(rows), overlays
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+NHANES Iron Deficiency Without Anemia Study - NHANES Component Registry
+=======================================================================
+
+This module:
+1. Declares every NHANES component the pipeline can use: file prefix,
+   cycles available, columns with dtypes, join type and survey weight
+2. Declares derived columns computed from a component's raw columns
+   (e.g. CRP harmonized to mg/L across the CRP and HSCRP files)
+3. Records the columns each analysis references, so optional (lazy)
+   components are only loaded when a requested analysis needs them
+
+Join types: 'base' starts the merge, 'inner' keeps only participants with
+the component, 'left' keeps everyone and leaves missing values.
+
+Author: NHANES Analysis Pipeline
+Date: 2026-10-19
+"""
+
+# Components in merge order
+NHANES_COMPONENTS = {
+    'DEMO': {
+        'description': 'Demographics',
+        'cycles': ['D', 'E', 'F', 'G', 'H', 'I', 'J', 'L'],
+        'columns': {
+            'RIAGENDR': 'float64', 'RIDAGEYR': 'float64', 'RIDRETH1': 'float64',
+            'INDFMPIR': 'float64', 'WTINT2YR': 'float64', 'WTMEC2YR': 'float64',
+            'SDMVSTRA': 'float64', 'SDMVPSU': 'float64', 'RIDEXPRG': 'float64',
+        },
+        'join': 'base',
+        'weight': 'WTINT2YR',
+        'required': True,
+    },
+    'FERTIN': {
+        'description': 'Ferritin',
+        'cycles': ['D', 'E', 'F', 'I', 'J'],  # G, H, L not available
+        'columns': {'LBXFER': 'float64'},
+        'join': 'inner',
+        'weight': 'WTMEC2YR',
+        'required': True,
+    },
+    'CBC': {
+        'description': 'Complete Blood Count',
+        'cycles': ['D', 'E', 'F', 'G', 'H', 'I', 'J', 'L'],
+        'columns': {'LBXHGB': 'float64'},
+        'join': 'inner',
+        'weight': 'WTMEC2YR',
+    },
+    'DSQTOT': {
+        'description': 'Dietary Supplements',
+        'cycles': ['E', 'F', 'G', 'H', 'I', 'J', 'L'],  # D not available
+        'columns': {'DSQTIRON': 'float64'},
+        'join': 'left',
+        'weight': 'WTINT2YR',
+    },
+    'BMX': {
+        'description': 'Body Measures',
+        'cycles': ['D', 'E', 'F', 'G', 'H', 'I', 'J', 'L'],
+        'columns': {'BMXBMI': 'float64'},
+        'join': 'left',
+        'weight': 'WTMEC2YR',
+    },
+    'FETIB': {
+        'description': 'Iron/TIBC',
+        'cycles': ['D', 'J'],  # Only available in D and J
+        'columns': {'LBXIRN': 'float64', 'LBXTIB': 'float64', 'LBDPCT': 'float64',
+                    'LBDTIB': 'float64'},
+        'derived': {'LBXTIB': 'LBDTIB'},  # TIBC is LBDTIB from 2017-2018
+        'join': 'left',
+        'weight': 'WTMEC2YR',
+        'lazy': True,
+    },
+    'CRP': {
+        'description': 'C-Reactive Protein',
+        'cycles': ['D', 'E', 'F'],
+        'columns': {'LBXCRP': 'float64'},  # mg/dL
+        'derived': {'crp_mg_l': 'LBXCRP * 10'},
+        'join': 'left',
+        'weight': 'WTMEC2YR',
+        'lazy': True,
+    },
+    'HSCRP': {
+        'description': 'High-Sensitivity C-Reactive Protein',
+        'cycles': ['I', 'J', 'L'],
+        'columns': {'LBXHSCRP': 'float64'},  # mg/L
+        'derived': {'crp_mg_l': 'LBXHSCRP'},
+        'join': 'left',
+        'weight': 'WTMEC2YR',
+        'lazy': True,
+    },
+    'FASTQX': {
+        'description': 'Fasting Questionnaire',
+        'cycles': ['D', 'E', 'F', 'G', 'H', 'I', 'J', 'L'],
+        'columns': {'PHAFSTHR': 'float64'},
+        'join': 'left',
+        'weight': 'WTMEC2YR',
+        'lazy': True,
+    },
+}
+
+# Columns referenced by each analysis (lazy components are loaded on demand)
+ANALYSIS_REQUIREMENTS = {
+    'primary': ['LBXFER', 'LBXHGB', 'DSQTIRON', 'BMXBMI'],
+    'secondary_biomarkers': ['LBXIRN', 'LBXTIB', 'LBDPCT'],
+    'inflammation': ['crp_mg_l'],
+}
+
+
+def component_columns(prefix):
+    """Return raw and derived columns provided by a component."""
+    spec = NHANES_COMPONENTS[prefix]
+    return list(spec['columns']) + list(spec.get('derived', {}))
+
+
+def components_for(analyses=None):
+    """Return the components (in merge order) needed for the given analyses.
+
+    Non-lazy components are always included; lazy ones only when an
+    analysis references one of their raw or derived columns.
+    """
+    if analyses is None:
+        analyses = list(ANALYSIS_REQUIREMENTS)
+
+    unknown = [name for name in analyses if name not in ANALYSIS_REQUIREMENTS]
+    if unknown:
+        raise KeyError(f"Unknown analyses: {', '.join(unknown)}")
+
+    referenced = set()
+    for name in analyses:
+        referenced.update(ANALYSIS_REQUIREMENTS[name])
+
+    return [prefix for prefix, spec in NHANES_COMPONENTS.items()
+            if not spec.get('lazy') or referenced & set(component_columns(prefix))]
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+NHANES Iron Deficiency Without Anemia Study - Figure Plot Data
+==============================================================
+
+This module:
+1. Computes the compact aggregates each figure is drawn from: the
+   exclusion cascade and final sample breakdown for Figure 1, survey-
+   weighted KDE grids, box statistics, binned shares and ECDF for Figure 2
+   (see density_kernels.py), subgroup
+   prevalences for Figure 3, coefficients for Figure 4, the cutoff sweep
+   for Figure 5 and the spline curve for Figure 6
+2. Writes each figure's plot data to one JSON artifact (tables stored in
+   split orientation plus scalar metadata) and reads it back
+
+Render functions in 04_generate_figures.py only see these artifacts, so a
+figure can be restyled and re-rendered without touching the microdata.
+
+Author: NHANES Analysis Pipeline
+Date: 2026-10-19
+"""
+
+import json
+import os
+
+import pandas as pd
+import numpy as np
+
+from density_kernels import (weighted_kde, weighted_ecdf, weighted_histogram,
+                             weighted_box_stats)
+
+# Figure 2 aggregation settings
+FERRITIN_PLOT_RANGE = (2, 150)
+KDE_GRID_POINTS = 256
+KDE_CUT = 2                     # bandwidths beyond the data range (as seaborn)
+HIST_BINS = np.linspace(2, 100, 30)
+ECDF_GRID_POINTS = 512
+SUPPLEMENT_GROUPS = {0: 'No Supplement', 1: 'Iron Supplement'}
+
+# Forest plot rows: (label, CSV source, model key or dose level)
+FOREST_ROWS = [
+    ('Model 1: Unadjusted', 'model', 'model1'),
+    ('Model 2: Demographics-adjusted', 'model', 'model2'),
+    ('Model 3: Fully adjusted', 'model', 'model3'),
+    ('Dose: Low', 'dose', 'low'),
+    ('Dose: Moderate', 'dose', 'mod'),
+    ('Dose: High', 'dose', 'high'),
+]
+
+
+def write_plot_data(path, tables, meta=None):
+    """Write a figure's tables and metadata to one JSON artifact."""
+    payload = {
+        'meta': meta or {},
+        'tables': {name: json.loads(table.to_json(orient='split', index=False))
+                   for name, table in tables.items()},
+    }
+    with open(path, 'w') as f:
+        json.dump(payload, f)
+
+
+def read_plot_data(path):
+    """Read a plot-data artifact as {table name: DataFrame, 'meta': dict}."""
+    with open(path) as f:
+        payload = json.load(f)
+    plot_data = {name: pd.DataFrame(table['data'], columns=table['columns'])
+                 for name, table in payload['tables'].items()}
+    plot_data['meta'] = payload['meta']
+    return plot_data
+
+
+def figure1_plot_data(cascade_csv, df):
+    """Exclusion cascade, survey cycles and IDWA breakdown for the flow diagram.
+
+    The cascade is written by 01_data_prep.py; returns None without it.
+    """
+    if not os.path.exists(cascade_csv):
+        return None
+
+    cascade = pd.read_csv(cascade_csv)
+    cycles = df[['cycle', 'cycle_year']].drop_duplicates().sort_values('cycle_year')
+    meta = {
+        'cycles': cycles['cycle'].tolist(),
+        'first_year': cycles['cycle_year'].iloc[0].split('-')[0],
+        'last_year': cycles['cycle_year'].iloc[-1].split('-')[-1],
+        'n_final': int(len(df)),
+        'n_idwa': int(df['IDWA'].sum()),
+    }
+    return {'cascade': cascade}, meta
+
+
+def figure2_plot_data(df, weight_col='weight_adjusted'):
+    """Weighted KDE grids, box statistics, histogram shares and ECDF by supplement use."""
+    in_range = df['LBXFER'].between(*FERRITIN_PLOT_RANGE)
+    kde, box, fliers, hist, ecdf = [], [], [], [], []
+
+    for code, label in SUPPLEMENT_GROUPS.items():
+        group = df.loc[in_range & (df['iron_supplement'] == code) & (df[weight_col] > 0)]
+        ferritin = group['LBXFER'].to_numpy(dtype=float)
+        log_ferritin = group['log_ferritin'].to_numpy(dtype=float)
+        w = group[weight_col].to_numpy(dtype=float)
+        if len(ferritin) < 2:
+            continue
+
+        grid, density = weighted_kde(ferritin, w, n_points=KDE_GRID_POINTS, cut=KDE_CUT, lower=0)
+        kde.append(pd.DataFrame({'group': label, 'ferritin': grid, 'density': density}))
+
+        for variable, values in [('LBXFER', ferritin), ('log_ferritin', log_ferritin)]:
+            box.append({'group': label, 'variable': variable, **weighted_box_stats(values, w)})
+        row = box[-1]
+        outside = log_ferritin[(log_ferritin < row['whislo']) | (log_ferritin > row['whishi'])]
+        fliers.append(pd.DataFrame({'group': label, 'log_ferritin': outside}))
+
+        hist.append(pd.DataFrame({'group': label, 'bin_left': HIST_BINS[:-1], 'bin_right': HIST_BINS[1:],
+                                  'percent': weighted_histogram(ferritin, w, HIST_BINS)}))
+
+        grid, percentile = weighted_ecdf(ferritin, w, *FERRITIN_PLOT_RANGE, n_points=ECDF_GRID_POINTS)
+        ecdf.append(pd.DataFrame({'group': label, 'ferritin': grid, 'percentile': percentile}))
+
+    tables = {
+        'kde': pd.concat(kde, ignore_index=True),
+        'box': pd.DataFrame(box),
+        'fliers': pd.concat(fliers, ignore_index=True),
+        'hist': pd.concat(hist, ignore_index=True),
+        'ecdf': pd.concat(ecdf, ignore_index=True),
+    }
+    return tables, {}
+
+
+def figure3_plot_data(cube):
+    """Prevalence margins for Figure 3, sliced from the prevalence cube."""
+    columns = ['n_total', 'weighted_total', 'prevalence', 'se']
+    tables = {
+        'age': cube.margin('age_group')[['age_group'] + columns],
+        'race': cube.margin('race_category')[['race_category'] + columns],
+        'age_race': cube.margin('age_group', 'race_category')[['age_group', 'race_category'] + columns],
+        'race_supp': cube.margin('race_category', 'iron_supplement')[
+            ['race_category', 'iron_supplement'] + columns],
+    }
+    return tables, {}
+
+
+def figure4_plot_data(tables_dir):
+    """Supplement and dose coefficients for the forest plot; None without 03 outputs."""
+    results_csv = os.path.join(tables_dir, 'regression_results.csv')
+    dose_csv = os.path.join(tables_dir, 'dose_response_results.csv')
+    if not (os.path.exists(results_csv) and os.path.exists(dose_csv)):
+        return None
+
+    models = pd.read_csv(results_csv).set_index('model')
+    dose = pd.read_csv(dose_csv).iloc[0]
+    rows = []
+    for label, source, key in FOREST_ROWS:
+        if source == 'model' and key in models.index:
+            row = models.loc[key]
+            rows.append({'label': label, 'coef': row['coef_supp'],
+                         'ci_low': row['ci_low_supp'], 'ci_high': row['ci_high_supp']})
+        elif source == 'dose' and pd.notna(dose.get(f'coef_{key}')):
+            rows.append({'label': label, 'coef': dose[f'coef_{key}'],
+                         'ci_low': dose[f'ci_low_{key}'], 'ci_high': dose[f'ci_high_{key}']})
+    return {'coefficients': pd.DataFrame(rows)}, {}
+
+
+def figure5_plot_data(sweep):
+    """Overall and race-specific prevalence curves over the cutoff grid."""
+    columns = ['group', 'subgroup', 'ferritin_cutoff', 'hemoglobin_cutoff',
+               'prevalence', 'ci_low', 'ci_high']
+    return {'sweep': sweep[columns]}, {}
+
+
+def figure6_plot_data(tables_dir):
+    """Spline curve, knots and non-linearity test; None without 03 outputs."""
+    curve_csv = os.path.join(tables_dir, 'dose_response_spline.csv')
+    dose_csv = os.path.join(tables_dir, 'dose_response_results.csv')
+    if not (os.path.exists(curve_csv) and os.path.exists(dose_csv)):
+        return None
+
+    dose = pd.read_csv(dose_csv).iloc[0]
+    curve = pd.read_csv(curve_csv)[['dose', 'difference', 'difference_ci_low', 'difference_ci_high']]
+    meta = {
+        'knots': [float(k) for k in str(dose['spline_knots']).split(';')],
+        'pvalue_nonlinear': float(dose['spline_pvalue_nonlinear']),
+    }
+    return {'curve': curve}, meta
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+NHANES Iron Deficiency Without Anemia Study - Weighted Prevalence Cube
+======================================================================
+
+This module:
+1. Aggregates the analytic sample once into a weighted cube over
+   age group x race/ethnicity x poverty x iron supplement use x cycle
+2. Stores unweighted counts, weighted totals and weighted case totals,
+   with the weighted totals kept per PSU as design-variance components
+3. Slices any margin or cross-tab from the cube without touching the
+   row-level data
+
+Margins report the weighted prevalence with the approximate binomial SE
+used in Table 2 and the Taylor-linearized design SE.
+
+Author: NHANES Analysis Pipeline
+Date: 2026-10-19
+"""
+
+import pandas as pd
+import numpy as np
+
+from schema import AGE_GROUPS, RACE_CATEGORIES, POVERTY_CATEGORIES
+from survey_design import stratified_psu_variance
+
+# Cube dimensions with their reporting order; levels seen in the data but
+# not listed here (e.g. 'Unknown') are appended so no row is dropped
+CUBE_DIMENSIONS = {
+    'age_group': AGE_GROUPS,
+    'race_category': RACE_CATEGORIES,
+    'poverty_category': POVERTY_CATEGORIES,
+    'iron_supplement': [0, 1],
+    'cycle': [],
+}
+
+
+class PrevalenceCube:
+    """Weighted counts of an outcome over the cube dimensions."""
+
+    def __init__(self, df, design, outcome='IDWA', dimensions=None):
+        if dimensions is None:
+            dimensions = CUBE_DIMENSIONS
+
+        self.outcome = outcome
+        self.dimensions = list(dimensions)
+        self.psu_stratum = design.psu_stratum
+        self.levels = {}
+
+        codes = []
+        for dim, declared in dimensions.items():
+            observed = sorted(df[dim].dropna().unique(), key=str)
+            levels = list(declared) + [v for v in observed if v not in declared]
+            self.levels[dim] = levels
+            codes.append(pd.Categorical(df[dim], categories=levels).codes)
+
+        self.shape = tuple(len(self.levels[dim]) for dim in self.dimensions)
+        codes = np.vstack(codes)
+        in_cube = (codes >= 0).all(axis=0)
+        cell = np.ravel_multi_index(np.where(in_cube, codes, 0), self.shape)[in_cube]
+
+        y = df[outcome].astype(float).fillna(0).values[in_cube]
+        w = design.weights[in_cube]
+        valid = design.valid[in_cube]
+        n_cells = int(np.prod(self.shape))
+        n_psu = design.n_psu
+
+        # Unweighted counts per cell
+        self.n = np.bincount(cell, minlength=n_cells).reshape(self.shape)
+        self.n_valid = np.bincount(cell, weights=valid, minlength=n_cells).reshape(self.shape)
+        self.n_cases = np.bincount(cell, weights=y, minlength=n_cells).reshape(self.shape)
+
+        # Weighted totals per cell and PSU (design-variance components)
+        flat = cell * n_psu + design.psu_codes[in_cube]
+        self.weight_psu = np.bincount(flat, weights=w, minlength=n_cells * n_psu
+                                      ).reshape(self.shape + (n_psu,))
+        self.case_psu = np.bincount(flat, weights=w * y, minlength=n_cells * n_psu
+                                    ).reshape(self.shape + (n_psu,))
+
+    def _collapse(self, array, dims, per_psu=False):
+        """Sum an array over every dimension not in `dims`, ordered as `dims`."""
+        keep = [self.dimensions.index(d) for d in dims]
+        drop = tuple(i for i in range(len(self.dimensions)) if i not in keep)
+        collapsed = array.sum(axis=drop)
+        remaining = sorted(keep)
+        order = [remaining.index(i) for i in keep]
+        if per_psu:
+            order.append(len(order))
+        return np.transpose(collapsed, order)
+
+    def psu_table(self, dim):
+        """Per-PSU weighted totals and case totals for each level of `dim`.
+
+        Returns (levels, weight_psu, case_psu, n_valid) with the PSU arrays
+        shaped (n_levels, n_psu).
+        """
+        if dim not in self.dimensions:
+            raise KeyError(f"{dim} is not a cube dimension")
+        return (self.levels[dim],
+                self._collapse(self.weight_psu, (dim,), per_psu=True),
+                self._collapse(self.case_psu, (dim,), per_psu=True),
+                self._collapse(self.n_valid, (dim,)))
+
+    def margin(self, *dims):
+        """Return prevalence for every cell of the margin over `dims`.
+
+        With no dimensions this is the overall (single-row) estimate.
+        """
+        for dim in dims:
+            if dim not in self.dimensions:
+                raise KeyError(f"{dim} is not a cube dimension")
+
+        n_psu = self.weight_psu.shape[-1]
+        W = self._collapse(self.weight_psu, dims, per_psu=True).reshape(-1, n_psu)
+        Y = self._collapse(self.case_psu, dims, per_psu=True).reshape(-1, n_psu)
+        n = self._collapse(self.n, dims).ravel()
+        n_valid = self._collapse(self.n_valid, dims).ravel()
+        n_cases = self._collapse(self.n_cases, dims).ravel()
+
+        weighted_total = W.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            prevalence = Y.sum(axis=1) / weighted_total
+            se = np.where(n_valid > 1, np.sqrt(prevalence * (1 - prevalence) / n_valid), np.nan)
+
+            # Linearized ratio estimator: z = (y - p) w / W summed per PSU
+            z = (Y - prevalence[:, None] * W) / weighted_total[:, None]
+        se_design = np.sqrt(stratified_psu_variance(np.nan_to_num(z).T, self.psu_stratum))
+        se_design = np.where(weighted_total > 0, se_design, np.nan)
+
+        if dims:
+            index = pd.MultiIndex.from_product([self.levels[d] for d in dims], names=list(dims))
+            result = pd.DataFrame(index=index).reset_index()
+        else:
+            result = pd.DataFrame(index=[0])
+
+        result['n_total'] = n.astype(int)
+        result['n_cases'] = n_cases.astype(int)
+        result['weighted_total'] = weighted_total
+        result['prevalence'] = prevalence
+        result['se'] = se
+        result['se_design'] = se_design
+        return result
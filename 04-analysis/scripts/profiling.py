@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+NHANES Iron Deficiency Without Anemia Study - Stage Profiling
+=============================================================
+
+This module:
+1. Measures wall time, CPU time and peak resident memory (RSS) of a
+   pipeline stage and of named steps inside it
+2. Writes one JSON trace per stage to outputs/traces/<stage>.json,
+   including failed runs
+3. With IDWA_PROFILE=1, also runs the stage under cProfile and dumps
+   the statistics to outputs/traces/<stage>.prof (pstats format, for
+   snakeviz, gprof2dot or `python -m pstats`)
+4. Merges the stage traces of a pipeline run into one trace
+
+Stages wrap main() in a StageProfiler. Inside it, phase(name) starts a
+top-level step that lasts until the next phase, matching the banner
+sections of a stage script; step(name) is a context manager for a
+nested step (a file load, a merge, a model fit). Both are no-ops when no
+profiler is active, so library modules can be traced unconditionally.
+Step CPU times cover this process only; CPU used by worker processes
+(figure rendering, multiple imputation) is reported per stage as
+children_cpu_seconds.
+
+A step's peak_rss_mb is the highest RSS reached while the step ran. On
+Linux the kernel's high-water mark (VmHWM) is reset when a step starts
+and read when it ends, with enclosing steps and the stage keeping the
+running maximum. Where that is not available, steps only report
+process_peak_rss_mb_so_far, the process-wide peak up to the step's end.
+
+Author: NHANES Analysis Pipeline
+Date: 2026-10-19
+"""
+
+import cProfile
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:     # not available on Windows
+    resource = None
+
+PROFILE_ENV = 'IDWA_PROFILE'
+TRACE_DIR = os.path.join('outputs', 'traces')
+PIPELINE_TRACE_FILE = 'pipeline_trace.json'
+
+# ru_maxrss is in kilobytes on Linux and bytes on macOS
+_MAXRSS_PER_MB = 1024 * 1024 if sys.platform == 'darwin' else 1024
+
+# Profiler of the stage running in this process
+_active = None
+
+
+def peak_rss_mb(children=False):
+    """Peak RSS of this process (or of its largest waited-for child) in MB."""
+    if resource is None:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    return resource.getrusage(who).ru_maxrss / _MAXRSS_PER_MB
+
+
+def current_rss_mb():
+    """Current RSS in MB (Linux only; None elsewhere)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError):
+        return None
+
+
+def high_water_rss_mb():
+    """Peak RSS since the last reset (VmHWM) in MB; None where unavailable."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def reset_high_water_rss():
+    """Reset VmHWM to the current RSS; False where this is not supported."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def children_cpu_seconds():
+    """User plus system CPU time of this process's waited-for children."""
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class StageProfiler:
+    """Wall time, CPU time and peak RSS of one stage and its steps."""
+
+    def __init__(self, stage, output_dir, profile=None):
+        self.stage = stage
+        self.trace_dir = os.path.join(output_dir, TRACE_DIR)
+        self.profile = os.environ.get(PROFILE_ENV) == '1' if profile is None else profile
+        self.steps = []
+        self._stack = []
+        self._peaks = {}
+        self._stage_peak = None
+        self._track_peaks = False
+        self._phase = None
+        self._profiler = None
+
+    def __enter__(self):
+        global _active
+        _active = self
+        self.started = datetime.now().isoformat(timespec='seconds')
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self._children_cpu = children_cpu_seconds()
+        # Resetting VmHWM also resets ru_maxrss, so the stage keeps its own peak
+        self._stage_peak = high_water_rss_mb()
+        self._track_peaks = self._stage_peak is not None and reset_high_water_rss()
+        if self.profile:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        global _active
+        if self._profiler is not None:
+            self._profiler.disable()
+        self._end_phase()
+        _active = None
+
+        failed = exc_type is not None and not (exc_type is SystemExit and exc.code in (None, 0))
+        self.write('failed' if failed else 'ok')
+        return False
+
+    def _fold_peak(self):
+        """Carry the high-water mark since the last reset into every open step and the stage."""
+        high_water = high_water_rss_mb()
+        for record in self._stack:
+            self._peaks[id(record)] = max(self._peaks[id(record)], high_water)
+        self._stage_peak = max(self._stage_peak, high_water)
+
+    def _start(self, name):
+        if self._track_peaks:
+            self._fold_peak()
+            reset_high_water_rss()
+        record = {'name': name, 'parent': self._stack[-1]['name'] if self._stack else None,
+                  'rss_mb_start': current_rss_mb()}
+        self.steps.append(record)
+        self._stack.append(record)
+        self._peaks[id(record)] = record['rss_mb_start'] or 0.0
+        return record, time.perf_counter(), time.process_time()
+
+    def _finish(self, record, wall, cpu):
+        if self._track_peaks:
+            self._fold_peak()
+        self._stack.remove(record)
+        peak = self._peaks.pop(id(record))
+        record.update({
+            'wall_seconds': time.perf_counter() - wall,
+            'cpu_seconds': time.process_time() - cpu,
+            'rss_mb_end': current_rss_mb(),
+        })
+        if self._track_peaks:
+            record['peak_rss_mb'] = peak
+        else:
+            record['process_peak_rss_mb_so_far'] = peak_rss_mb()
+
+    @contextmanager
+    def step(self, name):
+        started = self._start(name)
+        try:
+            yield
+        finally:
+            self._finish(*started)
+
+    def phase(self, name):
+        """End the current phase and start a new top-level step."""
+        self._end_phase()
+        self._phase = self._start(name)
+
+    def _end_phase(self):
+        if self._phase is not None:
+            for record in reversed(self._stack[self._stack.index(self._phase[0]) + 1:]):
+                self._stack.remove(record)
+                self._peaks.pop(id(record), None)
+            self._finish(*self._phase)
+            self._phase = None
+
+    def peak_rss_mb(self):
+        """Peak RSS of the stage's process so far in MB."""
+        if not self._track_peaks:
+            return peak_rss_mb()
+        self._fold_peak()
+        return self._stage_peak
+
+    def trace(self, status='ok'):
+        """The stage trace as a dict."""
+        return {
+            'stage': self.stage,
+            'status': status,
+            'started': self.started,
+            'pid': os.getpid(),
+            'wall_seconds': time.perf_counter() - self._wall,
+            'cpu_seconds': time.process_time() - self._cpu,
+            'children_cpu_seconds': children_cpu_seconds() - self._children_cpu,
+            'peak_rss_mb': self.peak_rss_mb(),
+            'children_peak_rss_mb': peak_rss_mb(children=True),
+            'profile': os.path.join(self.trace_dir, f'{self.stage}.prof') if self.profile else None,
+            'steps': self.steps,
+        }
+
+    def write(self, status='ok'):
+        """Write the JSON trace (and the cProfile dump, if profiling)."""
+        os.makedirs(self.trace_dir, exist_ok=True)
+        trace = self.trace(status)
+        if self._profiler is not None:
+            self._profiler.dump_stats(trace['profile'])
+        with open(os.path.join(self.trace_dir, f'{self.stage}.json'), 'w') as f:
+            json.dump(trace, f, indent=2)
+        return trace
+
+
+@contextmanager
+def step(name):
+    """Trace a nested step of the active stage (no-op without one)."""
+    if _active is None:
+        yield
+    else:
+        with _active.step(name):
+            yield
+
+
+def phase(name):
+    """Start a top-level step of the active stage (no-op without one)."""
+    if _active is not None:
+        _active.phase(name)
+
+
+def read_stage_trace(output_dir, stage):
+    """A stage's JSON trace; None if the stage has not written one."""
+    path = os.path.join(output_dir, TRACE_DIR, f'{stage}.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_pipeline_trace(path, run_id, stages):
+    """Merge stage traces into one pipeline trace with run totals.
+
+    stages is a list of dicts with the stage name, the return code, wall
+    and CPU time seen by the runner (CPU including start-up and worker
+    processes), and the stage's own trace (or None).
+    """
+    traced = [stage['trace'] for stage in stages if stage.get('trace')]
+    for stage in stages:
+        # Interpreter start-up and imports happen before the stage's own trace starts
+        if stage.get('trace'):
+            stage['startup_seconds'] = stage['wall_seconds'] - stage['trace']['wall_seconds']
+    peaks = [trace[key] for trace in traced for key in ('peak_rss_mb', 'children_peak_rss_mb')
+             if trace.get(key) is not None]
+    pipeline = {
+        'run_id': run_id,
+        'wall_seconds': sum(stage['wall_seconds'] for stage in stages),
+        'cpu_seconds': sum(stage['cpu_seconds'] for stage in stages),
+        'peak_rss_mb': max(peaks) if peaks else None,
+        'stages': stages,
+    }
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(pipeline, f, indent=2)
+    return pipeline
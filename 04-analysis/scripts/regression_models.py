@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+NHANES Iron Deficiency Without Anemia Study - Regression Model Helpers
+======================================================================
+
+This module:
+1. Prepares regression covariates (race, poverty, dose, BMI and cycle dummies)
+2. Fits survey-weighted least squares models on complete cases
+3. Provides a numpy WLS solver (QR of the sqrt-weighted design) for
+   fitting many small models on pre-sliced arrays
+4. Fits several outcomes on one covariate design with multiplicity
+   correction (one factorization, many right-hand sides)
+5. Derives the dose-response trend test and pairwise dose contrasts from
+   one fitted coefficient vector and covariance matrix
+
+Shared by the regression, interaction and sensitivity analysis code.
+
+Author: NHANES Analysis Pipeline
+Date: 2026-10-19
+"""
+
+import pandas as pd
+import numpy as np
+from scipy import stats
+from scipy.linalg import solve_triangular
+import statsmodels.api as sm
+from statsmodels.regression.linear_model import WLS
+from statsmodels.stats.multitest import multipletests
+
+from contrasts import contrast_matrix, evaluate_contrasts, wald_test
+from survey_weights import CYCLE_TABLE
+
+# Covariates of the fully adjusted model (Model 3)
+MODEL3_COVARIATES = ['supp_any', 'RIDAGEYR', 'race_nhb', 'race_mex', 'race_oth_hisp',
+                     'race_other', 'INDFMPIR', 'BMXBMI']
+
+# Dose categories (None = reference) and their ordinal trend scores
+DOSE_TERMS = ['dose_low', 'dose_mod', 'dose_high']
+DOSE_LABELS = {'dose_none': 'None', 'dose_low': 'Low', 'dose_mod': 'Moderate', 'dose_high': 'High'}
+DOSE_SCORES = {'dose_none': 0, 'dose_low': 1, 'dose_mod': 2, 'dose_high': 3}
+
+# Pre-specified pairwise comparisons (analysis plan 4.3): (higher, lower)
+DOSE_PAIRS = [('dose_low', 'dose_none'), ('dose_mod', 'dose_none'), ('dose_high', 'dose_none'),
+              ('dose_mod', 'dose_low'), ('dose_high', 'dose_low'), ('dose_high', 'dose_mod')]
+
+def prepare_data_for_regression(df):
+    """Prepare data for regression analysis."""
+    
+    # Create binary variables for race
+    df['race_nhw'] = (df['race_category'] == 'Non-Hispanic White').astype(int)
+    df['race_nhb'] = (df['race_category'] == 'Non-Hispanic Black').astype(int)
+    df['race_mex'] = (df['race_category'] == 'Mexican American').astype(int)
+    df['race_oth_hisp'] = (df['race_category'] == 'Other Hispanic').astype(int)
+    df['race_other'] = (df['race_category'] == 'Other Race').astype(int)
+    
+    # Create poverty binary variable
+    df['poverty_low'] = (df['poverty_category'] == 'Low (<1.3)').astype(int)
+    
+    # Create age squared for potential non-linearity
+    df['age_sq'] = df['RIDAGEYR'] ** 2
+    
+    # Create iron supplement binary and categorical variables
+    df['supp_any'] = df['iron_supplement']
+    
+    # Dose categories as dummy variables
+    df['dose_low'] = (df['iron_dose'] == 'Low').astype(int)
+    df['dose_mod'] = (df['iron_dose'] == 'Moderate').astype(int)
+    df['dose_high'] = (df['iron_dose'] == 'High').astype(int)
+    
+    # Create BMI categories
+    df['bmi_under'] = (df['BMXBMI'] < 18.5).astype(int)
+    df['bmi_normal'] = ((df['BMXBMI'] >= 18.5) & (df['BMXBMI'] < 25)).astype(int)
+    df['bmi_over'] = ((df['BMXBMI'] >= 25) & (df['BMXBMI'] < 30)).astype(int)
+    df['bmi_obese'] = (df['BMXBMI'] >= 30).astype(int)
+    
+    # Cycle dummies (earliest cycle in the data = reference)
+    present = [c for c in CYCLE_TABLE.index if c in set(df['cycle'])]
+    for cycle in present[1:]:
+        df[f'cycle_{cycle}'] = (df['cycle'] == cycle).astype(int)
+    
+    return df
+
+def cycle_dummy_columns(df):
+    """Return the cycle dummy columns created by prepare_data_for_regression."""
+    return [f'cycle_{c}' for c in CYCLE_TABLE.index if f'cycle_{c}' in df.columns]
+
+def weighted_least_squares(X, y, weights):
+    """Perform weighted least squares regression."""
+    
+    # Remove rows with missing values
+    mask = (~np.isnan(y)) & (~np.isnan(weights)) & (weights > 0)
+    for col in X.columns:
+        mask = mask & (~np.isnan(X[col]))
+    
+    X_clean = X[mask].copy()
+    y_clean = y[mask].copy()
+    w_clean = weights[mask].copy()
+    
+    if len(y_clean) < 10:
+        return None, None, None
+    
+    # Add constant
+    X_clean = sm.add_constant(X_clean)
+    
+    # Fit WLS
+    try:
+        model = WLS(y_clean, X_clean, weights=w_clean)
+        results = model.fit()
+        return results, X_clean, y_clean
+    except Exception as e:
+        print(f"Error fitting model: {e}")
+        return None, None, None
+
+def wls_fit(X, y, w, tol=1e-10):
+    """Weighted least squares on arrays (X includes the intercept column).
+
+    Solves by QR of sqrt(w) X and returns params, the model-based covariance
+    (as statsmodels WLS), residual df and n; None if X is rank deficient or
+    there are no residual degrees of freedom. y may have several columns
+    (one per outcome), which share the single factorization; params is then
+    (k, m) and cov (m, k, k).
+    """
+    n, k = X.shape
+    if n <= k:
+        return None
+
+    sqrt_w = np.sqrt(w)
+    Xw = X * sqrt_w[:, None]
+    yw = y * (sqrt_w[:, None] if y.ndim == 2 else sqrt_w)
+
+    Q, R = np.linalg.qr(Xw)
+    diag = np.abs(np.diag(R))
+    if diag.min() <= tol * diag.max():
+        return None
+
+    params = solve_triangular(R, Q.T @ yw)
+    resid = yw - Xw @ params
+    df_resid = n - k
+    R_inv = solve_triangular(R, np.eye(k))
+    unscaled = R_inv @ R_inv.T
+    sigma2 = (resid ** 2).sum(axis=0) / df_resid
+    cov = sigma2[:, None, None] * unscaled if y.ndim == 2 else sigma2 * unscaled
+
+    return {'params': params, 'cov': cov, 'df_resid': df_resid, 'n': n}
+
+def fit_multi_outcome(df, outcomes, covariates, weight_col, term='supp_any', alpha=0.05):
+    """Fit the same covariate model to several outcomes in one solve.
+
+    All outcomes share one complete-case mask, so the sqrt-weighted design
+    is factored once and each outcome is one more right-hand side. Returns
+    one row per outcome for `term`, with Bonferroni and Benjamini-Hochberg
+    adjusted p-values across outcomes.
+    """
+    X = np.column_stack([np.ones(len(df)), df[covariates].to_numpy(dtype=float)])
+    Y = df[outcomes].to_numpy(dtype=float)
+    w = df[weight_col].to_numpy(dtype=float)
+
+    mask = (~np.isnan(X).any(axis=1) & ~np.isnan(Y).any(axis=1)
+            & ~np.isnan(w) & (w > 0))
+    if mask.sum() < 10:
+        return None
+
+    fit = wls_fit(X[mask], Y[mask], w[mask])
+    if fit is None:
+        return None
+
+    j = 1 + covariates.index(term)
+    coef = fit['params'][j]
+    se = np.sqrt(fit['cov'][:, j, j])
+    t_crit = stats.t.ppf(1 - alpha / 2, fit['df_resid'])
+    pvalues = 2 * stats.t.sf(np.abs(coef / se), fit['df_resid'])
+
+    return pd.DataFrame({
+        'outcome': outcomes,
+        'n': fit['n'],
+        'coef': coef,
+        'se': se,
+        'ci_low': coef - t_crit * se,
+        'ci_high': coef + t_crit * se,
+        'pvalue': pvalues,
+        'pvalue_bonferroni': multipletests(pvalues, alpha=alpha, method='bonferroni')[1],
+        'pvalue_bh': multipletests(pvalues, alpha=alpha, method='fdr_bh')[1],
+    })
+
+def dose_trend_contrast():
+    """Linear trend over the dose categories as a contrast of their coefficients.
+
+    The category means are weighted by centered scores and scaled by the
+    score sum of squares, giving the change in the outcome per category step.
+    The reference (None) coefficient is zero and drops out.
+    """
+    scores = np.array(list(DOSE_SCORES.values()), dtype=float)
+    centered = scores - scores.mean()
+    weights = centered / np.sum(centered ** 2)
+    return {term: weights[i] for i, term in enumerate(DOSE_SCORES) if term in DOSE_TERMS}
+
+def dose_contrasts(params, cov, df_resid, alpha=0.05):
+    """Trend test and Bonferroni-adjusted pairwise contrasts for the dose terms.
+
+    params and cov are the fitted coefficient Series and covariance
+    DataFrame of a model containing DOSE_TERMS. Returns (trend, pairwise)
+    where trend holds the per-step estimate and the joint Wald test that
+    all dose coefficients are zero.
+    """
+    terms = list(params.index)
+    specs = [{a: 1.0} if b == 'dose_none' else {a: 1.0, b: -1.0} for a, b in DOSE_PAIRS]
+    names = [f"{DOSE_LABELS[a]} vs {DOSE_LABELS[b]}" for a, b in DOSE_PAIRS]
+
+    # The Bonferroni adjustment covers the pairwise contrasts only, not the trend
+    trend = evaluate_contrasts(params.values, cov.values, contrast_matrix(terms, [dose_trend_contrast()]),
+                               ['Linear trend'], df=df_resid, alpha=alpha)
+    pairwise = evaluate_contrasts(params.values, cov.values, contrast_matrix(terms, specs), names,
+                                  df=df_resid, alpha=alpha, adjust='bonferroni')
+    pairwise['alpha_bonferroni'] = alpha / len(pairwise)
+
+    f_stat, q, p_joint = wald_test(params.values, cov.values, contrast_matrix(
+        terms, [{term: 1.0} for term in DOSE_TERMS]), df=df_resid)
+    trend = trend.iloc[0].drop('contrast').to_dict()
+    trend.update({'f_joint': f_stat, 'df_joint': q, 'pvalue_joint': p_joint})
+
+    return trend, pairwise
+
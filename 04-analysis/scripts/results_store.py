@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+NHANES Iron Deficiency Without Anemia Study - Results Store
+===========================================================
+
+This module:
+1. Keeps every estimate the analysis stages produce in one embedded
+   SQLite database (outputs/results.sqlite), one row per run, analysis,
+   model, term, subgroup and statistic
+2. Writes a stage's tidy results into the store, replacing that
+   analysis's estimates for the current run
+3. Reads estimates back in tidy (one row per model/term/subgroup) form,
+   so the summary is built without reloading the microdata, and lists
+   past runs for comparison
+
+The run id comes from the IDWA_RUN_ID environment variable, which
+run_all_analysis.py sets once for the whole pipeline; stages run on
+their own write to the 'local' run.
+
+Author: NHANES Analysis Pipeline
+Date: 2026-10-19
+"""
+
+import os
+import sqlite3
+from datetime import datetime
+
+import pandas as pd
+
+STORE_FILE = 'results.sqlite'
+RUN_ID_ENV = 'IDWA_RUN_ID'
+DEFAULT_RUN_ID = 'local'
+KEY_COLUMNS = ['model', 'term', 'subgroup']
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    created TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS estimates (
+    run_id TEXT NOT NULL,
+    analysis TEXT NOT NULL,
+    model TEXT NOT NULL,
+    term TEXT NOT NULL,
+    subgroup TEXT NOT NULL,
+    statistic TEXT NOT NULL,
+    value REAL,
+    position INTEGER NOT NULL,
+    updated TEXT NOT NULL,
+    PRIMARY KEY (run_id, analysis, model, term, subgroup, statistic)
+);
+"""
+
+
+def current_run_id():
+    """Run id of this pipeline run (IDWA_RUN_ID, else 'local')."""
+    return os.environ.get(RUN_ID_ENV, DEFAULT_RUN_ID)
+
+
+def new_run_id():
+    """Timestamped run id for a full pipeline run."""
+    return datetime.now().strftime('%Y%m%dT%H%M%S')
+
+
+def connect(path):
+    """Open the store, creating its tables if needed."""
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA_SQL)
+    return conn
+
+
+def write_estimates(path, analysis, tidy, run_id=None):
+    """Replace an analysis's estimates for a run with the numeric columns of a tidy frame.
+
+    Key columns (model, term, subgroup) that the frame lacks are stored
+    as ''; every other column that holds numbers becomes a statistic.
+    Row order is kept. Returns the number of values written.
+    """
+    if run_id is None:
+        run_id = current_run_id()
+    now = datetime.now().isoformat(timespec='seconds')
+
+    keys = pd.DataFrame({key: tidy[key].astype(str) if key in tidy.columns else ''
+                         for key in KEY_COLUMNS}, index=tidy.index)
+    values = tidy.drop(columns=[key for key in KEY_COLUMNS if key in tidy.columns])
+    values = values.apply(pd.to_numeric, errors='coerce').astype(float)
+    long = (pd.concat([keys, values], axis=1)
+            .assign(position=range(len(tidy)))
+            .melt(id_vars=KEY_COLUMNS + ['position'], var_name='statistic')
+            .dropna(subset=['value']))
+
+    rows = [(run_id, analysis, row.model, row.term, row.subgroup, row.statistic,
+             row.value, row.position, now) for row in long.itertuples(index=False)]
+    with connect(path) as conn:
+        conn.execute("INSERT OR IGNORE INTO runs VALUES (?, ?)", (run_id, now))
+        conn.execute("DELETE FROM estimates WHERE run_id = ? AND analysis = ?", (run_id, analysis))
+        conn.executemany("INSERT INTO estimates VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    conn.close()
+    return len(rows)
+
+
+def read_estimates(path, analysis=None, run_id=None, wide=True):
+    """Estimates of one run, optionally for one analysis.
+
+    With wide=True (default) returns one row per analysis, model, term and
+    subgroup with a column per statistic, in the order written; otherwise
+    the long table with one row per statistic.
+    """
+    if run_id is None:
+        run_id = current_run_id()
+    query = "SELECT analysis, model, term, subgroup, statistic, value, position FROM estimates WHERE run_id = ?"
+    params = [run_id]
+    if analysis is not None:
+        query += " AND analysis = ?"
+        params.append(analysis)
+
+    conn = connect(path)
+    long = pd.read_sql_query(query + " ORDER BY analysis, position", conn, params=params)
+    conn.close()
+    if not wide:
+        return long.drop(columns='position')
+
+    index = ['analysis', 'position'] + KEY_COLUMNS
+    table = long.pivot(index=index, columns='statistic', values='value')
+    table.columns.name = None
+    return table.reset_index().drop(columns='position')
+
+
+def read_runs(path):
+    """Runs held in the store with their creation time and number of values."""
+    conn = connect(path)
+    runs = pd.read_sql_query(
+        "SELECT runs.run_id, runs.created, COUNT(estimates.value) AS n_values "
+        "FROM runs LEFT JOIN estimates ON estimates.run_id = runs.run_id "
+        "GROUP BY runs.run_id ORDER BY runs.created", conn)
+    conn.close()
+    return runs
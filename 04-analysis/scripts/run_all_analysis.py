@@ -8,20 +8,46 @@ This script runs the complete analysis pipeline:
 2. Descriptive statistics (02_descriptive_stats.py)
 3. Regression analysis (03_regression_analysis.py)
 4. Figure generation (04_generate_figures.py)
+5. Results summary (05_generate_summary.py)
+6. Trend analysis across cycles (06_trend_analysis.py)
+7. Sensitivity analyses (07_sensitivity_analyses.py)
+
+All stages share one run id (IDWA_RUN_ID), under which their estimates
+are kept in the results store. With --baseline, the result tables are
+then compared with a baseline run's (compare_runs.py) and the script
+exits with status 1 if any estimate drifted.
+
+Each stage writes a timing trace (wall time, CPU time and peak memory,
+per stage and per named step; see profiling.py). The runner merges them
+into outputs/pipeline_trace.json and prints a per-stage summary; with
+--profile, every stage also dumps cProfile statistics next to its trace.
 
 Author: NHANES Analysis Pipeline
 Date: 2026-01-31
 """
 
+import argparse
 import subprocess
 import sys
 import os
+import time
+
+import compare_runs
+from profiling import (PROFILE_ENV, PIPELINE_TRACE_FILE, TRACE_DIR, children_cpu_seconds,
+                       read_stage_trace, write_pipeline_trace)
+from results_store import RUN_ID_ENV, new_run_id
 
 OUTPUT_DIR = "studies/iron-deficiency-women-2026-01-31/04-analysis"
 
-def run_script(script_name):
-    """Run a Python script and capture output."""
+def run_script(script_name, run_id, profile=False):
+    """Run a Python script under the pipeline run id and capture output.
+    
+    Returns the stage's timing record: return code (None if it could not
+    be run), wall and CPU time seen by the runner and the stage's own trace.
+    """
     script_path = os.path.join(OUTPUT_DIR, "scripts", script_name)
+    stage = os.path.splitext(script_name)[0]
+    record = {'stage': stage, 'returncode': None, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'trace': None}
     
     print(f"\n{'='*70}")
     print(f"Running {script_name}...")
@@ -30,7 +56,16 @@ def run_script(script_name):
     # Set PYTHONPATH to include local packages
     env = os.environ.copy()
     env['PYTHONPATH'] = '.opencode/python-packages'
+    env[RUN_ID_ENV] = run_id
+    if profile:
+        env[PROFILE_ENV] = '1'
+    
+    # A trace left by an earlier run must not be mistaken for this one's
+    trace_path = os.path.join(OUTPUT_DIR, TRACE_DIR, f"{stage}.json")
+    if os.path.exists(trace_path):
+        os.remove(trace_path)
     
+    start, start_cpu = time.perf_counter(), children_cpu_seconds()
     try:
         result = subprocess.run(
             ['python3', script_path],
@@ -40,25 +75,54 @@ def run_script(script_name):
             timeout=300  # 5 minute timeout
         )
         
+        record['returncode'] = result.returncode
+        
         print(result.stdout)
         if result.stderr:
             print("STDERR:", result.stderr)
         
         if result.returncode != 0:
             print(f"ERROR: {script_name} failed with return code {result.returncode}")
-            return False
-        
-        print(f"✓ {script_name} completed successfully")
-        return True
+        else:
+            print(f"✓ {script_name} completed successfully")
         
     except subprocess.TimeoutExpired:
         print(f"ERROR: {script_name} timed out after 5 minutes")
-        return False
     except Exception as e:
         print(f"ERROR running {script_name}: {e}")
-        return False
+    
+    record['wall_seconds'] = time.perf_counter() - start
+    record['cpu_seconds'] = children_cpu_seconds() - start_cpu
+    record['trace'] = read_stage_trace(OUTPUT_DIR, stage)
+    return record
+
+def format_mb(value):
+    return "-" if value is None else f"{value:,.0f}"
+
+def print_timing_summary(pipeline):
+    """Per-stage wall time, CPU time and peak RSS, with each stage's slowest steps."""
+    print(f"{'Stage':<26} {'Wall (s)':>9} {'CPU (s)':>9} {'Peak RSS (MB)':>14}")
+    for record in pipeline['stages']:
+        trace = record['trace'] or {}
+        peaks = [trace[key] for key in ('peak_rss_mb', 'children_peak_rss_mb') if trace.get(key) is not None]
+        print(f"{record['stage']:<26} {record['wall_seconds']:>9.2f} {record['cpu_seconds']:>9.2f} "
+              f"{format_mb(max(peaks) if peaks else None):>14}")
+        if 'startup_seconds' in record:
+            print(f"    {'(start-up and imports)':<22} {record['startup_seconds']:>9.2f}")
+        top_level = [step for step in trace.get('steps', []) if step['parent'] is None]
+        for step in sorted(top_level, key=lambda step: -step['wall_seconds'])[:3]:
+            print(f"    {step['name']:<22} {step['wall_seconds']:>9.2f} {step['cpu_seconds']:>9.2f} "
+                  f"{format_mb(step.get('peak_rss_mb')):>14}")
+    print(f"{'Total':<26} {pipeline['wall_seconds']:>9.2f} {pipeline['cpu_seconds']:>9.2f} "
+          f"{format_mb(pipeline['peak_rss_mb']):>14}")
 
 def main():
+    parser = argparse.ArgumentParser(description='Run the complete analysis pipeline')
+    parser.add_argument('--baseline', help='table directory of a baseline run to compare the results with')
+    parser.add_argument('--profile', action='store_true',
+                        help='also dump cProfile statistics for every stage (outputs/traces/<stage>.prof)')
+    args = parser.parse_args()
+    
     print("="*70)
     print("NHANES Iron Deficiency Without Anemia - Master Analysis Script")
     print("="*70)
@@ -67,23 +131,44 @@ def main():
     print("  2. Descriptive statistics")
     print("  3. Regression analysis")
     print("  4. Figure generation")
+    print("  5. Results summary")
+    print("  6. Trend analysis")
+    print("  7. Sensitivity analyses")
     print()
     
+    run_id = os.environ.get(RUN_ID_ENV) or new_run_id()
+    print(f"Run id: {run_id}")
+    
     scripts = [
         "01_data_prep.py",
         "02_descriptive_stats.py",
         "03_regression_analysis.py",
-        "04_generate_figures.py"
+        "04_generate_figures.py",
+        "05_generate_summary.py",
+        "06_trend_analysis.py",
+        "07_sensitivity_analyses.py"
     ]
     
     success_count = 0
+    stages = []
     for script in scripts:
-        if run_script(script):
+        record = run_script(script, run_id, profile=args.profile)
+        stages.append(record)
+        if record['returncode'] == 0:
             success_count += 1
         else:
             print(f"\nStopping due to failure in {script}")
             break
     
+    # Timing and memory per stage, merged from the stage traces
+    trace_file = os.path.join(OUTPUT_DIR, "outputs", PIPELINE_TRACE_FILE)
+    pipeline = write_pipeline_trace(trace_file, run_id, stages)
+    print(f"\n{'='*70}")
+    print("Stage timings")
+    print('='*70)
+    print_timing_summary(pipeline)
+    print(f"Saved pipeline trace to: {trace_file}")
+    
     print(f"\n{'='*70}")
     print(f"Analysis Complete: {success_count}/{len(scripts)} scripts successful")
     print('='*70)
@@ -94,6 +179,17 @@ def main():
         print(f"  - Processed data: {OUTPUT_DIR}/processed_data.csv")
         print(f"  - Tables: {OUTPUT_DIR}/outputs/tables/")
         print(f"  - Figures: {OUTPUT_DIR}/outputs/figures/")
+        print(f"  - Results store: {OUTPUT_DIR}/outputs/results.sqlite (run {run_id})")
+        
+        if args.baseline:
+            print(f"\n{'='*70}")
+            print(f"Comparing results with baseline: {args.baseline}")
+            print('='*70)
+            report = os.path.join(OUTPUT_DIR, "outputs", "run_comparison.csv")
+            if compare_runs.main([args.baseline, compare_runs.TABLES_DIR, '--report', report]) != 0:
+                print("\n✗ Results differ from the baseline run.")
+                return 1
+            print("\n✓ Results match the baseline run.")
         return 0
     else:
         print("\n✗ Some analysis steps failed. Check output above for details.")
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+NHANES Iron Deficiency Without Anemia Study - Processed Data Schema
+===================================================================
+
+This module:
+1. Declares the processed dataset written by 01_data_prep.py: column
+   names, dtypes, whether missing values are allowed and the levels of
+   every categorical column
+2. Holds the canonical category labels, so every stage looks up the
+   same strings the data carries
+3. Validates a dataset against the schema in one vectorized pass and
+   reports every problem at once
+4. Writes and reads the processed dataset through that check, returning
+   categorical columns as Categorical dtypes with the declared levels
+
+A label that does not match the declared levels fails at the stage
+boundary instead of silently producing an empty subgroup.
+
+Author: NHANES Analysis Pipeline
+Date: 2026-10-19
+"""
+
+import pandas as pd
+
+from survey_weights import CYCLE_TABLE
+
+# Canonical category labels, in reporting order
+UNKNOWN = 'Unknown'
+AGE_GROUPS = ['18-25', '26-30', '31-35', '36-40', '41-45']
+RACE_CATEGORIES = ['Mexican American', 'Other Hispanic', 'Non-Hispanic White',
+                   'Non-Hispanic Black', 'Other Race']
+POVERTY_CATEGORIES = ['Low (<1.3)', 'Medium (1.3-3.5)', 'High (≥3.5)']
+IRON_DOSE_CATEGORIES = ['None', 'Low', 'Moderate', 'High']
+
+# Processed dataset: column -> {'dtype', 'levels' (categories only),
+# 'nullable' (default True), 'required' (default True)}. Columns from lazy
+# components (see nhanes_components.py) are not required, since
+# 01_data_prep.py only loads them for the analyses that need them; when
+# present they are still checked. Neither is the interview weight WTINT2YR,
+# which older extracts of the DEMO files lack. Columns not listed here pass
+# unchecked.
+PROCESSED_SCHEMA = {
+    'SEQN': {'dtype': 'float', 'nullable': False},
+    'cycle': {'dtype': 'category', 'levels': list(CYCLE_TABLE.index), 'nullable': False},
+    'cycle_year': {'dtype': 'category', 'levels': list(CYCLE_TABLE['cycle_year']), 'nullable': False},
+    'RIAGENDR': {'dtype': 'float', 'nullable': False},
+    'RIDAGEYR': {'dtype': 'float', 'nullable': False},
+    'RIDRETH1': {'dtype': 'float'},
+    'INDFMPIR': {'dtype': 'float'},
+    'WTINT2YR': {'dtype': 'float', 'required': False},
+    'WTMEC2YR': {'dtype': 'float', 'nullable': False},
+    'SDMVSTRA': {'dtype': 'float', 'nullable': False},
+    'SDMVPSU': {'dtype': 'float', 'nullable': False},
+    'RIDEXPRG': {'dtype': 'float'},
+    'LBXFER': {'dtype': 'float', 'nullable': False},
+    'LBXHGB': {'dtype': 'float', 'nullable': False},
+    'DSQTIRON': {'dtype': 'float'},
+    'BMXBMI': {'dtype': 'float'},
+    'LBXIRN': {'dtype': 'float', 'required': False},
+    'LBXTIB': {'dtype': 'float', 'required': False},
+    'LBDPCT': {'dtype': 'float', 'required': False},
+    'LBDTIB': {'dtype': 'float', 'required': False},
+    'LBXCRP': {'dtype': 'float', 'required': False},
+    'crp_mg_l': {'dtype': 'float', 'required': False},
+    'LBXHSCRP': {'dtype': 'float', 'required': False},
+    'age_eligible': {'dtype': 'bool', 'nullable': False},
+    'female': {'dtype': 'bool', 'nullable': False},
+    'not_pregnant': {'dtype': 'bool', 'nullable': False},
+    'has_ferritin': {'dtype': 'bool', 'nullable': False},
+    'has_hemoglobin': {'dtype': 'bool', 'nullable': False},
+    'iron_deficient': {'dtype': 'bool', 'nullable': False},
+    'not_anemic': {'dtype': 'bool', 'nullable': False},
+    'IDWA': {'dtype': 'bool', 'nullable': False},
+    'iron_supplement': {'dtype': 'int', 'levels': [0, 1], 'nullable': False},
+    'iron_dose': {'dtype': 'category', 'levels': IRON_DOSE_CATEGORIES, 'nullable': False},
+    'log_ferritin': {'dtype': 'float', 'nullable': False},
+    'weight_adjusted': {'dtype': 'float', 'nullable': False},
+    'weight_fetib': {'dtype': 'float', 'required': False},
+    'race_category': {'dtype': 'category', 'levels': RACE_CATEGORIES + [UNKNOWN], 'nullable': False},
+    'age_group': {'dtype': 'category', 'levels': AGE_GROUPS, 'nullable': False},
+    'poverty_category': {'dtype': 'category', 'levels': POVERTY_CATEGORIES + [UNKNOWN],
+                         'nullable': False},
+}
+
+
+def _examples(values, limit=5):
+    return ', '.join(repr(v) if isinstance(v, str) else str(v) for v in pd.unique(values)[:limit])
+
+
+def validate_processed_data(df, schema=None):
+    """Check a dataset against the schema; raise ValueError listing every problem."""
+    if schema is None:
+        schema = PROCESSED_SCHEMA
+
+    problems = [f"missing column {column}" for column, spec in schema.items()
+                if spec.get('required', True) and column not in df.columns]
+    for column, spec in schema.items():
+        if column not in df.columns:
+            continue
+        values = df[column]
+        present = values.notna()
+
+        if spec['dtype'] in ('float', 'int'):
+            numeric = pd.to_numeric(values, errors='coerce')
+            bad = present & numeric.isna()
+            if spec['dtype'] == 'int':
+                bad |= numeric.notna() & (numeric % 1 != 0)
+            values = numeric.where(~bad)
+        elif spec['dtype'] == 'bool':
+            bad = present & ~values.isin([True, False])
+        else:
+            bad = pd.Series(False, index=df.index)
+        if bad.any():
+            problems.append(f"{column}: {int(bad.sum())} values are not {spec['dtype']} "
+                            f"(e.g. {_examples(df[column][bad])})")
+
+        if 'levels' in spec:
+            undeclared = present & ~bad & ~values.isin(spec['levels'])
+            if undeclared.any():
+                problems.append(f"{column}: {int(undeclared.sum())} values outside the declared "
+                                f"levels (e.g. {_examples(values[undeclared])})")
+
+        if not spec.get('nullable', True) and not present.all():
+            problems.append(f"{column}: {int((~present).sum())} missing values")
+
+    if problems:
+        raise ValueError("Processed data does not match the schema:\n  " + "\n  ".join(problems))
+
+
+def apply_schema_dtypes(df, schema=None):
+    """Cast declared columns to their dtypes, with categories as Categorical."""
+    if schema is None:
+        schema = PROCESSED_SCHEMA
+
+    dtypes = {}
+    for column, spec in schema.items():
+        if column not in df.columns:
+            continue
+        if spec['dtype'] == 'category':
+            dtypes[column] = pd.CategoricalDtype(spec['levels'])
+        elif not (spec['dtype'] == 'int' and df[column].isna().any()):
+            dtypes[column] = spec['dtype']
+    return df.astype(dtypes)
+
+
+def write_processed_data(df, path):
+    """Validate the processed dataset and write it as CSV."""
+    validate_processed_data(df)
+    df.to_csv(path, index=False)
+
+
+def read_processed_data(path):
+    """Read the processed dataset, validate it and apply the schema dtypes.
+
+    Only empty fields are read as missing, so labels such as 'None' stay
+    category levels.
+    """
+    df = pd.read_csv(path, keep_default_na=False, na_values=[''])
+    validate_processed_data(df)
+    return apply_schema_dtypes(df)
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+NHANES Iron Deficiency Without Anemia Study - Sensitivity Analysis Suite
+========================================================================
+
+This module:
+1. Declares each sensitivity analysis (SA1-SA5) as data: a row-filter
+   expression, derived-variable overrides and the columns it requires
+2. Applies each analysis as a mask over the shared analytic frame (domain
+   estimation) instead of re-running data preparation
+3. Runs all analyses concurrently in a process pool; workers share the
+   frame loaded once by the parent
+4. Re-estimates IDWA prevalence, the fully adjusted supplement-ferritin
+   association and the supplement-IDWA odds ratio for every analysis
+
+Expressions are evaluated with DataFrame.eval, so specifications are plain
+strings that can be passed to worker processes.
+
+Author: NHANES Analysis Pipeline
+Date: 2026-10-19
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import numpy as np
+
+from regression_models import MODEL3_COVARIATES, cycle_dummy_columns, weighted_least_squares
+from survey_design import SurveyDesign
+from survey_logistic import fit_survey_logistic
+from survey_weights import CYCLE_TABLE
+from threshold_sweep import FERRITIN_CUTOFF, HEMOGLOBIN_CUTOFF, SENSITIVITY_FERRITIN_CUTOFF
+
+CRP_THRESHOLD = 5.0     # mg/L
+MAX_IRON_DOSE = 100.0   # mg/day
+
+# Fixed sensitivity analyses; SA5 rows are added per cycle by build_sensitivity_specs
+SENSITIVITY_SPECS = [
+    {
+        'name': 'Primary',
+        'label': f'Primary analysis (ferritin <{FERRITIN_CUTOFF:g} ng/mL)',
+    },
+    {
+        'name': 'SA1',
+        'label': f'Ferritin <{SENSITIVITY_FERRITIN_CUTOFF:g} ng/mL',
+        'overrides': {
+            'iron_deficient': f'LBXFER < {SENSITIVITY_FERRITIN_CUTOFF}',
+            'IDWA': f'(LBXFER < {SENSITIVITY_FERRITIN_CUTOFF}) & (LBXHGB >= {HEMOGLOBIN_CUTOFF})',
+        },
+    },
+    {
+        'name': 'SA2',
+        'label': f'Excluding CRP >{CRP_THRESHOLD:g} mg/L',
+        'mask': f'crp_mg_l <= {CRP_THRESHOLD}',
+        'requires': ['crp_mg_l'],
+    },
+    {
+        'name': 'SA3',
+        'label': 'Confirmed non-pregnant only',
+        'mask': 'RIDEXPRG == 2',
+    },
+    {
+        'name': 'SA4',
+        'label': f'Excluding iron dose >{MAX_IRON_DOSE:g} mg/day',
+        'mask': f'~(DSQTIRON > {MAX_IRON_DOSE})',
+    },
+]
+
+# Frame shared with worker processes (set before the pool starts)
+_FRAME = None
+
+
+def build_sensitivity_specs(df):
+    """Return the fixed analyses plus one SA5 analysis per cycle in the data."""
+    specs = list(SENSITIVITY_SPECS)
+    for cycle in [c for c in CYCLE_TABLE.index if c in set(df['cycle'])]:
+        specs.append({
+            'name': f'SA5_{cycle}',
+            'label': f"Cycle {CYCLE_TABLE.loc[cycle, 'cycle_year']}",
+            'mask': f"cycle == '{cycle}'",
+        })
+    return specs
+
+
+def _init_worker(df):
+    global _FRAME
+    _FRAME = df
+
+
+def _domain_prevalence(y, design):
+    """Weighted prevalence with its linearized design SE within a domain."""
+    total = design.weight_total
+    if total <= 0:
+        return np.nan, np.nan
+    prevalence = np.dot(design.weights, y) / total
+    z = design.weights * (y - prevalence) / total
+    return prevalence, np.sqrt(design.variance_of_totals(z))
+
+
+def run_sensitivity_spec(spec, df=None):
+    """Run one sensitivity analysis against the shared frame."""
+    if df is None:
+        df = _FRAME
+
+    row = {'analysis': spec['name'], 'label': spec['label']}
+    missing = [col for col in spec.get('requires', []) if col not in df.columns]
+    if missing:
+        row['status'] = f"skipped: missing {', '.join(missing)}"
+        return row
+
+    overrides = spec.get('overrides', {})
+    data = df.assign(**{col: df.eval(expr) for col, expr in overrides.items()}) if overrides else df
+    if spec.get('mask'):
+        mask = data.eval(spec['mask']).fillna(False).to_numpy(dtype=bool)
+    else:
+        mask = np.ones(len(data), dtype=bool)
+
+    design = SurveyDesign.from_dataframe(data).domain(mask)
+    idwa = data['IDWA'].astype(float).to_numpy()
+    row['n'] = design.n_valid
+    row['n_idwa'] = int(idwa[design.valid].sum())
+    row['idwa_prevalence'], row['idwa_se'] = _domain_prevalence(idwa, design)
+
+    # Covariates that vary within the domain (e.g. cycle dummies drop out of SA5)
+    covariates = [col for col in MODEL3_COVARIATES + cycle_dummy_columns(data)
+                  if data.loc[mask, col].nunique() > 1]
+
+    # Fully adjusted linear model: log ferritin ~ supplement use
+    X = data.loc[mask, [c for c in covariates if not c.startswith('cycle_')]]
+    res, X_clean, y_clean = weighted_least_squares(
+        X, data.loc[mask, 'log_ferritin'].values, data.loc[mask, 'weight_adjusted'].values)
+    if res is not None and 'supp_any' in res.params.index:
+        ci = res.conf_int().loc['supp_any']
+        row.update({
+            'ferritin_coef': res.params['supp_any'],
+            'ferritin_ci_low': ci[0],
+            'ferritin_ci_high': ci[1],
+            'ferritin_pvalue': res.pvalues['supp_any'],
+        })
+
+    # Logistic model: IDWA ~ supplement use + covariates + cycle
+    fit = fit_survey_logistic(data[covariates], idwa, design)
+    if fit is not None and 'supp_any' in fit['table'].index:
+        supp = fit['table'].loc['supp_any']
+        row.update({
+            'idwa_or': supp['odds_ratio'],
+            'idwa_or_ci_low': supp['or_ci_low'],
+            'idwa_or_ci_high': supp['or_ci_high'],
+            'idwa_or_pvalue': supp['pvalue'],
+        })
+
+    row['status'] = 'ok'
+    return row
+
+
+def run_sensitivity_suite(df, specs=None, max_workers=None):
+    """Run every sensitivity analysis concurrently and return one row per analysis.
+
+    With the fork start method workers inherit the frame from the parent;
+    otherwise it is sent once per worker through the pool initializer.
+    """
+    global _FRAME
+    if specs is None:
+        specs = build_sensitivity_specs(df)
+    if max_workers is None:
+        max_workers = min(len(specs), os.cpu_count() or 1)
+
+    _FRAME = df
+    if 'fork' in multiprocessing.get_all_start_methods():
+        executor = ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context('fork'))
+    else:
+        executor = ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=(df,))
+
+    with executor:
+        rows = list(executor.map(run_sensitivity_spec, specs))
+
+    return pd.DataFrame(rows)
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+NHANES Iron Deficiency Without Anemia Study - Survey Design Index
+=================================================================
+
+This module:
+1. Builds a SurveyDesign once from the pooled weight, strata and PSUs
+2. Caches the valid-weight mask, normalized weights and PSU structure
+3. Provides the weighted estimators used by the descriptive statistics
+4. Computes Taylor-linearized variances and covariances of weighted totals
+5. Computes weighted quantiles with Woodruff confidence intervals, and
+   design-free point quantiles by the same rule (Figure 2 box plots)
+
+Subgroup estimates use domain designs (weights zeroed outside the
+subgroup) so the full stratum/PSU structure is kept for variance
+estimation.
+
+Author: NHANES Analysis Pipeline
+Date: 2026-10-19
+"""
+
+import copy
+
+import pandas as pd
+import numpy as np
+from scipy import sparse
+from scipy import stats
+
+
+def stratified_psu_deviations(totals, psu_stratum):
+    """Centre PSU totals (n_psu, k) within strata.
+
+    Returns (deviations, factor): each PSU's deviation from its stratum
+    mean and its n_h / (n_h - 1) scaling (0 for single-PSU strata). The
+    variance and covariance estimators share this step.
+    """
+    n_strata = psu_stratum.max() + 1 if len(psu_stratum) else 0
+    n_h = np.bincount(psu_stratum, minlength=n_strata).astype(float)
+
+    stratum_sums = np.zeros((n_strata, totals.shape[1]))
+    np.add.at(stratum_sums, psu_stratum, totals)
+    stratum_means = stratum_sums / np.maximum(n_h, 1)[:, None]
+
+    deviations = totals - stratum_means[psu_stratum]
+    factor = np.where(n_h > 1, n_h / np.maximum(n_h - 1, 1), 0.0)[psu_stratum]
+    return deviations, factor
+
+
+def stratified_psu_variance(psu_totals, psu_stratum):
+    """Variance of a total from PSU-level totals (with-replacement design).
+
+    psu_totals has one row per PSU; any trailing dimensions are treated as
+    separate statistics. Strata with a single PSU contribute nothing.
+    Equals the diagonal of stratified_psu_covariance without forming the
+    full matrix.
+    """
+    psu_totals = np.asarray(psu_totals, dtype=float)
+    shape = psu_totals.shape[1:]
+    totals = psu_totals.reshape(len(psu_totals), -1)
+
+    deviations, factor = stratified_psu_deviations(totals, psu_stratum)
+    variance = (factor[:, None] * deviations ** 2).sum(axis=0)
+
+    return variance.reshape(shape) if shape else variance[0]
+
+
+def stratified_psu_covariance(psu_totals, psu_stratum):
+    """Covariance matrix of several totals from PSU-level totals (n_psu, k)."""
+    totals = np.asarray(psu_totals, dtype=float)
+    if totals.ndim == 1:
+        totals = totals[:, None]
+
+    deviations, factor = stratified_psu_deviations(totals, psu_stratum)
+    return (deviations * factor[:, None]).T @ deviations
+
+
+class SurveyDesign:
+    """Survey design index shared by all weighted estimators."""
+
+    def __init__(self, weights, strata=None, psu=None):
+        weights = np.asarray(weights, dtype=float)
+        self.n = len(weights)
+
+        # Valid-weight mask and weights with invalid rows zeroed
+        self.valid = ~np.isnan(weights) & (weights > 0)
+        self.weights = np.where(self.valid, weights, 0.0)
+        self._update_totals()
+
+        # Stratum and PSU codes (PSUs are nested within strata)
+        if strata is None:
+            strata = np.zeros(self.n)
+        if psu is None:
+            psu = np.arange(self.n)
+        strata = pd.Series(np.asarray(strata)).fillna(-1).values
+        psu = pd.Series(np.asarray(psu)).fillna(-1).values
+
+        self.stratum_codes, self.stratum_labels = pd.factorize(strata, sort=True)
+        pairs = pd.MultiIndex.from_arrays([self.stratum_codes, psu])
+        self.psu_codes, psu_labels = pd.factorize(pairs, sort=True)
+        self.psu_stratum = np.asarray(psu_labels.get_level_values(0), dtype=int)
+
+        self.n_strata = len(self.stratum_labels)
+        self.n_psu = len(psu_labels)
+        self.degrees_of_freedom = max(self.n_psu - self.n_strata, 1)
+
+        # Row -> PSU incidence matrix for PSU-level totals
+        self._psu_matrix = sparse.csr_matrix(
+            (np.ones(self.n), (self.psu_codes, np.arange(self.n))),
+            shape=(self.n_psu, self.n),
+        )
+        self.psu_weight_totals = self.psu_totals(self.weights)
+
+        # Cumulative weight sums are not cached here: they depend on each
+        # variable's sort order and missing values, so weighted_quantiles
+        # builds them once per call from its single sort per column
+
+    @classmethod
+    def from_dataframe(cls, df, weight_col='weight_adjusted',
+                       strata_col='SDMVSTRA', psu_col='SDMVPSU'):
+        """Build the design from the processed dataset columns."""
+        return cls(
+            df[weight_col].values,
+            df[strata_col].values if strata_col in df.columns else None,
+            df[psu_col].values if psu_col in df.columns else None,
+        )
+
+    def _update_totals(self):
+        self.n_valid = int(self.valid.sum())
+        self.weight_total = self.weights.sum()
+        if self.weight_total > 0:
+            self.normalized_weights = self.weights / self.weight_total
+        else:
+            self.normalized_weights = np.zeros(self.n)
+
+    def domain(self, mask):
+        """Return the design restricted to a subgroup (domain estimation)."""
+        mask = np.asarray(mask, dtype=bool)
+        sub = copy.copy(self)
+        sub.valid = self.valid & mask
+        sub.weights = np.where(sub.valid, self.weights, 0.0)
+        sub._update_totals()
+        sub.psu_weight_totals = sub.psu_totals(sub.weights)
+        return sub
+
+    def observed(self, x):
+        """Return (x with NaN zeroed, weights, n) for the non-missing rows."""
+        x = np.asarray(x, dtype=float)
+        missing = np.isnan(x)
+        if not missing.any():
+            return x, self.weights, self.n_valid
+        w = np.where(missing, 0.0, self.weights)
+        return np.where(missing, 0.0, x), w, int((self.valid & ~missing).sum())
+
+    def psu_totals(self, scores):
+        """Sum row-level scores (n,) or (n, k) within each PSU."""
+        return self._psu_matrix @ np.asarray(scores, dtype=float)
+
+    def variance_of_totals(self, scores):
+        """Linearized variance of the weighted total of each score column."""
+        return stratified_psu_variance(self.psu_totals(scores), self.psu_stratum)
+
+    def covariance_of_totals(self, scores):
+        """Linearized covariance matrix of the weighted totals of (n, k) scores."""
+        return stratified_psu_covariance(self.psu_totals(scores), self.psu_stratum)
+
+
+def weighted_mean(x, design):
+    """Calculate weighted mean."""
+    x, w, n = design.observed(x)
+    if n == 0:
+        return np.nan
+    return np.dot(w, x) / w.sum()
+
+
+def weighted_std(x, design):
+    """Calculate weighted standard deviation."""
+    x, w, n = design.observed(x)
+    if n < 2:
+        return np.nan
+
+    mean = np.dot(w, x) / w.sum()
+    variance = np.dot(w, (x - mean) ** 2) / w.sum()
+    variance = variance * n / (n - 1)
+    return np.sqrt(variance)
+
+
+def weighted_proportion(x, design):
+    """Calculate weighted proportion."""
+    x, w, n = design.observed(x)
+    if n == 0:
+        return np.nan, np.nan
+
+    prop = np.dot(w, x) / w.sum()
+
+    if n > 1:
+        se = np.sqrt(prop * (1 - prop) / n)
+    else:
+        se = np.nan
+
+    return prop, se
+
+
+def _lookup_quantiles(sorted_x, cdf, probs):
+    """Invert sorted weighted CDFs column by column in one searchsorted call.
+
+    Columns are stacked into a single increasing array by offsetting each
+    column's CDF (which lies in [0, 1]) by 2 * column index.
+    """
+    n, k = sorted_x.shape
+    offset = 2.0 * np.arange(k)
+    stacked = (cdf + offset).T.ravel()
+    targets = np.clip(probs, 0.0, 1.0) + offset
+    positions = np.searchsorted(stacked, targets.ravel(), side='left')
+    rows = np.clip(positions.reshape(targets.shape) - n * np.arange(k), 0, n - 1)
+    return sorted_x[rows, np.arange(k)]
+
+
+def _sorted_cdf(X, W):
+    """Sort each column of X once and return it with its weighted CDF.
+
+    Also returns the column weight totals (1 for empty columns) and the
+    mask of empty columns. NaN sorts last and must carry zero weight.
+    """
+    totals = W.sum(axis=0)
+    empty = totals <= 0
+    safe_totals = np.where(empty, 1.0, totals)
+    order = np.argsort(X, axis=0, kind='stable')
+    sorted_x = np.take_along_axis(X, order, axis=0)
+    cdf = np.cumsum(np.take_along_axis(W, order, axis=0), axis=0) / safe_totals
+    return sorted_x, cdf, safe_totals, empty
+
+
+def weighted_point_quantiles(x, weights, probs):
+    """Weighted quantiles of x without a design (point estimates only).
+
+    Uses the rule of weighted_quantiles; values that are missing or have
+    missing or non-positive weights are ignored.
+    """
+    x = np.asarray(x, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    keep = ~np.isnan(x) & ~np.isnan(weights) & (weights > 0)
+    sorted_x, cdf, _, empty = _sorted_cdf(x[keep, None], weights[keep, None])
+    probs = np.asarray(probs, dtype=float)
+    if empty[0]:
+        return np.full(len(probs), np.nan)
+    return _lookup_quantiles(sorted_x, cdf, probs[:, None])[:, 0]
+
+
+def weighted_quantiles(X, design, probs=(0.25, 0.5, 0.75), alpha=0.05):
+    """Weighted quantiles of each column of X with Woodruff intervals.
+
+    Each column is sorted once; the quantile for probability p is the
+    smallest value whose cumulative weight share reaches p. Confidence
+    intervals invert the weighted CDF at p -/+ t * SE(F(q)), with SE from
+    the linearized design variance.
+
+    Returns a dict of arrays shaped (len(probs), n_columns): 'quantile',
+    'ci_low', 'ci_high' and 'se' (SE on the probability scale).
+    """
+    X = np.asarray(X, dtype=float)
+    if X.ndim == 1:
+        X = X[:, None]
+    probs = np.asarray(probs, dtype=float)
+    n, k = X.shape
+    m = len(probs)
+
+    missing = np.isnan(X)
+    W = np.where(missing, 0.0, design.weights[:, None])
+
+    # Single sort per column (NaN sorts last and carries zero weight)
+    sorted_x, cdf, safe_totals, empty = _sorted_cdf(X, W)
+
+    p_grid = np.broadcast_to(probs[:, None], (m, k))
+    q = _lookup_quantiles(sorted_x, cdf, p_grid)
+
+    # Linearized variance of F(q) for every (prob, column) pair at once
+    below = X[:, None, :] <= q[None, :, :]
+    share = (W[:, None, :] * below).sum(axis=0) / safe_totals
+    scores = W[:, None, :] * (below - share[None, :, :]) / safe_totals
+    se = np.sqrt(design.variance_of_totals(scores.reshape(n, m * k))).reshape(m, k)
+
+    t_crit = stats.t.ppf(1 - alpha / 2, design.degrees_of_freedom)
+    ci_low = _lookup_quantiles(sorted_x, cdf, p_grid - t_crit * se)
+    ci_high = _lookup_quantiles(sorted_x, cdf, p_grid + t_crit * se)
+
+    result = {'quantile': q, 'ci_low': ci_low, 'ci_high': ci_high, 'se': se}
+    for values in result.values():
+        values[:, empty] = np.nan
+    return result
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+NHANES Iron Deficiency Without Anemia Study - Survey Logistic Regression
+========================================================================
+
+This module:
+1. Fits weighted logistic regression by vectorized IRLS (Newton-Raphson)
+2. Accepts warm starts so related specifications converge in few steps
+3. Computes design-based sandwich standard errors: the bread is the
+   inverse weighted information, the meat the linearized covariance of
+   the PSU-level score totals
+4. Fits a sequence of specifications, warm-starting each from the last
+
+Complete-case rows are selected per model; dropped rows keep their PSU in
+the design, so variances follow domain estimation.
+
+Author: NHANES Analysis Pipeline
+Date: 2026-10-19
+"""
+
+import pandas as pd
+import numpy as np
+from scipy import stats
+from scipy.special import expit
+
+from profiling import step
+
+
+def irls(X, y, w, start=None, max_iter=50, tol=1e-8):
+    """Fit weighted logistic regression on arrays by IRLS.
+
+    Returns (beta, information, converged, iterations); information is the
+    weighted Fisher information X' diag(w mu (1 - mu)) X at beta.
+    """
+    beta = np.zeros(X.shape[1]) if start is None else np.array(start, dtype=float)
+
+    converged = False
+    for iteration in range(1, max_iter + 1):
+        mu = expit(X @ beta)
+        information = (X * (w * mu * (1 - mu))[:, None]).T @ X
+        delta = np.linalg.solve(information, X.T @ (w * (y - mu)))
+        beta = beta + delta
+        if np.max(np.abs(delta)) < tol:
+            converged = True
+            break
+
+    mu = expit(X @ beta)
+    information = (X * (w * mu * (1 - mu))[:, None]).T @ X
+    return beta, information, converged, iteration
+
+
+def fit_survey_logistic(X, y, design, start=None, alpha=0.05, max_iter=50, tol=1e-8):
+    """Fit a survey-weighted logistic regression of y on the columns of X.
+
+    X is a DataFrame (an intercept is added); start may be a Series of
+    initial coefficients by term, missing terms start at 0. Returns None
+    when fewer than 10 complete cases remain or the fit is singular.
+    """
+    names = ['const'] + list(X.columns)
+    X_all = np.column_stack([np.ones(len(X)), X.to_numpy(dtype=float)])
+    y = np.asarray(y, dtype=float)
+
+    mask = design.valid & ~np.isnan(y) & ~np.isnan(X_all).any(axis=1)
+    n = int(mask.sum())
+    if n < 10:
+        return None
+
+    X_fit = X_all[mask]
+    y_fit = y[mask]
+    w_fit = design.weights[mask]
+
+    if start is not None:
+        start = pd.Series(start).reindex(names).fillna(0.0).values
+
+    try:
+        beta, information, converged, iterations = irls(X_fit, y_fit, w_fit, start, max_iter, tol)
+        bread = np.linalg.inv(information)
+    except np.linalg.LinAlgError as e:
+        print(f"Error fitting logistic model: {e}")
+        return None
+
+    # Sandwich covariance from PSU totals of the score contributions
+    scores = np.zeros((design.n, len(names)))
+    scores[mask] = X_fit * (w_fit * (y_fit - expit(X_fit @ beta)))[:, None]
+    meat = design.covariance_of_totals(scores)
+    cov = bread @ meat @ bread
+
+    df_design = design.degrees_of_freedom
+    se = np.sqrt(np.diag(cov))
+    t_stat = beta / se
+    p_values = 2 * stats.t.sf(np.abs(t_stat), df_design)
+    t_crit = stats.t.ppf(1 - alpha / 2, df_design)
+
+    table = pd.DataFrame({
+        'coef': beta,
+        'se': se,
+        't': t_stat,
+        'pvalue': p_values,
+        'ci_low': beta - t_crit * se,
+        'ci_high': beta + t_crit * se,
+        'odds_ratio': np.exp(beta),
+        'or_ci_low': np.exp(beta - t_crit * se),
+        'or_ci_high': np.exp(beta + t_crit * se),
+    }, index=pd.Index(names, name='term'))
+
+    return {
+        'params': table['coef'],
+        'cov': pd.DataFrame(cov, index=names, columns=names),
+        'table': table,
+        'n': n,
+        'df': df_design,
+        'converged': converged,
+        'iterations': iterations,
+    }
+
+
+def fit_logistic_models(df, outcome, specs, design, alpha=0.05):
+    """Fit several specifications of the same outcome with warm starts.
+
+    specs maps a model name to its list of predictor columns. Each fit
+    starts from the previous model's coefficients for the terms they share.
+    """
+    y = df[outcome].astype(float).values
+    fits = {}
+    start = None
+    for name, columns in specs.items():
+        with step(f'fit {name}'):
+            fit = fit_survey_logistic(df[columns], y, design, start=start, alpha=alpha)
+        fits[name] = fit
+        if fit is not None:
+            start = fit['params']
+    return fits
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+NHANES Iron Deficiency Without Anemia Study - Survey Weight Construction
+========================================================================
+
+This module:
+1. Holds the NHANES cycle lookup table (letter, survey years, cycle length)
+2. Looks up the cycles and weight variable of each registered component
+3. Picks the examination or subsample weight an analysis needs
+4. Builds pooled weights from the cycles that actually contribute data
+
+Pooled weights follow the NCHS guidance: each 2-year weight is multiplied
+by that cycle's share of the total survey years contributed by the
+components in the analysis. For 2-year cycles this is WTMEC2YR / (number
+of contributing cycles).
+
+Author: NHANES Analysis Pipeline
+Date: 2026-10-19
+"""
+
+import pandas as pd
+
+from nhanes_components import NHANES_COMPONENTS
+
+# Cycle lookup table: one row per NHANES cycle letter
+CYCLE_TABLE = pd.DataFrame(
+    [
+        ('D', '2005-2006', 2.0),
+        ('E', '2007-2008', 2.0),
+        ('F', '2009-2010', 2.0),
+        ('G', '2011-2012', 2.0),
+        ('H', '2013-2014', 2.0),
+        ('I', '2015-2016', 2.0),
+        ('J', '2017-2018', 2.0),
+        ('L', '2021-2022', 2.0),
+    ],
+    columns=['cycle', 'cycle_year', 'n_years'],
+).set_index('cycle')
+
+CYCLES = CYCLE_TABLE['cycle_year'].to_dict()
+
+# Cycles and weight variable of each component, from the component registry.
+# Interview-only components use WTINT2YR, examination components WTMEC2YR,
+# and fasting subsample components (e.g. GLU, TRIGLY) must declare WTSAF2YR.
+COMPONENT_CYCLES = {prefix: spec['cycles'] for prefix, spec in NHANES_COMPONENTS.items()}
+COMPONENT_WEIGHTS = {prefix: spec['weight'] for prefix, spec in NHANES_COMPONENTS.items()}
+
+# Weights from the smallest subsample in an analysis take precedence
+WEIGHT_PRIORITY = ['WTINT2YR', 'WTMEC2YR', 'WTSAF2YR']
+
+# Pooled weight columns written to the processed dataset and the
+# components each one is built from
+POOLED_WEIGHTS = {
+    'weight_adjusted': ['DEMO', 'FERTIN', 'CBC'],
+    'weight_fetib': ['DEMO', 'FERTIN', 'CBC', 'FETIB'],
+}
+
+
+def select_weight_variable(components):
+    """Return the weight variable for the most restrictive component."""
+    weights = [COMPONENT_WEIGHTS.get(prefix, 'WTMEC2YR') for prefix in components]
+    return max(weights, key=WEIGHT_PRIORITY.index)
+
+
+def contributing_cycles(components, available=None):
+    """Return cycles (in survey order) in which every component has data."""
+    if available is None:
+        available = COMPONENT_CYCLES
+
+    contributing = set(CYCLE_TABLE.index)
+    for prefix in components:
+        contributing &= set(available.get(prefix, []))
+
+    return [cycle for cycle in CYCLE_TABLE.index if cycle in contributing]
+
+
+def cycle_weight_factors(cycles):
+    """Return the pooling factor for each cycle as a Series indexed by cycle."""
+    n_years = CYCLE_TABLE.loc[list(cycles), 'n_years']
+    return n_years / n_years.sum()
+
+
+def pooled_weight(df, components, available=None, cycle_col='cycle'):
+    """Build the pooled weight for an analysis using the given components.
+
+    Rows from cycles that do not contribute data for every component get
+    NaN, so they drop out of any weighted estimate.
+    """
+    weight_var = select_weight_variable(components)
+    if weight_var not in df.columns or df[weight_var].isna().all():
+        raise KeyError(f"Weight variable {weight_var} not found in data")
+
+    present = set(df[cycle_col].dropna().unique())
+    cycles = [c for c in contributing_cycles(components, available) if c in present]
+    factors = cycle_weight_factors(cycles)
+
+    return df[weight_var] * df[cycle_col].map(factors)
+
+
+def add_pooled_weights(df, available=None, specs=None, cycle_col='cycle'):
+    """Add every pooled weight column in `specs` to the dataset."""
+    if specs is None:
+        specs = POOLED_WEIGHTS
+
+    present = set(df[cycle_col].dropna().unique())
+    for column, components in specs.items():
+        cycles = [c for c in contributing_cycles(components, available) if c in present]
+        weight_var = select_weight_variable(components)
+        df[column] = pooled_weight(df, components, available, cycle_col)
+        print(f"{column}: {weight_var} pooled over {len(cycles)} cycles "
+              f"({', '.join(cycles)}) from {'+'.join(components)}")
+
+    return df
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+NHANES Iron Deficiency Without Anemia Study - Table Renderer
+============================================================
+
+This module:
+1. Renders a tidy result DataFrame through a layout spec into LaTeX,
+   Markdown and a formatted CSV in one pass, so tables need no
+   hand-written formatting code
+2. Formats cells with named formatters (estimate with CI and p-value,
+   percent (SE), mean (SD), median [IQR], counts, ...)
+3. Rewrites an output file only when its contents changed
+
+A layout is a dict:
+    caption, label, note   plain-text caption, LaTeX label and footnote
+    stub_header            header of the row-label column
+    row_key                tidy column identifying table rows (default 'term')
+    column_key             tidy column identifying table columns, for tables
+                           with one tidy row per cell (optional)
+    columns                list of {'header': str or list of header lines,
+                           'key': column_key value, 'format': formatter name}
+    rows                   list of {'key', 'label', 'format', 'indent', 'bold',
+                           'cells'}, {'section': label} or {'rule': True};
+                           'cells' gives literal cell text (None to format)
+    missing                text for cells without a value (default '---')
+
+Labels, headers and notes are plain text (Unicode allowed) and are
+escaped for each output format; 'latex' overrides a label in LaTeX only.
+
+Author: NHANES Analysis Pipeline
+Date: 2026-10-19
+"""
+
+import io
+import os
+
+import pandas as pd
+import numpy as np
+
+# Symbols that pdflatex cannot typeset directly in text mode (Unicode
+# through inputenc; < and > without T1 font encoding)
+LATEX_SYMBOLS = {
+    '<': r'$<$',
+    '>': r'$>$',
+    '≥': r'$\geq$',
+    '≤': r'$\leq$',
+    '²': r'\textsuperscript{2}',
+    'µ': r'$\mu$',
+    'μ': r'$\mu$',
+}
+LATEX_SPECIAL = {'&': r'\&', '%': r'\%', '#': r'\#', '_': r'\_', '$': r'\$'}
+
+
+def _values(record, *fields):
+    """Fields of a record as floats; None if any is missing."""
+    values = [record.get(field, np.nan) for field in fields]
+    if any(value is None or pd.isna(value) for value in values):
+        return None
+    return [float(value) for value in values]
+
+
+def format_p(p):
+    """p-value to three decimals, '<0.001' below that."""
+    return "<0.001" if p < 0.001 else f"{p:.3f}"
+
+
+def _format(fields, template):
+    def formatter(record):
+        values = _values(record, *fields)
+        return None if values is None else template(*values)
+    return formatter
+
+
+FORMATS = {
+    'count': _format(['estimate'], lambda v: f"{int(v):,}"),
+    'integer': _format(['estimate'], lambda v: f"{int(v)}"),
+    'number1': _format(['estimate'], lambda v: f"{v:.1f}"),
+    'number3': _format(['estimate'], lambda v: f"{v:.3f}"),
+    'percent': _format(['estimate'], lambda v: f"{v * 100:.1f}"),
+    'percent_se': _format(['estimate', 'se'], lambda v, se: f"{v * 100:.1f} ({se * 100:.1f})"),
+    'mean_sd': _format(['estimate', 'sd'], lambda v, sd: f"{v:.1f} ({sd:.1f})"),
+    'median_iqr': _format(['estimate', 'q25', 'q75'], lambda v, lo, hi: f"{v:.1f} [{lo:.1f}, {hi:.1f}]"),
+    'ci': _format(['ci_low', 'ci_high'], lambda lo, hi: f"[{lo:.3f}, {hi:.3f}]"),
+    'p': _format(['pvalue'], format_p),
+    'estimate_ci_p': _format(['estimate', 'ci_low', 'ci_high', 'pvalue'],
+                             lambda v, lo, hi, p: f"{v:.3f} [{lo:.3f}, {hi:.3f}]; p={format_p(p)}"),
+    'cases_total': _format(['n_cases', 'n_total'], lambda n, total: f"{int(n)}/{int(total)}"),
+}
+
+
+def latex_text(text):
+    """Escape plain text for LaTeX."""
+    for char, escaped in {**LATEX_SPECIAL, **LATEX_SYMBOLS}.items():
+        text = text.replace(char, escaped)
+    return text
+
+
+def markdown_text(text):
+    """Escape plain text for a Markdown table cell."""
+    return text.replace('|', r'\|')
+
+
+def table_cells(tidy, layout):
+    """Resolve a layout against tidy results.
+
+    Returns a list of ('row', label, latex_label, indent, bold, cells),
+    ('section', label, latex_label) and ('rule',) entries.
+    """
+    row_key = layout.get('row_key', 'term')
+    column_key = layout.get('column_key')
+    missing = layout.get('missing', '---')
+    keys = [row_key] + ([column_key] if column_key else [])
+    records = {tuple(record[k] for k in keys): record for record in tidy.to_dict('records')}
+
+    entries = []
+    for row in layout['rows']:
+        if row.get('rule'):
+            entries.append(('rule',))
+            continue
+        if 'section' in row:
+            entries.append(('section', row['section'], row.get('latex')))
+            continue
+
+        cells = []
+        for j, column in enumerate(layout['columns']):
+            literal = row.get('cells', [None] * len(layout['columns']))[j]
+            if literal is not None:
+                cells.append(literal)
+                continue
+            key = (row['key'], column['key']) if column_key else (row['key'],)
+            record = records.get(key)
+            text = FORMATS[row.get('format', column.get('format'))](record) if record else None
+            cells.append(missing if text is None else text)
+        entries.append(('row', row['label'], row.get('latex'), row.get('indent', 0),
+                        row.get('bold', False), cells))
+    return entries
+
+
+def _header_lines(layout):
+    headers = [column['header'] if isinstance(column['header'], list) else [column['header']]
+               for column in layout['columns']]
+    depth = max(len(header) for header in headers)
+    lines = []
+    for i in range(depth):
+        stub = layout.get('stub_header', '') if i == 0 else ''
+        lines.append([stub] + [header[i] if i < len(header) else '' for header in headers])
+    return lines
+
+
+def render_latex(entries, layout):
+    """LaTeX table environment (booktabs) for resolved entries."""
+    n_columns = len(layout['columns'])
+    lines = [
+        r"\begin{table}[htbp]",
+        r"\centering",
+        f"\\caption{{{latex_text(layout['caption'])}}}",
+        f"\\label{{{layout['label']}}}",
+        r"\begin{tabular}{l" + "c" * n_columns + "}",
+        r"\toprule",
+    ]
+    for header in _header_lines(layout):
+        lines.append(" & ".join(f"\\textbf{{{latex_text(h)}}}" if h else "" for h in header) + r" \\")
+    lines.append(r"\midrule")
+
+    for entry in entries:
+        if entry[0] == 'rule':
+            lines.append(r"\midrule")
+        elif entry[0] == 'section':
+            label = entry[2] or latex_text(entry[1])
+            lines.append(f"\\textbf{{{label}}}" + " &" * n_columns + r" \\")
+        else:
+            _, label, latex_label, indent, bold, cells = entry
+            label = latex_label or latex_text(label)
+            if bold:
+                label = f"\\textbf{{{label}}}"
+            label = "\\quad " * indent + label
+            lines.append(" & ".join([label] + [latex_text(c) for c in cells]) + r" \\")
+
+    lines.extend([r"\bottomrule", r"\end{tabular}"])
+    if layout.get('note'):
+        lines.extend([
+            r"\begin{flushleft}",
+            f"\\footnotesize{{\\textit{{Note:}} {latex_text(layout['note'])}}}",
+            r"\end{flushleft}",
+        ])
+    lines.append(r"\end{table}")
+    return "\n".join(lines) + "\n"
+
+
+def render_markdown(entries, layout):
+    """Markdown (pipe) table with caption and note."""
+    n_columns = len(layout['columns'])
+    header = [" / ".join(h for h in column if h)
+              for column in zip(*_header_lines(layout))]
+    lines = [f"**{markdown_text(layout['caption'])}**", "",
+             "| " + " | ".join(markdown_text(h) for h in header) + " |",
+             "|" + "---|" + ":---:|" * n_columns]
+
+    for entry in entries:
+        if entry[0] == 'section':
+            lines.append(f"| **{markdown_text(entry[1])}** |" + " |" * n_columns)
+        elif entry[0] == 'row':
+            _, label, _, indent, bold, cells = entry
+            label = f"**{markdown_text(label)}**" if bold else markdown_text(label)
+            label = "&nbsp;&nbsp;" * indent + label
+            lines.append("| " + " | ".join([label] + [markdown_text(c) for c in cells]) + " |")
+
+    if layout.get('note'):
+        lines.extend(["", f"*Note:* {markdown_text(layout['note'])}"])
+    return "\n".join(lines) + "\n"
+
+
+def render_csv(entries, layout):
+    """Formatted table as CSV: one row per table row, sections as label-only rows."""
+    header = [" ".join(h for h in column if h) for column in zip(*_header_lines(layout))]
+    rows = []
+    for entry in entries:
+        if entry[0] == 'section':
+            rows.append([entry[1]] + [''] * len(layout['columns']))
+        elif entry[0] == 'row':
+            rows.append([entry[1]] + entry[5])
+    buffer = io.StringIO()
+    pd.DataFrame(rows, columns=header).to_csv(buffer, index=False)
+    return buffer.getvalue()
+
+
+def write_if_changed(path, text):
+    """Write text to path unless the file already holds it; True if written."""
+    if os.path.exists(path):
+        with open(path) as f:
+            if f.read() == text:
+                return False
+    with open(path, 'w') as f:
+        f.write(text)
+    return True
+
+
+def render_table(tidy, layout, output_dir, name):
+    """Render one table as <name>.tex, <name>.md and <name>_formatted.csv.
+
+    Returns {path: written} with written False for files left unchanged.
+    """
+    entries = table_cells(tidy, layout)
+    outputs = {
+        f'{name}.tex': render_latex(entries, layout),
+        f'{name}.md': render_markdown(entries, layout),
+        f'{name}_formatted.csv': render_csv(entries, layout),
+    }
+    return {os.path.join(output_dir, file): write_if_changed(os.path.join(output_dir, file), text)
+            for file, text in outputs.items()}
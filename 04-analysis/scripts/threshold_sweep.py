@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+NHANES Iron Deficiency Without Anemia Study - IDWA Threshold Sweep
+==================================================================
+
+This module:
+1. Holds the primary IDWA cutoffs (ferritin <15 ng/mL, hemoglobin >=12 g/dL)
+2. Bins ferritin and hemoglobin once against the cutoff grids
+3. Accumulates weighted totals per (ferritin bin, hemoglobin bin, PSU)
+   for the overall sample and each subgroup
+4. Turns cumulative sums over the bins into weighted IDWA prevalence and
+   Taylor-linearized design SEs for every ferritin x hemoglobin cutoff
+
+The whole grid costs one pass over the rows plus work proportional to the
+grid size, instead of re-running data preparation for each definition.
+
+Author: NHANES Analysis Pipeline
+Date: 2026-10-19
+"""
+
+import pandas as pd
+import numpy as np
+from scipy import stats
+
+from survey_design import stratified_psu_variance
+
+# Primary IDWA definition: ferritin < FERRITIN_CUTOFF and hemoglobin >= HEMOGLOBIN_CUTOFF
+FERRITIN_CUTOFF = 15.0
+HEMOGLOBIN_CUTOFF = 12.0
+
+# SA1 alternative ferritin cutoff
+SENSITIVITY_FERRITIN_CUTOFF = 25.0
+
+# Default sweep grids (ng/mL and g/dL)
+FERRITIN_GRID = np.arange(10.0, 50.5, 1.0)
+HEMOGLOBIN_GRID = np.array([11.0, 11.5, 12.0, 12.5, 13.0])
+
+
+def sweep_idwa_prevalence(df, design, ferritin_cutoffs=FERRITIN_GRID,
+                          hemoglobin_cutoffs=HEMOGLOBIN_GRID, by=None, alpha=0.05,
+                          ferritin_col='LBXFER', hemoglobin_col='LBXHGB'):
+    """Weighted IDWA prevalence for every ferritin x hemoglobin cutoff pair.
+
+    IDWA at (f, h) is ferritin < f and hemoglobin >= h. Rows missing either
+    biomarker are excluded from numerator and denominator. `by` lists
+    subgroup columns; the overall sample is always included.
+
+    Returns one row per (group, subgroup, ferritin cutoff, hemoglobin cutoff).
+    """
+    f_cut = np.unique(np.asarray(ferritin_cutoffs, dtype=float))
+    h_cut = np.unique(np.asarray(hemoglobin_cutoffs, dtype=float))
+    n_f, n_h = len(f_cut) + 1, len(h_cut) + 1
+    n_psu = design.n_psu
+
+    ferritin = df[ferritin_col].to_numpy(dtype=float)
+    hemoglobin = df[hemoglobin_col].to_numpy(dtype=float)
+    observed = design.valid & ~np.isnan(ferritin) & ~np.isnan(hemoglobin)
+    w = np.where(observed, design.weights, 0.0)
+
+    # Number of cutoffs at or below each value: ferritin < f_j  <=>  f_bin <= j
+    # and hemoglobin >= h_k  <=>  h_bin > k
+    f_bin = np.searchsorted(f_cut, np.nan_to_num(ferritin), side='right')
+    h_bin = np.searchsorted(h_cut, np.nan_to_num(hemoglobin), side='right')
+    cell = (f_bin * n_h + h_bin) * n_psu + design.psu_codes
+
+    groupings = [('Overall', np.zeros(len(df), dtype=int), ['All'])]
+    for col in (by or []):
+        codes, labels = pd.factorize(df[col], sort=True)
+        groupings.append((col, codes, list(labels)))
+
+    t_crit = stats.t.ppf(1 - alpha / 2, design.degrees_of_freedom)
+    frames = []
+    for group, codes, labels in groupings:
+        keep = observed & (codes >= 0)
+        n_groups = len(labels)
+        size = n_groups * n_f * n_h * n_psu
+        flat = codes[keep] * (n_f * n_h * n_psu) + cell[keep]
+
+        W = np.bincount(flat, weights=w[keep], minlength=size).reshape(n_groups, n_f, n_h, n_psu)
+        N = np.bincount(flat, minlength=size).reshape(n_groups, n_f, n_h, n_psu).sum(axis=3)
+
+        # Cumulative over ferritin bins (ascending) and hemoglobin bins (descending)
+        def cumulate(array):
+            array = np.cumsum(array, axis=1)[:, :len(f_cut)]
+            return np.flip(np.cumsum(np.flip(array, axis=2), axis=2), axis=2)[:, :, 1:]
+
+        cases = cumulate(W)
+        n_cases = cumulate(N)
+        denominator = W.sum(axis=(1, 2))
+        total = denominator.sum(axis=1)
+        n_total = N.sum(axis=(1, 2))
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            prevalence = cases.sum(axis=3) / total[:, None, None]
+            z = (cases - prevalence[..., None] * denominator[:, None, None, :]) / total[:, None, None, None]
+        se = np.sqrt(stratified_psu_variance(np.moveaxis(np.nan_to_num(z), 3, 0), design.psu_stratum))
+        se = np.where(total[:, None, None] > 0, se, np.nan)
+
+        index = pd.MultiIndex.from_product([labels, f_cut, h_cut],
+                                           names=['subgroup', 'ferritin_cutoff', 'hemoglobin_cutoff'])
+        frame = pd.DataFrame(index=index).reset_index()
+        frame.insert(0, 'group', group)
+        frame['n_total'] = np.repeat(n_total, len(f_cut) * len(h_cut))
+        frame['n_cases'] = n_cases.ravel()
+        frame['prevalence'] = prevalence.ravel()
+        frame['se_design'] = se.ravel()
+        frame['ci_low'] = frame['prevalence'] - t_crit * frame['se_design']
+        frame['ci_high'] = frame['prevalence'] + t_crit * frame['se_design']
+        frames.append(frame)
+
+    return pd.concat(frames, ignore_index=True)
+
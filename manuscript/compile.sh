@@ -37,6 +37,17 @@ if ! command -v pdflatex &> /dev/null; then
     exit 1
 fi
 
+# Check that the figures match the manifest written by 04_generate_figures.py
+# (manifest paths are relative to the repository root)
+echo "Step 0: Checking figure manifest..."
+FIGURE_MANIFEST="${STUDY_DIR}/04-analysis/outputs/figures/figure_manifest.json"
+if ! (cd "${STUDY_DIR}/../.." && python3 "${STUDY_DIR}/04-analysis/scripts/figure_service.py" "${FIGURE_MANIFEST}"); then
+    echo -e "${RED}Error: figures are missing or out of date${NC}"
+    echo "Please re-run 04_generate_figures.py"
+    exit 1
+fi
+echo ""
+
 echo "Step 1: First pdflatex run..."
 pdflatex -interaction=nonstopmode -file-line-error "${MAIN_FILE}" 2>&1 | tee compile_log.txt
 